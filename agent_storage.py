@@ -0,0 +1,177 @@
+"""
+Storage backends for the psychiatrist agent's sessions.
+
+Every Streamlit session gets its own Agent, but all agents share one pooled
+storage backend per process:
+
+- "sqlite": a SQLAlchemy connection pool over the SQLite file. Connections use
+  WAL journaling, so readers do not block the writer.
+- "postgres": a pooled connection to any Postgres-compatible server (AGENT_DB_URL).
+
+Each agent wraps the shared backend in a BufferedAgentStorage. It keeps the
+session in memory while a turn runs and writes it once when flush() is called
+at the end of the turn. Only the latest runs of the agent's memory are
+written, so a stored session stays the same size however long it runs.
+Retention, compaction and vacuuming of the table are in storage_maintenance.py.
+"""
+import threading
+from typing import Dict, List, Optional
+
+from phi.agent.session import AgentSession
+from phi.storage.agent.base import AgentStorage
+from phi.storage.agent.sqlite import SqlAgentStorage
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+BACKENDS = ("sqlite", "postgres")
+
+
+def create_sqlite_engine(db_file: str, pool_size: int = 5, max_overflow: int = 10,
+                         busy_timeout_ms: int = 5000) -> Engine:
+    """Create a pooled SQLAlchemy engine for a SQLite file with WAL journaling enabled."""
+    engine = create_engine(
+        f"sqlite:///{db_file}",
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=True,
+        connect_args={"check_same_thread": False, "timeout": busy_timeout_ms / 1000},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure_connection(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        # Takes effect on a new file; storage_maintenance converts existing ones
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.close()
+
+    return engine
+
+
+class PooledSqlAgentStorage(SqlAgentStorage):
+    """
+    SqlAgentStorage bound to a caller-provided engine.
+
+    SqlAgentStorage falls back to an in-memory database when it is given only
+    db_engine, so the storage is built from the engine's URL and then switched
+    over to the engine itself.
+    """
+
+    def __init__(self, table_name: str, db_engine: Engine):
+        super().__init__(table_name=table_name, db_url=db_engine.url.render_as_string(hide_password=False))
+        self.db_engine = db_engine
+        self.inspector = inspect(db_engine)
+        self.Session = sessionmaker(bind=db_engine)
+
+
+def create_agent_storage(backend: str, table_name: str, db_file: Optional[str] = None,
+                         db_url: Optional[str] = None, pool_size: int = 5,
+                         max_overflow: int = 10) -> AgentStorage:
+    """
+    Build the shared storage backend for agent sessions.
+
+    :param backend: "sqlite" (uses db_file) or "postgres" (uses db_url)
+    :param table_name: Table holding the agent sessions
+    """
+    if backend == "sqlite":
+        engine = create_sqlite_engine(db_file, pool_size=pool_size, max_overflow=max_overflow)
+        return PooledSqlAgentStorage(table_name=table_name, db_engine=engine)
+    if backend == "postgres":
+        from phi.storage.agent.postgres import PgAgentStorage
+
+        if not db_url:
+            raise ValueError("AGENT_DB_URL is required for the postgres storage backend")
+        engine = create_engine(db_url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+        return PgAgentStorage(table_name=table_name, db_engine=engine)
+    raise ValueError(f"Unknown agent storage backend {backend!r}, expected one of {BACKENDS}")
+
+
+def trim_memory(memory: Optional[Dict], max_runs: int) -> Optional[Dict]:
+    """
+    A copy of a stored agent memory with only its latest runs and their messages.
+
+    Every run stores the full prompt it was sent, so an untrimmed memory grows by
+    several kilobytes per turn. Summaries and user memories are kept.
+
+    :param max_runs: Runs to keep; 0 drops all runs and messages
+    """
+    if not memory:
+        return memory
+    runs = memory.get("runs") or []
+    messages = memory.get("messages") or []
+    user_messages = [index for index, message in enumerate(messages) if message.get("role") == "user"]
+    if max_runs <= 0:
+        runs, messages = [], []
+    else:
+        runs = runs[-max_runs:]
+        if len(user_messages) > max_runs:
+            messages = messages[user_messages[-max_runs]:]
+    return {**memory, "runs": runs, "messages": messages}
+
+
+class BufferedAgentStorage(AgentStorage):
+    """
+    Defers session writes to the shared backend until flush() is called.
+
+    Reads of a buffered session are served from memory, so the agent always sees
+    its latest state within a turn.
+    """
+
+    def __init__(self, backend: AgentStorage, max_runs: Optional[int] = None):
+        """
+        :param max_runs: Runs of the agent's memory that are written (all if None)
+        """
+        self.backend = backend
+        self.max_runs = max_runs
+        self._pending: Dict[str, AgentSession] = {}
+        self._lock = threading.Lock()
+
+    def create(self) -> None:
+        self.backend.create()
+
+    def read(self, session_id: str, user_id: Optional[str] = None) -> Optional[AgentSession]:
+        with self._lock:
+            session = self._pending.get(session_id)
+        if session is not None:
+            return session
+        return self.backend.read(session_id=session_id, user_id=user_id)
+
+    def get_all_session_ids(self, user_id: Optional[str] = None, agent_id: Optional[str] = None) -> List[str]:
+        self.flush()
+        return self.backend.get_all_session_ids(user_id=user_id, agent_id=agent_id)
+
+    def get_all_sessions(self, user_id: Optional[str] = None, agent_id: Optional[str] = None) -> List[AgentSession]:
+        self.flush()
+        return self.backend.get_all_sessions(user_id=user_id, agent_id=agent_id)
+
+    def upsert(self, session: AgentSession) -> Optional[AgentSession]:
+        with self._lock:
+            self._pending[session.session_id] = session
+        return session
+
+    def delete_session(self, session_id: Optional[str] = None):
+        with self._lock:
+            self._pending.pop(session_id, None)
+        self.backend.delete_session(session_id=session_id)
+
+    def drop(self) -> None:
+        with self._lock:
+            self._pending.clear()
+        self.backend.drop()
+
+    def upgrade_schema(self) -> None:
+        self.backend.upgrade_schema()
+
+    def flush(self) -> None:
+        """Write all buffered sessions to the backend."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for session in pending.values():
+            if self.max_runs is not None:
+                session = session.model_copy(update={"memory": trim_memory(session.memory, self.max_runs)})
+            self.backend.upsert(session)
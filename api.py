@@ -0,0 +1,185 @@
+"""
+Headless HTTP API for the assistant.
+
+Serves the same turns as the Streamlit app (chat, health check, report
+processing, health history import) through WellnessService. Replies stream as NDJSON: one
+{"delta": text} line per chunk of the reply, then a {"done": true, ...} line
+with the stored reply, the prompt's token use and the turn's trace. Pass
+?stream=false to get only the final object as JSON.
+
+Sessions are stored in agent storage, so several workers (or hosts sharing a
+Postgres AGENT_DB_URL and the upload, index and tracker files) can serve the
+same sessions behind a load balancer. Run it with `python cli.py serve`.
+"""
+import json
+from contextlib import asynccontextmanager
+from tempfile import SpooledTemporaryFile
+from typing import Iterator
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from assistant import DocumentError, SessionNotFound, WellnessService, collect
+from config import UPLOAD_MAX_MB
+from upload_store import UploadTooLarge
+
+# Request bodies up to this size are kept in memory, larger ones are spooled to disk
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+class UserInfo(BaseModel):
+    name: str
+    age: int = Field(ge=1, le=120)
+    ethnicity: str = ""
+    # Returned in an earlier session's user_info; continues that user's history
+    user_id: str = Field(default="", pattern="^([0-9a-f]{32})?$")
+
+
+class ChatRequest(BaseModel):
+    message: str = Field(min_length=1)
+
+
+class HealthCheckRequest(BaseModel):
+    weight: float = Field(ge=0, le=200)
+    mood: str
+    sleep_hours: float = Field(ge=0, le=24)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Builds the model client, storage pool and scheduler once per worker process
+    app.state.service = await run_in_threadpool(WellnessService)
+    yield
+
+
+app = FastAPI(title="Psychiatrist Wellness Assistant", lifespan=lifespan)
+
+
+def get_service(request: Request) -> WellnessService:
+    return request.app.state.service
+
+
+async def ndjson_events(events: Iterator[dict]):
+    try:
+        async for event in iterate_in_threadpool(events):
+            yield json.dumps(event, default=str) + "\n"
+    finally:
+        # A client that disconnects mid-reply cancels its generation
+        try:
+            await run_in_threadpool(events.close)
+        except ValueError:
+            pass
+
+
+async def turn_response(start, stream: bool):
+    """
+    Prepare a turn on a worker thread, then stream its events or return its final event.
+
+    :param start: Callable that returns the turn's event iterator
+    """
+    try:
+        events = await run_in_threadpool(start)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (DocumentError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if stream:
+        return StreamingResponse(ndjson_events(events), media_type="application/x-ndjson")
+    return JSONResponse(json.loads(json.dumps(await run_in_threadpool(collect, events), default=str)))
+
+
+@app.get("/healthz")
+async def healthz(request: Request):
+    service = get_service(request)
+    return {
+        "status": "ok",
+        "scheduler": service.scheduler.stats(),
+        "models": service.router.stats(),
+        "storage_maintenance": service.storage_maintenance.last_run,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    return get_service(request).telemetry.prometheus_text()
+
+
+@app.post("/sessions", status_code=201)
+async def create_session(user_info: UserInfo, request: Request):
+    return await run_in_threadpool(get_service(request).create_session, user_info.model_dump())
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str, request: Request):
+    try:
+        return await run_in_threadpool(get_service(request).get_session, session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+
+@app.post("/sessions/{session_id}/chat")
+async def chat(session_id: str, body: ChatRequest, request: Request, stream: bool = True):
+    service = get_service(request)
+    return await turn_response(lambda: service.chat(session_id, body.message), stream)
+
+
+@app.post("/sessions/{session_id}/health-checks")
+async def health_check(session_id: str, body: HealthCheckRequest, request: Request, stream: bool = True):
+    service = get_service(request)
+    return await turn_response(
+        lambda: service.health_check(session_id, body.weight, body.mood, body.sleep_hours), stream
+    )
+
+
+async def spool_body(request: Request, name: str) -> SpooledTemporaryFile:
+    """The raw request body as a file, rejecting bodies over UPLOAD_MAX_MB while they arrive."""
+    max_bytes = UPLOAD_MAX_MB * 1024 * 1024
+    body = SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            body.close()
+            raise HTTPException(status_code=413, detail=f"'{name}' is larger than the {UPLOAD_MAX_MB} MB upload limit")
+        body.write(chunk)
+    body.seek(0)
+    return body
+
+
+async def file_turn_response(request: Request, name: str, start, stream: bool):
+    """Run a turn that reads the request body; `start(body)` returns the turn's event iterator."""
+    body = await spool_body(request, name)
+
+    def start_with_body():
+        try:
+            return start(body)
+        finally:
+            body.close()
+
+    return await turn_response(start_with_body, stream)
+
+
+@app.post("/sessions/{session_id}/documents")
+async def process_document(session_id: str, request: Request, name: str, stream: bool = True):
+    """Process a report sent as the raw request body (PDF or text); `name` is its file name."""
+    service = get_service(request)
+    return await file_turn_response(
+        request, name, lambda body: service.process_document(session_id, body, name), stream
+    )
+
+
+@app.post("/sessions/{session_id}/health-imports")
+async def import_health_history(session_id: str, request: Request, name: str, stream: bool = True):
+    """
+    Import a health history sent as the raw request body; `name` is its file name
+    (.csv, .json or .jsonl). Streams {"progress": ...} lines while the imported
+    range is analysed.
+    """
+    service = get_service(request)
+    return await file_turn_response(
+        request, name, lambda body: service.import_health_history(session_id, body, name), stream
+    )
@@ -0,0 +1,944 @@
+"""
+The assistant without Streamlit.
+
+Everything a turn needs apart from rendering lives here: building the shared
+resources from config, running the agent on the scheduler, retrieval over
+the user's reports and prompt assembly. The Streamlit app, the HTTP API
+(api.py) and the batch CLI (cli.py) all use these functions, so a turn
+builds the same prompt whichever entry point serves it.
+
+WellnessService runs whole turns (chat, health check, document processing)
+for the headless entry points. Their conversation state (user details,
+messages, rolling summary, language) lives in the agent's session_state in
+agent storage rather than in memory. Any worker process that shares the
+storage can therefore continue any session.
+
+Like the app script, this module must not import phi, SQLAlchemy or NumPy
+at the top; they are imported when the model or the storage is built.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from typing import BinaryIO, Callable, Dict, Iterator, Tuple
+
+from config import (
+    AGENT_COMPACT_AFTER_DAYS,
+    AGENT_DB_FILE,
+    AGENT_DB_MAX_OVERFLOW,
+    AGENT_DB_POOL_SIZE,
+    AGENT_DB_URL,
+    AGENT_MAINTENANCE_INTERVAL_SECONDS,
+    AGENT_MEMORY_MAX_RUNS,
+    AGENT_RETENTION_DAYS,
+    AGENT_STORAGE_BACKEND,
+    AGENT_VACUUM_PAGES,
+    DEFAULT_LANGUAGE,
+    EXTRACT_CACHE_DIR,
+    EXTRACT_MAX_CHARS,
+    EXTRACT_MAX_PAGES,
+    EXTRACT_WORKERS,
+    HEALTH_DB_FILE,
+    HEALTH_IMPORT_BATCH_ROWS,
+    HEALTH_IMPORT_CONCURRENCY,
+    HEALTH_IMPORT_MAX_CALLS,
+    HEALTH_IMPORT_WINDOWS_PER_CALL,
+    HEALTH_TREND_WINDOW,
+    INDEX_DIR,
+    INFERENCE_MAX_CONCURRENCY,
+    INFERENCE_TIMEOUT_SECONDS,
+    LANGUAGE_SHORT_TEXT_CHARS,
+    LANGUAGE_SWITCH_CONFIDENCE,
+    MAX_RESPONSE_WORDS,
+    OLLAMA_HOST,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_MODEL,
+    OLLAMA_NUM_PREDICT,
+    OLLAMA_SMALL_MODEL,
+    RETRIEVAL_CHUNK_OVERLAP,
+    RETRIEVAL_CHUNK_WORDS,
+    RETRIEVAL_TOP_K,
+    ROUTER_CLINICAL_TERMS,
+    ROUTER_COOLDOWN_SECONDS,
+    ROUTER_FIRST_TOKEN_TIMEOUT_SECONDS,
+    ROUTER_LARGE_KINDS,
+    ROUTER_SMALL_KINDS,
+    ROUTER_SMALL_MAX_WORDS,
+    SUMMARY_EVERY_N_TURNS,
+    SUMMARY_MAX_WORDS,
+    SUMMARY_WINDOW_TURNS,
+    SYMPTOM_SUMMARY_MAX_SYMPTOMS,
+    TELEMETRY_JSONL_FILE,
+    TELEMETRY_PROMETHEUS_FILE,
+    UPLOAD_CLEANUP_INTERVAL_SECONDS,
+    UPLOAD_DIR,
+    UPLOAD_MAX_MB,
+    UPLOAD_RETENTION_DAYS,
+)
+from document_index import DocumentIndex, format_chunks
+from document_ingest import DocumentExtractor
+from health_import import format_import_report, import_history
+from health_store import (
+    MOODS,
+    HealthStore,
+    compute_aggregates,
+    format_aggregates,
+    format_windows,
+    window_aggregates,
+)
+from language import LanguageDetector
+from model_router import LARGE, SMALL, ModelRouter, routed_chunks
+from prompts import (
+    SYSTEM_INSTRUCTIONS,
+    build_bot_prompt,
+    build_chat_prompt,
+    build_health_check_prompt,
+    build_health_history_prompt,
+)
+from scheduler import InferenceCancelled, InferenceScheduler, InferenceTimeout, cancellable_transport
+from streaming import bounded_text, strip_think
+from summarizer import RollingSummary, build_summary_prompt, format_messages
+from symptom_store import SymptomStore, format_symptom_stats
+from telemetry import Telemetry, Trace, activate, tracing_client
+from upload_store import UploadStore, file_digest
+
+BUSY_MESSAGE = "Sorry, the assistant is busy right now. Please try again in a moment."
+HEALTH_CHECK_PREFIX = "**Health Check**:\n"
+HEALTH_IMPORT_PREFIX = "**Imported Health History**:\n"
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def truncate_response(text, max_words=MAX_RESPONSE_WORDS):
+    words = text.split()
+    return " ".join(words[:max_words]) + "..." if len(words) > max_words else text
+
+
+def extract_content_from_chunk(chunk):
+    """
+    Retrieve the text delta carried by a streamed RunResponse chunk.
+
+    :param chunk: A RunResponse yielded by Agent.run(..., stream=True)
+    :return: The text delta, or "" for chunks that carry no text (tool calls, run events)
+    """
+    content = getattr(chunk, "content", None)
+    return content if isinstance(content, str) else ""
+
+
+# --- Shared resources, built from config -------------------------------------
+
+def build_scheduler():
+    return InferenceScheduler(
+        max_inflight=INFERENCE_MAX_CONCURRENCY,
+        timeout_seconds=INFERENCE_TIMEOUT_SECONDS,
+    )
+
+
+def build_model_client():
+    """
+    ollama Client shared by model objects. Its requests are aborted when their
+    scheduler job is cancelled, and it reports metrics to the running turn's trace.
+    """
+    return tracing_client(host=OLLAMA_HOST, transport=cancellable_transport())
+
+
+def build_base_model(model_id=OLLAMA_MODEL, client=None):
+    """
+    Ollama model for one agent or one call, capping generation at the reply's token budget.
+
+    Its client reports Ollama's token counts and durations to the running turn's trace.
+
+    :param client: ollama Client to share between model objects (a new one if omitted)
+    """
+    from phi.model.ollama import Ollama
+
+    return Ollama(
+        id=model_id,
+        host=OLLAMA_HOST,
+        client=client or build_model_client(),
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        options={"num_predict": OLLAMA_NUM_PREDICT},
+    )
+
+
+def routed_model_ids():
+    """Ollama model ids by router name; the small model only when OLLAMA_SMALL_MODEL is set."""
+    model_ids = {LARGE: OLLAMA_MODEL}
+    if OLLAMA_SMALL_MODEL and OLLAMA_SMALL_MODEL != OLLAMA_MODEL:
+        model_ids[SMALL] = OLLAMA_SMALL_MODEL
+    return model_ids
+
+
+def build_model_router():
+    """
+    Router between the small and the large model.
+
+    Every agent and call gets its own model object; they share one HTTP client.
+    """
+    client = build_model_client()
+    return ModelRouter(
+        routed_model_ids(),
+        lambda model_id: build_base_model(model_id, client=client),
+        small_kinds=ROUTER_SMALL_KINDS,
+        large_kinds=ROUTER_LARGE_KINDS,
+        small_max_words=ROUTER_SMALL_MAX_WORDS,
+        clinical_terms=ROUTER_CLINICAL_TERMS,
+        first_token_timeout_seconds=ROUTER_FIRST_TOKEN_TIMEOUT_SECONDS,
+        cooldown_seconds=ROUTER_COOLDOWN_SECONDS,
+    )
+
+
+def build_agent_storage():
+    """Pooled session storage shared by all agents in the process."""
+    from agent_storage import create_agent_storage
+
+    return create_agent_storage(
+        AGENT_STORAGE_BACKEND,
+        table_name="phsycatrist",
+        db_file=AGENT_DB_FILE,
+        db_url=AGENT_DB_URL,
+        pool_size=AGENT_DB_POOL_SIZE,
+        max_overflow=AGENT_DB_MAX_OVERFLOW,
+    )
+
+
+def build_storage_maintenance(storage, start=True):
+    """
+    Retention, compaction and vacuuming of the session table.
+
+    :param start: Also start the job that runs every AGENT_MAINTENANCE_INTERVAL_SECONDS
+    """
+    from storage_maintenance import StorageMaintenance
+
+    maintenance = StorageMaintenance(
+        storage,
+        compact_after_days=AGENT_COMPACT_AFTER_DAYS,
+        retention_days=AGENT_RETENTION_DAYS,
+        vacuum_pages=AGENT_VACUUM_PAGES,
+    )
+    return maintenance.start(AGENT_MAINTENANCE_INTERVAL_SECONDS) if start else maintenance
+
+
+def make_agent_factory(router, storage, tools=()):
+    """
+    Factory for per-session psychiatrist agents.
+
+    Agents share the model client and the storage backend, but each has its own
+    session id, memory and write buffer, so sessions do not see each other's
+    state or block on each other's storage writes.
+
+    :param router: Builds each agent's default model (the large one); agent_deltas()
+        switches it to a new model object for each routed call
+    :param tools: Agent tools; the Streamlit tools render widgets, so headless agents have none
+    """
+    from phi.agent import Agent
+    from agent_storage import BufferedAgentStorage
+
+    def build_agent(session_id):
+        return Agent(
+            model=router.new_model(LARGE),
+            # Static instructions form a stable system prefix that Ollama can cache
+            instructions=SYSTEM_INSTRUCTIONS,
+            session_id=session_id,
+            storage=BufferedAgentStorage(storage, max_runs=AGENT_MEMORY_MAX_RUNS),
+            markdown=True,
+            debug=False,
+            # Prior turns reach the prompt through the rolling summary and recent window instead
+            add_history_to_messages=False,
+            tools=list(tools),
+        )
+
+    return build_agent
+
+
+def build_telemetry():
+    return Telemetry(TELEMETRY_JSONL_FILE, TELEMETRY_PROMETHEUS_FILE)
+
+
+def build_health_store():
+    return HealthStore(HEALTH_DB_FILE)
+
+
+def build_symptom_store():
+    return SymptomStore(HEALTH_DB_FILE)
+
+
+def build_upload_store():
+    """Content-addressed upload store with its cleanup job running."""
+    return UploadStore(
+        UPLOAD_DIR,
+        max_bytes=UPLOAD_MAX_MB * 1024 * 1024,
+        retention_days=UPLOAD_RETENTION_DAYS,
+    ).start_cleanup(UPLOAD_CLEANUP_INTERVAL_SECONDS)
+
+
+def build_document_extractor():
+    return DocumentExtractor(
+        EXTRACT_CACHE_DIR,
+        max_pages=EXTRACT_MAX_PAGES,
+        max_chars=EXTRACT_MAX_CHARS,
+        max_workers=EXTRACT_WORKERS,
+    )
+
+
+def build_language_detector(language=None):
+    """Language detector of a session, resuming from the language it last detected."""
+    detector = LanguageDetector(
+        default=DEFAULT_LANGUAGE,
+        short_text_chars=LANGUAGE_SHORT_TEXT_CHARS,
+        switch_confidence=LANGUAGE_SWITCH_CONFIDENCE,
+    )
+    detector.language = language
+    return detector
+
+
+def build_rolling_summary(summary="", folded=0):
+    """Rolling summary of a session, resuming from its stored summary."""
+    rolling_summary = RollingSummary(every_n_turns=SUMMARY_EVERY_N_TURNS, window_turns=SUMMARY_WINDOW_TURNS)
+    rolling_summary.summary = summary
+    rolling_summary.folded = folded
+    return rolling_summary
+
+
+# --- Model calls -------------------------------------------------------------
+
+def agent_deltas(agent, context, trace=None, worker_context=None, model=None):
+    """
+    Run the agent in streaming mode and yield its text deltas.
+
+    Runs on a scheduler worker thread, with the turn's trace activated so the
+    model client reports to it.
+
+    :param worker_context: Called on the worker thread; the context manager it returns is
+        held for the run (the UI attaches the session's script context with it). Workers
+        are pooled, so nothing may stay attached to the thread after the run.
+    :param model: Model to run the agent on, chosen by the router
+    """
+    if model is not None:
+        agent.model = model
+    with worker_context() if worker_context is not None else nullcontext(), activate(trace):
+        run = agent.run(context, stream=True)
+        try:
+            for chunk in run:
+                delta = extract_content_from_chunk(chunk)
+                if delta:
+                    yield delta
+        finally:
+            # Closing the stream drops the Ollama request, which stops generation
+            run.close()
+            # Session writes made during the turn reach the database in one batch
+            from agent_storage import BufferedAgentStorage
+
+            if isinstance(agent.storage, BufferedAgentStorage):
+                if trace is not None:
+                    with trace.span("storage_write"):
+                        agent.storage.flush()
+                else:
+                    agent.storage.flush()
+
+
+class Generation:
+    """
+    One reply generated on the scheduler, on the model the router chose.
+
+    deltas() yields the visible text as it arrives; afterwards `text` holds the
+    final reply, passed through truncate_response, and `completed` tells whether
+    the model finished it (rather than a timeout, cancellation or busy message). The queue wait, first token
+    and generation spans are added to the trace when the stream ends, with the
+    model that answered and the one it fell back from, if any.
+    """
+
+    def __init__(self, scheduler, router, route, session_id, agent, context, trace=None, worker_context=None):
+        self.trace = trace
+        self.text = ""
+        self.completed = False
+        self.jobs = []
+        self.router = router
+        self.route = route
+        self._submit = lambda model: scheduler.submit(
+            session_id, lambda: agent_deltas(agent, context, trace, worker_context, model=model)
+        )
+
+    @property
+    def job(self):
+        """The job of the latest attempt (None until the reply is requested)."""
+        return self.jobs[-1][1] if self.jobs else None
+
+    def _on_job(self, name, job):
+        self.jobs.append((name, job))
+
+    def deltas(self, on_wait=None, on_poll=None) -> Iterator[str]:
+        """
+        Yield the reply's visible text deltas.
+
+        <think> reasoning blocks are hidden and generation is aborted once the
+        reply exceeds MAX_RESPONSE_WORDS words. A timeout or cancellation ends
+        the stream; if nothing was generated, `text` is a busy message.
+
+        :param on_wait: Called with the queue position while the job waits to start
+        :param on_poll: Called while waiting for each chunk; may raise to stop (see InferenceJob.iter_chunks)
+        """
+        chunks = routed_chunks(self.router, self.route, self._submit, on_wait=on_wait, on_job=self._on_job,
+                               on_poll=on_poll)
+        first_token_at = None
+        try:
+            for delta in bounded_text(chunks, MAX_RESPONSE_WORDS):
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                self.text += delta
+                yield delta
+            self.completed = True
+        except (InferenceTimeout, InferenceCancelled) as e:
+            if self.trace is not None:
+                self.trace.set(error=type(e).__name__)
+            if not self.text:
+                self.text = BUSY_MESSAGE
+        finally:
+            chunks.close()
+            self.text = truncate_response(self.text.strip())
+            self._record_spans(first_token_at, time.monotonic())
+
+    def _record_spans(self, first_token_at, finished_at):
+        if self.trace is None or not self.jobs:
+            return
+        # The scheduler's timestamps are time.monotonic(), spans start on time.perf_counter()
+        to_perf = time.perf_counter() - time.monotonic()
+        # A fallback's wait counts towards the first token, as the user waited for it too
+        first_job = self.jobs[0][1]
+        started_at = first_job.started_at or finished_at
+        self.trace.add_span("queue_wait", started_at - first_job.submitted_at, started=first_job.submitted_at + to_perf)
+        if first_token_at is not None:
+            self.trace.add_span("first_token", first_token_at - started_at, started=started_at + to_perf)
+            self.trace.add_span("generation", finished_at - first_token_at, started=first_token_at + to_perf)
+        self.trace.set(response_words=len(self.text.split()))
+        self.trace.set(model=self.router.models[self.jobs[-1][0]], route=self.route.reason)
+        if len(self.jobs) > 1:
+            self.trace.set(fallback_from=self.router.models[self.jobs[0][0]])
+
+
+def routed_text(router, route, scheduler, session_id, make_agent, prompt, trace=None, replace=True):
+    """
+    Generate a whole reply off the UI (summaries, history analyses, cache refreshes) on the routed model.
+
+    :param make_agent: Returns the agent for an attempt on the given model
+    :return: The reply without <think> blocks, not yet truncated
+    """
+    def submit(model):
+        agent = make_agent(model)
+        return scheduler.submit(session_id, lambda: agent_deltas(agent, prompt, trace, model=model), replace=replace)
+
+    return strip_think("".join(routed_chunks(router, route, submit)))
+
+
+def make_summarizer(router, scheduler, session_id):
+    """
+    Build the summarize(previous_summary, messages) callable used by RollingSummary.
+
+    It runs on a background thread, so it only captures plain values.
+    """
+    def summarize(previous_summary, messages):
+        from phi.agent import Agent
+
+        prompt = build_summary_prompt(previous_summary, messages, max_words=SUMMARY_MAX_WORDS)
+        text = routed_text(router, router.route("summary"), scheduler, f"summary:{session_id}",
+                           lambda model: Agent(model=model, markdown=False), prompt)
+        return truncate_response(text, max_words=SUMMARY_MAX_WORDS)
+
+    return summarize
+
+
+# --- Users, reports and prompts ----------------------------------------------
+
+def new_user_id():
+    """Random id for a new user; their health history, symptoms and reports are keyed on it."""
+    return uuid.uuid4().hex
+
+
+def get_user_key(user_info):
+    """
+    Key of the user's stored data: the random id given with their details.
+
+    Names and ages are shared by many users (and blank forms by everyone), so the
+    key is never derived from them.
+    """
+    return user_info["user_id"]
+
+
+def user_index_path(user_key):
+    return os.path.join(INDEX_DIR, f"{user_key}.json")
+
+
+def read_document(extractor, file_path, digest=None, progress=None):
+    """
+    Reads a PDF (or text) file and returns its number of pages and the text of all pages.
+
+    Pages are extracted on a process pool and the result is cached by the file's
+    content digest, so reading the same report again is instant.
+
+    :param digest: SHA-256 digest of the file; computed from the file if omitted
+    :param progress: Called as progress(done, total) during extraction
+    :return: {"num_pages", "first_page_text", "text", "truncated", "error"}, or only
+        "error" if reading fails
+    """
+    if digest is None:
+        try:
+            digest = file_digest(file_path)
+        except FileNotFoundError:
+            return {'error': 'File not found'}
+
+    result = extractor.extract(file_path, digest, progress=progress)
+    if result.get('error'):
+        return {'error': result['error']}
+
+    pages = result['pages']
+    return {
+        'num_pages': result['num_pages'],
+        'first_page_text': pages[0] if pages else '',
+        'text': result['text'],
+        'truncated': result['truncated'],
+        'error': None
+    }
+
+
+def index_report(index_path, digest, name, text):
+    """
+    Add a report to the user's index unless it is already there.
+
+    The index file is re-read first, so reports added from the user's other sessions are kept.
+    """
+    index = DocumentIndex.load(index_path)
+    if index.add_document(digest, name, text, chunk_words=RETRIEVAL_CHUNK_WORDS, overlap_words=RETRIEVAL_CHUNK_OVERLAP):
+        index.save()
+    return index
+
+
+def report_message(record, content):
+    """The user message that asks for a processed report, e.g. "Process this file: x.pdf (1200 characters, 3 pages)"."""
+    pages = f", {content['num_pages']} pages" if content['num_pages'] else ""
+    note = ", truncated to the extraction limit" if content['truncated'] else ""
+    return f"Process this file: {record['name']} ({len(content['text'])} characters{pages}{note})"
+
+
+def retrieve_excerpts(index, query, digest=None):
+    """
+    Top report chunks for the prompt.
+
+    :param digest: When set, the turn is about this report as a whole, so its leading chunks are used
+    """
+    if digest is not None:
+        chunks = index.leading_chunks(digest, k=RETRIEVAL_TOP_K)
+    else:
+        chunks = index.search(query, k=RETRIEVAL_TOP_K)
+    return format_chunks(chunks)
+
+
+def chat_prompt(trace, health_store, symptom_store, index, user_info, language, query, summary,
+                recent_messages) -> Tuple[str, Dict]:
+    """
+    Prompt for a chat message, with the user's tracker data and the report excerpts relevant to it.
+
+    :param recent_messages: Turns not yet folded into the summary, excluding the query itself
+    :return: (prompt, token usage)
+    """
+    user_key = get_user_key(user_info)
+    with trace.span("tracker_lookup"):
+        health_data = health_store.latest(user_key)
+        symptoms = format_symptom_stats(symptom_store.stats(user_key, limit=SYMPTOM_SUMMARY_MAX_SYMPTOMS))
+    with trace.span("retrieval"):
+        documents = retrieve_excerpts(index, query)
+    with trace.span("prompt_build"):
+        return build_chat_prompt(
+            user_info,
+            language,
+            query,
+            summary=summary,
+            health_data=health_data,
+            symptoms=symptoms,
+            recent=format_messages(recent_messages),
+            documents=documents,
+        )
+
+
+def bot_prompt(trace, index, user_info, language, query, summary, recent_messages,
+               document_digest=None) -> Tuple[str, Dict]:
+    """
+    Prompt for a reply to the latest user message (Quick Queries and processed reports).
+
+    :param index: The user's report index; None leaves reports out (cached Quick Query answers)
+    :param recent_messages: Turns not yet folded into the summary, excluding the query itself
+    :param document_digest: Digest of a report the message asks to process
+    :return: (prompt, token usage)
+    """
+    with trace.span("retrieval"):
+        documents = "" if index is None else retrieve_excerpts(index, query, digest=document_digest)
+    with trace.span("prompt_build"):
+        return build_bot_prompt(
+            user_info,
+            language,
+            query,
+            summary=summary,
+            recent=format_messages(recent_messages),
+            documents=documents,
+        )
+
+
+def health_check_prompt(trace, health_store, user_info, weight, mood, sleep_hours) -> Tuple[str, Dict]:
+    """
+    Save a Health Tracker entry and build the prompt analysing it against the user's whole history.
+
+    :return: (prompt, token usage)
+    """
+    user_key = get_user_key(user_info)
+    with trace.span("health_store_write"):
+        health_store.add(user_key, weight, mood, sleep_hours)
+    with trace.span("trend_analysis"):
+        trends = format_aggregates(health_store.aggregates(user_key, window=HEALTH_TREND_WINDOW))
+    with trace.span("prompt_build"):
+        return build_health_check_prompt(user_info, weight, mood, sleep_hours, trends=trends)
+
+
+def history_window_seconds(since, until):
+    """
+    Window length for analysing an imported range: a week, or longer so the
+    range fits in HEALTH_IMPORT_MAX_CALLS calls of HEALTH_IMPORT_WINDOWS_PER_CALL windows.
+    """
+    max_windows = HEALTH_IMPORT_WINDOWS_PER_CALL * HEALTH_IMPORT_MAX_CALLS
+    days = int((until - since) / max_windows // SECONDS_PER_DAY) + 1
+    return max(7, days) * SECONDS_PER_DAY
+
+
+def iter_history_analysis(router, scheduler, trace, health_store, user_info, since, until,
+                          session_id) -> Iterator[Dict]:
+    """
+    Analyse an imported range of the health history in a few batched model calls.
+
+    The range is cut into windows whose statistics are computed in one pass;
+    consecutive windows are grouped into one prompt per call. Calls run
+    HEALTH_IMPORT_CONCURRENCY at a time on the shared scheduler.
+
+    :return: Iterator of {"index", "period", "text", "done", "total"}, one per call as it finishes
+    """
+    user_key = get_user_key(user_info)
+    with trace.span("trend_analysis"):
+        series = health_store.series(user_key, since=since, until=until)
+        windows = window_aggregates(series, history_window_seconds(since, until))
+        overall = format_aggregates(compute_aggregates(series, window=HEALTH_TREND_WINDOW))
+    groups = [windows[start:start + HEALTH_IMPORT_WINDOWS_PER_CALL]
+              for start in range(0, len(windows), HEALTH_IMPORT_WINDOWS_PER_CALL)]
+    periods = [f"{group[0]['start']} to {group[-1]['end']}" for group in groups]
+    with trace.span("prompt_build"):
+        prompts = [build_health_history_prompt(user_info, period, format_windows(group), overall=overall)[0]
+                   for period, group in zip(periods, groups)]
+    trace.set(history_windows=len(windows), history_calls=len(prompts))
+
+    def analyze(index):
+        from phi.agent import Agent
+
+        try:
+            # A plain agent keeps the analysis out of the session's memory
+            return truncate_response(routed_text(
+                router, router.route(trace.kind), scheduler, f"{session_id}:history:{index}",
+                lambda model: Agent(model=model, instructions=SYSTEM_INSTRUCTIONS, markdown=True),
+                prompts[index], trace, replace=False,
+            ))
+        except (InferenceTimeout, InferenceCancelled) as e:
+            trace.set(error=type(e).__name__)
+            return BUSY_MESSAGE
+
+    pool = ThreadPoolExecutor(max_workers=max(1, HEALTH_IMPORT_CONCURRENCY), thread_name_prefix="history-analysis")
+    try:
+        with trace.span("history_analysis"):
+            futures = {pool.submit(analyze, index): index for index in range(len(prompts))}
+            for done, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                yield {"index": index, "period": periods[index], "text": future.result(),
+                       "done": done, "total": len(prompts)}
+    finally:
+        # Analyses not started yet are dropped if the caller stops early
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def format_history_message(report, analyses):
+    """Chat message with an import's outcome and its per-period analyses in time order."""
+    parts = [HEALTH_IMPORT_PREFIX + format_import_report(report)]
+    for analysis in sorted(analyses, key=lambda analysis: analysis["index"]):
+        parts.append(f"**{analysis['period']}**\n{analysis['text']}")
+    return "\n\n".join(parts)
+
+
+def record_usage(trace, usage):
+    """Attach the token use of the prompt a turn sent to its trace."""
+    if usage:
+        trace.set(prompt_tokens_estimate=usage["total_tokens"], truncated_sections=usage["truncated"])
+
+
+# --- Headless turns ----------------------------------------------------------
+
+class SessionNotFound(KeyError):
+    """Raised for a session id that has no stored session."""
+
+
+class DocumentError(ValueError):
+    """Raised when an uploaded report cannot be read."""
+
+
+class WellnessService:
+    """
+    Runs the assistant's turns without Streamlit.
+
+    Turn methods prepare the prompt before returning and then return an
+    iterator of events: {"delta": text} while the reply streams, then
+    {"done": True, "text", "prompt_usage", "trace"} once it has been stored.
+    Turns of one session are expected to run one at a time; a new turn
+    cancels the generation of the previous one.
+    """
+
+    def __init__(self, tools=()):
+        self.scheduler = build_scheduler()
+        self.telemetry = build_telemetry()
+        self.health_store = build_health_store()
+        self.symptom_store = build_symptom_store()
+        self.upload_store = build_upload_store()
+        self.extractor = build_document_extractor()
+        self.router = build_model_router()
+        storage = build_agent_storage()
+        self.storage_maintenance = build_storage_maintenance(storage)
+        self.agent_factory = make_agent_factory(self.router, storage, tools=tools)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    # Session state ---------------------------------------------------------
+
+    def _lock(self, session_id) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(session_id, threading.Lock())
+
+    def _load(self, session_id):
+        """The session's agent, with its stored state loaded."""
+        agent = self.agent_factory(session_id)
+        if agent.read_from_storage() is None or "user_info" not in agent.session_state:
+            raise SessionNotFound(session_id)
+        if "user_id" not in agent.session_state["user_info"]:
+            # Sessions started before user ids existed get one now
+            agent.session_state["user_info"]["user_id"] = new_user_id()
+            self._save(agent)
+        return agent
+
+    @staticmethod
+    def _save(agent) -> None:
+        agent.write_to_storage()
+        agent.storage.flush()
+
+    def _update(self, session_id, change: Callable[[Dict], None]) -> Dict:
+        """
+        Apply `change` to the freshly loaded session state and store it.
+
+        The state is re-read under the session's lock, so a turn and a summary
+        fold finishing at the same time do not overwrite each other.
+        """
+        with self._lock(session_id):
+            agent = self._load(session_id)
+            change(agent.session_state)
+            self._save(agent)
+            return agent.session_state
+
+    def create_session(self, user_info: Dict) -> Dict:
+        """
+        Start a session for a user.
+
+        :param user_info: {"name", "age", "ethnicity"} as entered in the app's form, and the
+            "user_id" of an earlier session to continue that user's history (a new one otherwise)
+        :return: The new session ({"session_id", "user_info", "messages", "summary"})
+        :raises ValueError: If user_id is not an id given by new_user_id()
+        """
+        user_id = user_info.get("user_id") or new_user_id()
+        # The id names the user's index file, so only ids in new_user_id()'s format are accepted
+        if not re.fullmatch(r"[0-9a-f]{32}", user_id):
+            raise ValueError("user_id must be the id returned by an earlier session")
+        session_id = uuid.uuid4().hex
+        agent = self.agent_factory(session_id)
+        agent.session_state = {
+            "user_info": dict(user_info, user_id=user_id),
+            "messages": [],
+            "summary": "",
+            "folded": 0,
+            "language": None,
+        }
+        self._save(agent)
+        return self.get_session(session_id)
+
+    def get_session(self, session_id) -> Dict:
+        """:raises SessionNotFound: If the session does not exist"""
+        state = self._load(session_id).session_state
+        return {
+            "session_id": session_id,
+            "user_info": state["user_info"],
+            "messages": state.get("messages", []),
+            "summary": state.get("summary", ""),
+        }
+
+    # Turns -----------------------------------------------------------------
+
+    def chat(self, session_id, message: str) -> Iterator[Dict]:
+        """Reply to a chat message. :raises SessionNotFound: If the session does not exist"""
+        trace = Trace("chat", session_id)
+        agent = self._load(session_id)
+        state = agent.session_state
+        detector = build_language_detector(state.get("language"))
+        with trace.span("language_detection"):
+            language = detector.detect(message)
+        rolling_summary = build_rolling_summary(state.get("summary", ""), state.get("folded", 0))
+        context, usage = chat_prompt(
+            trace,
+            self.health_store,
+            self.symptom_store,
+            DocumentIndex.load(user_index_path(get_user_key(state["user_info"]))),
+            state["user_info"],
+            language,
+            message,
+            summary=rolling_summary.summary,
+            recent_messages=rolling_summary.recent(state.get("messages", [])),
+        )
+        return self._respond(agent, trace, context, usage, {"role": "user", "content": message}, language,
+                             route_text=message)
+
+    def health_check(self, session_id, weight: float, mood: str, sleep_hours: float) -> Iterator[Dict]:
+        """
+        Save a Health Tracker entry and stream its analysis.
+
+        :param mood: One of health_store.MOODS
+        :raises SessionNotFound: If the session does not exist
+        """
+        if mood not in MOODS:
+            raise ValueError(f"mood must be one of {MOODS}")
+        trace = Trace("health_check", session_id)
+        agent = self._load(session_id)
+        state = agent.session_state
+        context, usage = health_check_prompt(trace, self.health_store, state["user_info"], weight, mood, sleep_hours)
+        return self._respond(agent, trace, context, usage, None, state.get("language"), prefix=HEALTH_CHECK_PREFIX)
+
+    def process_document(self, session_id, source: BinaryIO, name: str) -> Iterator[Dict]:
+        """
+        Store, extract and index a report, then stream the reply about it.
+
+        :param source: Readable binary file object with the report (PDF or text)
+        :raises SessionNotFound: If the session does not exist
+        :raises UploadTooLarge: If the report exceeds UPLOAD_MAX_MB
+        :raises DocumentError: If the report cannot be read
+        """
+        trace = Trace("file_processing", session_id)
+        agent = self._load(session_id)
+        state = agent.session_state
+        record = self.upload_store.save(source, name)
+        with trace.span("extraction"):
+            content = read_document(self.extractor, record["path"], digest=record["digest"])
+        if content['error']:
+            raise DocumentError(content['error'])
+        # The report is indexed; prompts only carry its relevant excerpts from now on
+        with trace.span("indexing"):
+            index = index_report(
+                user_index_path(get_user_key(state["user_info"])), record["digest"], record["name"], content['text']
+            )
+        trace.set(pages=content['num_pages'], characters=len(content['text']))
+        message = report_message(record, content)
+        # The message is the app's canned English request, so the session keeps its language
+        language = build_language_detector(state.get("language")).current()
+        rolling_summary = build_rolling_summary(state.get("summary", ""), state.get("folded", 0))
+        user_message = {"role": "user", "content": message}
+        context, usage = bot_prompt(
+            trace,
+            index,
+            state["user_info"],
+            language,
+            message,
+            summary=rolling_summary.summary,
+            recent_messages=rolling_summary.recent(state.get("messages", [])),
+            document_digest=record["digest"],
+        )
+        return self._respond(agent, trace, context, usage, user_message, language, route_text=message)
+
+    def import_health_history(self, session_id, source: BinaryIO, name: str) -> Iterator[Dict]:
+        """
+        Import a health history file (CSV, JSON or JSON Lines), then analyse the imported range.
+
+        Events are {"progress": {"done", "total"}} as each batched analysis call
+        finishes, then {"done": True, "text", "import", "trace"}.
+
+        :raises SessionNotFound: If the session does not exist
+        :raises HealthImportError: If the file cannot be parsed
+        """
+        trace = Trace("health_import", session_id)
+        user_info = self._load(session_id).session_state["user_info"]
+        with trace.span("health_store_write"):
+            report = import_history(self.health_store, get_user_key(user_info), source, name,
+                                    batch_size=HEALTH_IMPORT_BATCH_ROWS)
+        trace.set(rows=report["rows"], imported=report["imported"], invalid=report["invalid"])
+        return self._analyze_import(session_id, trace, user_info, report)
+
+    def _analyze_import(self, session_id, trace, user_info, report) -> Iterator[Dict]:
+        analyses = []
+        if report["imported"]:
+            for analysis in iter_history_analysis(self.router, self.scheduler, trace, self.health_store, user_info,
+                                                  report["since"], report["until"], session_id):
+                analyses.append(analysis)
+                yield {"progress": {"done": analysis["done"], "total": analysis["total"]}}
+        text = format_history_message(report, analyses)
+        with trace.span("storage_write"):
+            self._update(session_id, lambda state: state["messages"].append({"role": "assistant", "content": text}))
+        record = self.telemetry.record(trace)
+        yield {"done": True, "text": text, "import": report, "trace": record}
+
+    def _respond(self, agent, trace, context, usage, user_message, language, prefix="",
+                 route_text="") -> Iterator[Dict]:
+        route = self.router.route(trace.kind, route_text)
+        generation = Generation(self.scheduler, self.router, route, agent.session_id, agent, context, trace)
+        for delta in generation.deltas():
+            yield {"delta": delta}
+        # The worker flushes the agent's own session write before it finishes
+        if generation.job is not None:
+            generation.job.finished.wait(5)
+        reply = {"role": "assistant", "content": prefix + generation.text}
+
+        def add_turn(state):
+            if user_message is not None:
+                state["messages"].append(user_message)
+            state["messages"].append(reply)
+            state["language"] = language
+
+        with trace.span("storage_write"):
+            state = self._update(agent.session_id, add_turn)
+        record_usage(trace, usage)
+        record = self.telemetry.record(trace)
+        # The reply is delivered, so older turns can be folded into the summary in the background
+        self._maybe_summarize(agent.session_id, state)
+        yield {"done": True, "text": generation.text, "prompt_usage": usage, "trace": record}
+
+    def _maybe_summarize(self, session_id, state) -> None:
+        rolling_summary = build_rolling_summary(state.get("summary", ""), state.get("folded", 0))
+        summarize = make_summarizer(self.router, self.scheduler, session_id)
+        folded = rolling_summary.folded
+
+        def summarize_and_store(previous_summary, messages):
+            summary = summarize(previous_summary, messages).strip()
+
+            def fold(state):
+                # Skipped if another worker folded these turns meanwhile
+                if summary and state.get("folded", 0) == folded:
+                    state["summary"] = summary
+                    state["folded"] = folded + len(messages)
+
+            self._update(session_id, fold)
+            return summary
+
+        rolling_summary.maybe_update(state["messages"], summarize_and_store)
+
+
+def collect(events: Iterator[Dict]) -> Dict:
+    """Consume a turn's events and return its final {"done": True, ...} event."""
+    final = {}
+    for event in events:
+        if event.get("done"):
+            final = event
+    return final
@@ -0,0 +1,206 @@
+"""
+Stand-in Ollama HTTP server for offline benchmarks.
+
+Implements the parts of the Ollama API the app uses: /api/chat and
+/api/generate (streaming NDJSON and non-streaming), /api/tags and /api/version.
+Replies are canned text emitted at a configurable token rate after a
+configurable first-token latency, which can differ per model id. Like
+Ollama's OLLAMA_NUM_PARALLEL, at most
+`max_parallel` requests are generated at once and the rest wait. The final
+chunk carries Ollama's usual prompt_eval_count/eval_count and duration fields.
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+DEFAULT_REPLY = (
+    "Thanks for sharing that. Based on what you told me, here are a few things that could help: "
+    "keep a regular sleep schedule, take a short walk every day, and write down what is on your mind "
+    "before bed. How have you been sleeping over the last week?\n\n"
+    "- Irregular sleep schedule\n- Stress from work or study\n- Low physical activity"
+)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeOllamaServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tokens_per_second: float = 200.0,
+                 first_token_latency: float = 0.05, prompt_tokens_per_second: float = 2000.0,
+                 reply: str = DEFAULT_REPLY, max_parallel: int = 4, model_profiles: Optional[Dict] = None):
+        """
+        :param tokens_per_second: Generation speed of the fake model
+        :param first_token_latency: Fixed delay before the first token (model load/queueing)
+        :param prompt_tokens_per_second: Prompt evaluation speed; adds prompt-size dependent latency
+        :param max_parallel: Requests generated at the same time; further requests queue
+        :param model_profiles: Per model id overrides of tokens_per_second, first_token_latency
+            and prompt_tokens_per_second, e.g. a fast small model next to a slow large one
+        """
+        self.tokens_per_second = tokens_per_second
+        self.first_token_latency = first_token_latency
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.model_profiles = model_profiles or {}
+        self.reply = reply
+        self.requests = 0
+        self._slots = threading.Semaphore(max_parallel)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: Dict, status: int = 200) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": []})
+                elif self.path == "/api/version":
+                    self._send_json({"version": "0.0.0-fake"})
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path not in ("/api/chat", "/api/generate"):
+                    self._send_json({"error": "not found"}, status=404)
+                    return
+                with server._lock:
+                    server.requests += 1
+                with server._slots:
+                    server._respond(self, request, chat=self.path == "/api/chat")
+
+        return Handler
+
+    def _prompt_tokens(self, request: Dict, chat: bool) -> int:
+        if chat:
+            text = "".join(str(message.get("content") or "") for message in request.get("messages") or [])
+        else:
+            text = str(request.get("prompt") or "")
+        return max(len(text) // 4, 1) if text else 0
+
+    def _respond(self, handler: BaseHTTPRequestHandler, request: Dict, chat: bool) -> None:
+        started = time.perf_counter()
+        model = request.get("model", "fake")
+        prompt_tokens = self._prompt_tokens(request, chat)
+        if not prompt_tokens:
+            # Empty prompt: Ollama only loads the model (warm-up / keep-alive)
+            handler._send_json({"model": model, "created_at": _now(), "response": "", "done": True})
+            return
+
+        profile = self.model_profiles.get(model, {})
+        tokens_per_second = profile.get("tokens_per_second", self.tokens_per_second)
+        first_token_latency = profile.get("first_token_latency", self.first_token_latency)
+        num_predict = (request.get("options") or {}).get("num_predict")
+        tokens = [token + " " for token in self.reply.split(" ")]
+        if num_predict and num_predict > 0:
+            tokens = tokens[:num_predict]
+        prompt_eval_seconds = prompt_tokens / profile.get("prompt_tokens_per_second", self.prompt_tokens_per_second)
+        time.sleep(first_token_latency + prompt_eval_seconds)
+        eval_started = time.perf_counter()
+
+        def final_chunk(content: str) -> Dict:
+            now = time.perf_counter()
+            chunk = {
+                "model": model,
+                "created_at": _now(),
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((now - started) * 1e9),
+                "load_duration": int(first_token_latency * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_eval_seconds * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((now - eval_started) * 1e9),
+            }
+            if chat:
+                chunk["message"] = {"role": "assistant", "content": content}
+            else:
+                chunk["response"] = content
+            return chunk
+
+        if not request.get("stream", True):
+            time.sleep(len(tokens) / tokens_per_second)
+            handler._send_json(final_chunk("".join(tokens)))
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def write(payload: Dict) -> None:
+            data = (json.dumps(payload) + "\n").encode("utf-8")
+            handler.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            handler.wfile.flush()
+
+        try:
+            for token in tokens:
+                chunk = {"model": model, "created_at": _now(), "done": False}
+                if chat:
+                    chunk["message"] = {"role": "assistant", "content": token}
+                else:
+                    chunk["response"] = token
+                write(chunk)
+                time.sleep(1 / tokens_per_second)
+            write(final_chunk(""))
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (early stop / cancellation), like Ollama we just stop
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a stand-in Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    parser.add_argument("--max-parallel", type=int, default=4)
+    args = parser.parse_args()
+    server = FakeOllamaServer(args.host, args.port, args.tokens_per_second, args.first_token_latency,
+                              max_parallel=args.max_parallel).start()
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
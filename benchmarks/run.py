@@ -0,0 +1,664 @@
+"""
+Offline benchmark suite for the wellness assistant.
+
+Starts a fake Ollama server (benchmarks/fake_ollama.py) and drives the
+Streamlit app headlessly with streamlit's AppTest. The scenarios are:
+- chat: free-text chat turns
+- bot_response: generate_bot_response() for the latest user message (uncached)
+- quick_query: a Quick Query button (served from the response cache after the first miss)
+- health_check: Save Progress with its health check analysis
+- document: read_pdf processing of a generated report (upload, extraction cold and cached,
+  indexing) and the bot response about it
+- storage: agent session, health and symptom writes
+- startup: cold start in a fresh process; the first page render and the first
+  render after the user info form, with the app's startup report
+- concurrency: N sessions sending chat turns at the same time. AppTest cannot run
+  sessions concurrently in one process, so each session runs in its own process;
+  they share the databases and the fake model host.
+- long_session: reruns of a session with a long chat history against a short one
+- routing: chat replies through the model router, with a small model 4x faster
+  than the large one, against the large model alone; and the time to fall back
+  from a stalled small model
+- session_load: loads of a session from a young and from an aged session table,
+  before and after a maintenance pass, and of a long-running session with and
+  without the write-time run limit
+
+Everything runs in a temporary directory, with no GPU and no network. Results are
+printed and can be saved as a JSON baseline. Later runs are compared against
+it, and the run fails when a metric regresses beyond the tolerance.
+
+    python benchmarks/run.py --update-baseline
+    python benchmarks/run.py --sessions 4 --turns 5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+APP_FILE = os.path.join(REPO_DIR, "streamlit_app.py")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fake_ollama import FakeOllamaServer  # noqa: E402
+
+CHAT_MESSAGES = [
+    "I feel stressed at work and cannot sleep well lately",
+    "I wake up at 3am most nights and cannot fall asleep again",
+    "My appetite has been low for two weeks",
+    "I get headaches in the afternoon, usually after long meetings",
+    "How much exercise should I do to feel more energetic?",
+    "I have been feeling anxious before exams",
+]
+
+# Messages in the long_session scenario's history
+LONG_SESSION_MESSAGES = 1000
+
+# Sessions of the session_load scenario's aged table, their turns and ages, and turns of its long session
+AGED_SESSIONS = 300
+AGED_SESSION_TURNS = 20
+AGED_SESSION_MAX_DAYS = 180
+LONG_SESSION_TURNS = 200
+
+# Fake model ids of the routing scenario; the small model is 4x faster, the stalled one never answers in time
+ROUTING_MODELS = {"small": "bench-small", "large": "bench-large", "stalled": "bench-stalled"}
+ROUTING_SMALL_SPEEDUP = 4
+ROUTING_STALL_SECONDS = 3.0
+ROUTING_FIRST_TOKEN_TIMEOUT = 0.5
+
+# Metrics compared against the baseline; all are "lower is better"
+COMPARED_METRICS = ("p50_seconds", "p95_seconds", "prompt_tokens_p50", "mean_seconds")
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies: List[float], prompt_tokens: Optional[List[int]] = None, **extra) -> Dict:
+    result = {
+        "runs": len(latencies),
+        "p50_seconds": percentile(latencies, 0.5),
+        "p95_seconds": percentile(latencies, 0.95),
+        "mean_seconds": statistics.fmean(latencies) if latencies else None,
+    }
+    if prompt_tokens:
+        result["prompt_tokens_p50"] = percentile(prompt_tokens, 0.5)
+        result["prompt_tokens_max"] = max(prompt_tokens)
+    result.update(extra)
+    return result
+
+
+def timed(action: Callable[[], object]) -> float:
+    started = time.perf_counter()
+    action()
+    return time.perf_counter() - started
+
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 40) -> None:
+    """Write a text PDF with the given number of pages (no PDF library needed)."""
+    sentences = [
+        "Patient reports persistent fatigue and difficulty sleeping",
+        "Blood pressure 128 over 84 heart rate 72 within normal range",
+        "Vitamin D level below the reference range supplementation advised",
+        "Recommend follow up in six weeks and a sleep diary in the meantime",
+        "No signs of acute distress mood described as low but stable",
+    ]
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        text_lines = [f"Page {page + 1} line {line + 1}: {sentences[(page + line) % len(sentences)]}"
+                      for line in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 12 TL 40 780 Td " + " ".join(f"({line}) Tj T*" for line in text_lines) + " ET"
+        stream_bytes = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream_bytes), stream_bytes))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode("ascii")
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+class AppSession:
+    """One headless browser session of the app."""
+
+    def __init__(self, name: str = "Bench", age: int = 30, timeout: float = 300):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP_FILE, default_timeout=timeout).run()
+        self.app.text_input[0].input(name)
+        self.app.number_input[0].set_value(age)
+        self.app.button[0].click().run()
+        self.check()
+
+    @property
+    def state(self):
+        return self.app.session_state
+
+    def check(self) -> None:
+        if self.app.exception:
+            raise RuntimeError(f"App raised: {self.app.exception[0].message}")
+
+    def prompt_tokens(self) -> int:
+        return self.state.prompt_usage["total_tokens"]
+
+    def number_input(self, label: str):
+        return next(widget for widget in self.app.number_input if widget.label == label)
+
+    def chat(self, message: str) -> float:
+        seconds = timed(lambda: self.app.chat_input[0].set_value(message).run())
+        self.check()
+        return seconds
+
+    def click(self, label: str) -> float:
+        button = next(button for button in self.app.button if button.label == label)
+        seconds = timed(lambda: button.click().run())
+        self.check()
+        return seconds
+
+    def bot_response(self, message: str, document_digest: Optional[str] = None) -> float:
+        """Queue a reply to `message` like the upload section does and run generate_bot_response()."""
+        self.state.messages = self.state.messages + [{"role": "user", "content": message}]
+        self.state.pending_bot_response = True
+        if document_digest is not None:
+            self.state.pending_document = document_digest
+        seconds = timed(self.app.run)
+        self.check()
+        return seconds
+
+
+def bench_chat(turns: int) -> Dict:
+    session = AppSession()
+    latencies, tokens = [], []
+    for turn in range(turns):
+        latencies.append(session.chat(CHAT_MESSAGES[turn % len(CHAT_MESSAGES)]))
+        tokens.append(session.prompt_tokens())
+    return summarize(latencies, tokens)
+
+
+def bench_bot_response(turns: int) -> Dict:
+    session = AppSession()
+    latencies, tokens = [], []
+    for turn in range(turns):
+        latencies.append(session.bot_response(CHAT_MESSAGES[turn % len(CHAT_MESSAGES)]))
+        tokens.append(session.prompt_tokens())
+    return summarize(latencies, tokens)
+
+
+def bench_quick_query(turns: int) -> Dict:
+    session = AppSession()
+    latencies, tokens = [], []
+    for _ in range(turns):
+        latencies.append(session.click("Sleep Improvement"))
+        tokens.append(session.prompt_tokens())
+    return summarize(latencies, tokens, first_seconds=latencies[0] if latencies else None)
+
+
+def bench_health_check(turns: int) -> Dict:
+    session = AppSession()
+    latencies, tokens = [], []
+    for turn in range(turns):
+        session.number_input("Weight (kg)").set_value(70 + turn % 3)
+        session.number_input("Sleep Hours").set_value(6 + turn % 3)
+        latencies.append(session.click("Save Progress"))
+        tokens.append(session.prompt_tokens())
+    return summarize(latencies, tokens)
+
+
+def bench_document(turns: int, pages: int) -> Dict:
+    from config import EXTRACT_CACHE_DIR, EXTRACT_MAX_CHARS, EXTRACT_MAX_PAGES, EXTRACT_WORKERS, UPLOAD_DIR
+    from document_index import DocumentIndex
+    from document_ingest import DocumentExtractor
+    from upload_store import UploadStore
+
+    session = AppSession()
+    session.chat(CHAT_MESSAGES[0])
+    pdf_path = os.path.abspath("report.pdf")
+    make_pdf(pdf_path, pages)
+
+    with open(pdf_path, "rb") as file:
+        upload_seconds = timed(lambda: UploadStore(UPLOAD_DIR).save(file, "report.pdf"))
+    with open(pdf_path, "rb") as file:
+        record = UploadStore(UPLOAD_DIR).save(file, "report.pdf")
+
+    # Same extractor settings as read_pdf(); a fresh cache directory per run measures cold extraction
+    cold, result = [], None
+    for run in range(turns):
+        extractor = DocumentExtractor(os.path.join(EXTRACT_CACHE_DIR, f"cold-{run}"), max_pages=EXTRACT_MAX_PAGES,
+                                      max_chars=EXTRACT_MAX_CHARS, max_workers=EXTRACT_WORKERS)
+        started = time.perf_counter()
+        result = extractor.extract(record["path"], record["digest"])
+        cold.append(time.perf_counter() - started)
+        if result.get("error"):
+            raise RuntimeError(f"Extraction failed: {result['error']}")
+    warm = [timed(lambda: extractor.extract(record["path"], record["digest"])) for _ in range(turns)]
+
+    index = DocumentIndex.load(session.state.document_index.path)
+    index_seconds = timed(lambda: index.add_document(record["digest"], record["name"], result["text"]))
+    index.save()
+    # Reload the user's index on the next run, as index_document() does
+    session.state.document_index = None
+
+    latencies, tokens = [], []
+    for _ in range(turns):
+        latencies.append(session.bot_response(f"Process this file: {record['name']}", record["digest"]))
+        tokens.append(session.prompt_tokens())
+    return summarize(
+        latencies,
+        tokens,
+        pages=result["num_pages"],
+        characters=len(result["text"]),
+        upload_seconds=upload_seconds,
+        extract_cold_p50_seconds=percentile(cold, 0.5),
+        extract_cached_p50_seconds=percentile(warm, 0.5),
+        index_seconds=index_seconds,
+    )
+
+
+def bench_storage(writes: int) -> Dict:
+    from agent_storage import create_agent_storage
+    from config import AGENT_DB_FILE, HEALTH_DB_FILE
+    from health_store import HealthStore
+    from symptom_store import SymptomStore
+
+    # Re-write the sessions the other scenarios produced, so the payloads have realistic sizes
+    storage = create_agent_storage("sqlite", table_name="phsycatrist", db_file=AGENT_DB_FILE)
+    sessions = storage.get_all_sessions()
+    agent_writes = []
+    for run in range(writes):
+        if sessions:
+            session = sessions[run % len(sessions)]
+            agent_writes.append(timed(lambda: storage.upsert(session)))
+
+    health_store = HealthStore(HEALTH_DB_FILE)
+    health_writes = [timed(lambda: health_store.add("bench", 70.0, "😐", 7)) for _ in range(writes)]
+    symptom_store = SymptomStore(HEALTH_DB_FILE)
+    symptom_writes = [timed(lambda: symptom_store.add("bench", ["headache", "fatigue"], 5, "2 days"))
+                      for _ in range(writes)]
+    return {
+        "agent_sessions": len(sessions),
+        "agent_session_bytes_max": max((len(json.dumps(s.model_dump(), default=str)) for s in sessions), default=0),
+        "agent_write_p50_seconds": percentile(agent_writes, 0.5),
+        "agent_write_p95_seconds": percentile(agent_writes, 0.95),
+        "health_write_p50_seconds": percentile(health_writes, 0.5),
+        "symptom_write_p50_seconds": percentile(symptom_writes, 0.5),
+    }
+
+
+COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=300)
+imported = time.perf_counter()
+app.run()
+rendered = time.perf_counter()
+app.text_input[0].input("Bench")
+app.number_input[0].set_value(30)
+app.button[0].click().run()
+submitted = time.perf_counter()
+from startup import STARTUP
+print(json.dumps({
+    "streamlit_import_seconds": imported - started,
+    "first_render_seconds": rendered - imported,
+    "after_form_seconds": submitted - rendered,
+    "exception": str(app.exception[0].message) if app.exception else None,
+    "startup": STARTUP.report(),
+}))
+"""
+
+
+def bench_startup(runs: int) -> Dict:
+    """Cold starts, each in a new interpreter so no module or cached resource is reused."""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_SCRIPT, APP_FILE],
+            capture_output=True, text=True, check=True, env=dict(os.environ, PYTHONPATH=REPO_DIR),
+        ).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        if sample["exception"]:
+            raise RuntimeError(f"App raised: {sample['exception']}")
+        samples.append(sample)
+    imports: Dict[str, List[float]] = {}
+    for sample in samples:
+        for name, seconds in sample["startup"]["imports"].items():
+            imports.setdefault(name, []).append(seconds)
+    return summarize(
+        [sample["first_render_seconds"] for sample in samples],
+        streamlit_import_p50_seconds=percentile([s["streamlit_import_seconds"] for s in samples], 0.5),
+        after_form_p50_seconds=percentile([s["after_form_seconds"] for s in samples], 0.5),
+        script_imports_p50_seconds=percentile(
+            [s["startup"]["phases"].get("script_imports", 0.0) for s in samples], 0.5
+        ),
+        preloaded_imports_p50_seconds={name: percentile(values, 0.5) for name, values in imports.items()},
+    )
+
+
+# AppTest runs scripts as __main__ and leaves sys.modules["__main__"] pointing at
+# the last one; spawned workers need this module there to find their target
+BENCHMARK_MODULE = sys.modules[__name__]
+
+
+def _concurrent_session(number: int, turns: int, barrier, results) -> None:
+    """Worker process: one session sending chat turns once every session is ready."""
+    try:
+        session = AppSession(name=f"Bench {number}")
+        barrier.wait()
+        latencies = [session.chat(CHAT_MESSAGES[(number + turn) % len(CHAT_MESSAGES)]) for turn in range(turns)]
+        results.put((number, latencies, None))
+    except Exception as e:
+        barrier.abort()
+        results.put((number, [], str(e)))
+
+
+def bench_concurrency(sessions: int, turns: int) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    # The extra party is this process, so the clock starts when every session is ready
+    barrier = context.Barrier(sessions + 1)
+    results = context.Queue()
+    workers = [context.Process(target=_concurrent_session, args=(number, turns, barrier, results))
+               for number in range(sessions)]
+    main_module = sys.modules["__main__"]
+    sys.modules["__main__"] = BENCHMARK_MODULE
+    try:
+        for worker in workers:
+            worker.start()
+    finally:
+        sys.modules["__main__"] = main_module
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    started = time.perf_counter()
+    outcomes = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+    errors = [error for _, _, error in outcomes if error]
+    if errors:
+        raise RuntimeError(f"{len(errors)} session(s) failed: {errors[0]}")
+    latencies = [seconds for _, session_latencies, _ in outcomes for seconds in session_latencies]
+    return summarize(latencies, sessions=sessions, turns_per_second=len(latencies) / elapsed)
+
+
+def bench_long_session(turns: int) -> Dict:
+    """Full reruns (no model call) with a short and a long chat history; they should cost about the same."""
+    session = AppSession()
+
+    def rerun_seconds(messages: int) -> List[float]:
+        session.state.messages = [
+            {"role": "user" if number % 2 == 0 else "assistant", "content": CHAT_MESSAGES[number % len(CHAT_MESSAGES)]}
+            for number in range(messages)
+        ]
+        latencies = [timed(session.app.run) for _ in range(turns)]
+        session.check()
+        return latencies
+
+    short = rerun_seconds(10)
+    return summarize(rerun_seconds(LONG_SESSION_MESSAGES), messages=LONG_SESSION_MESSAGES,
+                     short_session_p50_seconds=percentile(short, 0.5))
+
+
+def bench_routing(turns: int) -> Dict:
+    """Chat replies on the large model alone, then through the router; the app's Generation without the UI."""
+    from phi.agent import Agent
+
+    from assistant import Generation, build_base_model, build_scheduler
+    from config import ROUTER_CLINICAL_TERMS, ROUTER_SMALL_MAX_WORDS
+    from model_router import LARGE, SMALL, ModelRouter
+    from telemetry import Trace
+
+    scheduler = build_scheduler()
+
+    def make_router(small_model_id=None, **settings):
+        models = {LARGE: ROUTING_MODELS["large"]}
+        if small_model_id is not None:
+            models[SMALL] = small_model_id
+        return ModelRouter(models, build_base_model, small_max_words=ROUTER_SMALL_MAX_WORDS, clinical_terms=ROUTER_CLINICAL_TERMS,
+                           **settings)
+
+    def reply_seconds(router, turns):
+        latencies, small_turns = [], 0
+        for turn in range(turns):
+            message = CHAT_MESSAGES[turn % len(CHAT_MESSAGES)]
+            generation = Generation(scheduler, router, router.route("chat", message), "bench-routing",
+                                    Agent(model=router.new_model(LARGE), markdown=True), message, Trace("chat"))
+            latencies.append(timed(lambda: list(generation.deltas())))
+            small_turns += generation.jobs[-1][0] == SMALL
+        return latencies, small_turns
+
+    large_only, _ = reply_seconds(make_router(), turns)
+    routed, small_turns = reply_seconds(make_router(ROUTING_MODELS["small"]), turns)
+    # The first message is short and everyday, so it goes to the stalled small model first
+    stalled_router = make_router(ROUTING_MODELS["stalled"], first_token_timeout_seconds=ROUTING_FIRST_TOKEN_TIMEOUT)
+    fallback, _ = reply_seconds(stalled_router, 1)
+    return summarize(
+        routed,
+        large_only_p50_seconds=percentile(large_only, 0.5),
+        small_model_share=small_turns / turns if turns else 0.0,
+        fallback_seconds=fallback[0],
+    )
+
+
+def bench_session_load(turns: int) -> Dict:
+    """Session reads as the table ages, and as one session runs on; they should cost about the same."""
+    from phi.agent.session import AgentSession
+    from sqlalchemy import update
+
+    from agent_storage import BufferedAgentStorage, create_agent_storage
+    from config import AGENT_MEMORY_MAX_RUNS
+    from storage_maintenance import StorageMaintenance
+
+    storage = create_agent_storage("sqlite", table_name="phsycatrist", db_file="session_load.db")
+    prompt = " ".join(CHAT_MESSAGES) * 10
+
+    def session(session_id: str, runs: int, buffered: BufferedAgentStorage) -> None:
+        # Runs shaped like the agent's: each stores the prompt it was sent and the reply
+        memory = {"runs": [], "messages": [{"role": "system", "content": prompt}]}
+        for run in range(runs):
+            user, reply = {"role": "user", "content": prompt}, {"role": "assistant", "content": prompt}
+            memory["messages"] += [user, reply]
+            memory["runs"].append({"message": user, "response": {"content": reply["content"],
+                                                                 "messages": [memory["messages"][0], user, reply]}})
+            buffered.upsert(AgentSession(session_id=session_id, memory=memory, agent_data={}, session_data={}))
+            buffered.flush()
+
+    def read_seconds(session_id: str) -> List[float]:
+        return [timed(lambda: storage.read(session_id)) for _ in range(turns * 5)]
+
+    capped = BufferedAgentStorage(storage, max_runs=AGENT_MEMORY_MAX_RUNS)
+    session("current", 10, capped)
+    young = read_seconds("current")
+    now = time.time()
+    for number in range(AGED_SESSIONS):
+        session(f"aged-{number}", AGED_SESSION_TURNS, BufferedAgentStorage(storage))
+    with storage.db_engine.begin() as connection:
+        for number in range(AGED_SESSIONS):
+            connection.execute(update(storage.table).where(storage.table.c.session_id == f"aged-{number}").values(
+                created_at=int(now - number % AGED_SESSION_MAX_DAYS * 24 * 60 * 60), updated_at=None
+            ))
+    aged = read_seconds("current")
+    maintenance = StorageMaintenance(storage)
+    size_before = maintenance.report(top=0)["file_bytes"]
+    maintenance_seconds = timed(maintenance.run)
+    size_after = maintenance.report(top=0)["file_bytes"]
+    maintained = read_seconds("current")
+
+    session("long-uncapped", LONG_SESSION_TURNS, BufferedAgentStorage(storage))
+    session("long-capped", LONG_SESSION_TURNS, capped)
+    return summarize(
+        maintained,
+        young_table_p50_seconds=percentile(young, 0.5),
+        aged_table_p50_seconds=percentile(aged, 0.5),
+        maintenance_seconds=maintenance_seconds,
+        file_bytes_before_maintenance=size_before,
+        file_bytes_after_maintenance=size_after,
+        long_session_uncapped_p50_seconds=percentile(read_seconds("long-uncapped"), 0.5),
+        long_session_capped_p50_seconds=percentile(read_seconds("long-capped"), 0.5),
+    )
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Metrics that are worse than the baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+    for scenario, metrics in results["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(scenario, {})
+        for metric in COMPARED_METRICS:
+            value, expected = metrics.get(metric), reference.get(metric)
+            if value is None or not expected:
+                continue
+            if value > expected * (1 + tolerance):
+                regressions.append(f"{scenario}.{metric}: {value:.4g} vs baseline {expected:.4g} "
+                                   f"(+{(value / expected - 1) * 100:.0f}%)")
+        reference_throughput = reference.get("turns_per_second")
+        throughput = metrics.get("turns_per_second")
+        if reference_throughput and throughput and throughput < reference_throughput * (1 - tolerance):
+            regressions.append(f"{scenario}.turns_per_second: {throughput:.4g} vs baseline {reference_throughput:.4g}")
+    return regressions
+
+
+def print_results(results: Dict) -> None:
+    for scenario, metrics in results["scenarios"].items():
+        print(f"\n[{scenario}]")
+        for metric, value in metrics.items():
+            print(f"  {metric:28} {value:.4g}" if isinstance(value, float) else f"  {metric:28} {value}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a fake Ollama server")
+    parser.add_argument("--turns", type=int, default=6, help="Turns per scenario")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions in the concurrency scenario")
+    parser.add_argument("--pages", type=int, default=20, help="Pages of the generated report")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Fake model generation speed")
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="Fake model latency in seconds")
+    parser.add_argument("--model-parallel", type=int, default=2, help="Requests the fake model generates at once")
+    parser.add_argument("--scenarios",
+                        default="chat,bot_response,quick_query,health_check,document,storage,startup,concurrency,"
+                                "long_session,routing,session_load")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Save this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression as a fraction")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(tokens_per_second=args.tokens_per_second,
+                              first_token_latency=args.first_token_latency,
+                              max_parallel=args.model_parallel,
+                              model_profiles={
+                                  ROUTING_MODELS["small"]: {
+                                      "tokens_per_second": args.tokens_per_second * ROUTING_SMALL_SPEEDUP,
+                                      "prompt_tokens_per_second": 2000.0 * ROUTING_SMALL_SPEEDUP,
+                                  },
+                                  ROUTING_MODELS["stalled"]: {"first_token_latency": ROUTING_STALL_SECONDS},
+                              }).start()
+    workdir = tempfile.mkdtemp(prefix="wellness-bench-")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    # Must be set before the app imports config
+    os.environ.update({
+        "OLLAMA_HOST": server.url,
+        "AGENT_STORAGE_BACKEND": "sqlite",
+        "AGENT_DB_FILE": os.path.join(workdir, "wellness_agent.db"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "INDEX_DIR": os.path.join(workdir, "indexes"),
+    })
+    for name in ("RESPONSE_CACHE_DB_FILE", "HEALTH_DB_FILE", "EXTRACT_CACHE_DIR"):
+        os.environ.pop(name, None)
+
+    scenarios = {
+        "chat": lambda: bench_chat(args.turns),
+        "bot_response": lambda: bench_bot_response(args.turns),
+        "quick_query": lambda: bench_quick_query(args.turns),
+        "health_check": lambda: bench_health_check(args.turns),
+        "document": lambda: bench_document(args.turns, args.pages),
+        "storage": lambda: bench_storage(args.turns * 10),
+        "startup": lambda: bench_startup(args.turns),
+        "concurrency": lambda: bench_concurrency(args.sessions, args.turns),
+        "long_session": lambda: bench_long_session(args.turns),
+        "routing": lambda: bench_routing(args.turns),
+        "session_load": lambda: bench_session_load(args.turns),
+    }
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "settings": {key: value for key, value in vars(args).items()
+                     if key not in ("baseline", "update_baseline", "output")},
+        "scenarios": {},
+    }
+    try:
+        for name in selected:
+            print(f"Running {name}...", flush=True)
+            results["scenarios"][name] = scenarios[name]()
+        results["model_requests"] = server.requests
+    finally:
+        os.chdir(previous_dir)
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline.get("settings") != results["settings"]:
+        print("\nWarning: the baseline was recorded with different settings")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
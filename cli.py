@@ -0,0 +1,182 @@
+"""
+Command line entry points that run without Streamlit.
+
+    python cli.py serve [--host 0.0.0.0] [--port 8000] [--workers 4]
+    python cli.py batch turns.jsonl [--output results.jsonl] [--concurrency 4]
+    python cli.py db-report [--top 20] [--json]
+    python cli.py db-maintain
+
+`serve` runs the HTTP API (api.py) with uvicorn. Every worker process builds
+its own scheduler and model client; sessions live in agent storage, so any
+worker can serve any of them.
+
+`batch` runs turns from a JSONL file through the same WellnessService, one
+JSON object per line:
+
+    {"session": "a", "user_info": {"name": "Sam", "age": 30}, "type": "chat", "message": "I can't sleep"}
+    {"session": "a", "type": "health_check", "weight": 70, "mood": "😐", "sleep_hours": 5}
+    {"session": "a", "type": "document", "path": "reports/blood_test.pdf"}
+    {"session": "a", "type": "health_import", "path": "exports/tracker.csv"}
+
+"session" is a label that groups lines into one conversation. The first line
+of a label starts a session with its "user_info", unless it gives the
+"session_id" of a stored session instead. Lines of one session run in order;
+different sessions run concurrently. "type" defaults to "chat". One result
+per line is written to the output in input order.
+
+`db-report` prints the size of the agent session table and the sessions that
+take the most space, with the runs and messages each one stores.
+`db-maintain` runs one pass of the storage maintenance (retention, compaction,
+vacuuming) that the app and the API otherwise run on a schedule. Unlike the
+scheduled passes, it converts a SQLite file without incremental auto-vacuum
+with one full VACUUM, which locks the file while it runs.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+from config import API_HOST, API_PORT, API_WORKERS, BATCH_CONCURRENCY
+
+
+def serve(args) -> int:
+    import uvicorn
+
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+    return 0
+
+
+def run_turn(service, session_id: str, line: Dict) -> Dict:
+    from assistant import collect
+
+    kind = line.get("type", "chat")
+    if kind == "chat":
+        events = service.chat(session_id, line["message"])
+    elif kind == "health_check":
+        events = service.health_check(session_id, line["weight"], line["mood"], line["sleep_hours"])
+    elif kind == "document":
+        with open(line["path"], "rb") as source:
+            events = service.process_document(session_id, source, line.get("name") or os.path.basename(line["path"]))
+    elif kind == "health_import":
+        with open(line["path"], "rb") as source:
+            events = service.import_health_history(session_id, source, line.get("name") or line["path"])
+    else:
+        raise ValueError(f"Unknown turn type {kind!r}, expected chat, health_check, document or health_import")
+    return collect(events)
+
+
+def run_session(service, label: str, lines: List[Dict]) -> List[Dict]:
+    """Run one session's lines in order; a failed line is reported and the rest still run."""
+    results = []
+    session_id = lines[0][1].get("session_id")
+    for number, line in lines:
+        result = {"line": number, "session": label, "type": line.get("type", "chat")}
+        started = time.perf_counter()
+        try:
+            if session_id is None:
+                if "user_info" not in line:
+                    raise ValueError("the first line of a session needs user_info or session_id")
+                session_id = service.create_session(line["user_info"])["session_id"]
+            final = run_turn(service, session_id, line)
+            result.update(
+                text=final.get("text"),
+                prompt_tokens_estimate=(final.get("prompt_usage") or {}).get("total_tokens"),
+            )
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["session_id"] = session_id
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        results.append(result)
+    return results
+
+
+def batch(args) -> int:
+    from assistant import WellnessService
+
+    sessions: "OrderedDict[str, list]" = OrderedDict()
+    with open(args.input, "r", encoding="utf-8") as file:
+        for number, text in enumerate(file, start=1):
+            if not text.strip():
+                continue
+            line = json.loads(text)
+            label = str(line.get("session") or line.get("session_id") or f"line-{number}")
+            sessions.setdefault(label, []).append((number, line))
+
+    service = WellnessService()
+    results = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = [pool.submit(run_session, service, label, lines) for label, lines in sessions.items()]
+        for done, future in enumerate(as_completed(futures), start=1):
+            results.extend(future.result())
+            print(f"{done}/{len(futures)} sessions done", file=sys.stderr)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for result in sorted(results, key=lambda result: result["line"]):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    failed = sum(1 for result in results if "error" in result)
+    print(f"{len(results)} turns in {time.perf_counter() - started:.1f}s, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def db_report(args) -> int:
+    from assistant import build_agent_storage, build_storage_maintenance
+    from storage_maintenance import format_report
+
+    report = build_storage_maintenance(build_agent_storage(), start=False).report(top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("\n".join(format_report(report)))
+    return 0
+
+
+def db_maintain(args) -> int:
+    from assistant import build_agent_storage, build_storage_maintenance
+
+    result = build_storage_maintenance(build_agent_storage(), start=False).run(convert_auto_vacuum=True)
+    if result["vacuum"] == "converted":
+        print("Converted the agent database to incremental auto-vacuum (one full VACUUM)")
+    print(f"Deleted {result['expired']} and compacted {result['compacted']} session(s) in {result['seconds']}s")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Psychiatrist Wellness Assistant without Streamlit")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run the HTTP API")
+    serve_parser.add_argument("--host", default=API_HOST)
+    serve_parser.add_argument("--port", type=int, default=API_PORT)
+    serve_parser.add_argument("--workers", type=int, default=API_WORKERS)
+    serve_parser.set_defaults(run=serve)
+
+    batch_parser = commands.add_parser("batch", help="Run turns from a JSONL file")
+    batch_parser.add_argument("input", help="JSONL file with one turn per line")
+    batch_parser.add_argument("--output", help="Write results here instead of stdout")
+    batch_parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                              help="Sessions run at the same time")
+    batch_parser.set_defaults(run=batch)
+
+    report_parser = commands.add_parser("db-report", help="Report the size of the agent session table")
+    report_parser.add_argument("--top", type=int, default=20, help="Largest sessions listed")
+    report_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    report_parser.set_defaults(run=db_report)
+
+    maintain_parser = commands.add_parser("db-maintain", help="Run the agent session table maintenance once")
+    maintain_parser.set_defaults(run=db_maintain)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Runtime settings for the Psychiatrist Wellness Assistant.
+
+Every value can be overridden with an environment variable (or a `.env` file,
+loaded through python-dotenv).
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _int_env(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"Ignoring invalid value for {name}: {value!r}")
+        return default
+
+
+def _float_env(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"Ignoring invalid value for {name}: {value!r}")
+        return default
+
+
+def _bool_env(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _list_env(name: str, default: str) -> tuple:
+    """Comma-separated values, e.g. ROUTER_SMALL_KINDS=summary,quick_query."""
+    value = os.getenv(name)
+    if value is None:
+        value = default
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
+def _duration_env(name: str, default: str):
+    """Ollama accepts durations as strings ("30m") or as a number of seconds."""
+    value = os.getenv(name, default).strip()
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+# Ollama model used by the psychiatrist agent
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:latest")
+
+# Word budget for a single reply; generation is stopped once it is exceeded
+MAX_RESPONSE_WORDS = _int_env("MAX_RESPONSE_WORDS", 1000)
+
+# Hard token cap passed to Ollama (num_predict). Leaves headroom over the word
+# budget for markdown and <think> reasoning blocks, which are not shown.
+OLLAMA_NUM_PREDICT = _int_env("OLLAMA_NUM_PREDICT", MAX_RESPONSE_WORDS * 2)
+
+# Agent session storage
+AGENT_DB_FILE = os.getenv("AGENT_DB_FILE", "wellness_agent.db")
+
+# Cache for the sidebar Quick Query answers, stored next to the agent database
+RESPONSE_CACHE_DB_FILE = os.getenv(
+    "RESPONSE_CACHE_DB_FILE", os.path.join(os.path.dirname(AGENT_DB_FILE), "response_cache.db")
+)
+RESPONSE_CACHE_MAX_ENTRIES = _int_env("RESPONSE_CACHE_MAX_ENTRIES", 500)
+RESPONSE_CACHE_TTL_SECONDS = _int_env("RESPONSE_CACHE_TTL_SECONDS", 24 * 60 * 60)
+# Serve expired answers immediately and regenerate them in the background
+RESPONSE_CACHE_SERVE_STALE = _bool_env("RESPONSE_CACHE_SERVE_STALE", True)
+
+# Inference scheduler: generations running at once against Ollama, and the
+# deadline (queueing plus generation) of a single reply
+INFERENCE_MAX_CONCURRENCY = _int_env("INFERENCE_MAX_CONCURRENCY", 2)
+INFERENCE_TIMEOUT_SECONDS = _int_env("INFERENCE_TIMEOUT_SECONDS", 180)
+
+# Agent session storage backend: "sqlite" (AGENT_DB_FILE) or "postgres" (AGENT_DB_URL)
+AGENT_STORAGE_BACKEND = os.getenv("AGENT_STORAGE_BACKEND", "sqlite")
+AGENT_DB_URL = os.getenv("AGENT_DB_URL")
+AGENT_DB_POOL_SIZE = _int_env("AGENT_DB_POOL_SIZE", 5)
+AGENT_DB_MAX_OVERFLOW = _int_env("AGENT_DB_MAX_OVERFLOW", 10)
+# Runs of an agent's memory written to storage; older runs are dropped
+AGENT_MEMORY_MAX_RUNS = _int_env("AGENT_MEMORY_MAX_RUNS", 10)
+
+# Rolling conversation summary: fold older turns into the summary every N turns,
+# keeping the most recent turns verbatim in the prompt
+SUMMARY_EVERY_N_TURNS = _int_env("SUMMARY_EVERY_N_TURNS", 4)
+SUMMARY_WINDOW_TURNS = _int_env("SUMMARY_WINDOW_TURNS", 3)
+SUMMARY_MAX_WORDS = _int_env("SUMMARY_MAX_WORDS", 150)
+
+# Ollama server address; None lets the ollama client use OLLAMA_HOST or its default
+OLLAMA_HOST = os.getenv("OLLAMA_HOST") or None
+
+# Model warm-up and keep-alive: how long Ollama keeps the model loaded after a
+# request, and how often the app pings it while sessions are active
+OLLAMA_KEEP_ALIVE = _duration_env("OLLAMA_KEEP_ALIVE", "30m")
+MODEL_PING_INTERVAL_SECONDS = _int_env("MODEL_PING_INTERVAL_SECONDS", 240)
+MODEL_ACTIVE_WINDOW_SECONDS = _int_env("MODEL_ACTIVE_WINDOW_SECONDS", 900)
+
+# Upload store: directory, size limit and how long unused uploads are kept
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_MAX_MB = _int_env("UPLOAD_MAX_MB", 20)
+UPLOAD_RETENTION_DAYS = _int_env("UPLOAD_RETENTION_DAYS", 30)
+UPLOAD_CLEANUP_INTERVAL_SECONDS = _int_env("UPLOAD_CLEANUP_INTERVAL_SECONDS", 3600)
+
+# Document extraction: limits per upload, process pool size and result cache
+EXTRACT_MAX_PAGES = _int_env("EXTRACT_MAX_PAGES", 50)
+EXTRACT_MAX_CHARS = _int_env("EXTRACT_MAX_CHARS", 100_000)
+EXTRACT_WORKERS = _int_env("EXTRACT_WORKERS", 2)
+EXTRACT_CACHE_DIR = os.getenv("EXTRACT_CACHE_DIR", os.path.join(UPLOAD_DIR, ".extracted"))
+
+# Retrieval over uploaded reports: per-user index directory, chunking and the
+# number of chunks put into each prompt
+INDEX_DIR = os.getenv("INDEX_DIR", "indexes")
+RETRIEVAL_CHUNK_WORDS = _int_env("RETRIEVAL_CHUNK_WORDS", 120)
+RETRIEVAL_CHUNK_OVERLAP = _int_env("RETRIEVAL_CHUNK_OVERLAP", 30)
+RETRIEVAL_TOP_K = _int_env("RETRIEVAL_TOP_K", 4)
+
+# Language detection: fallback language, ASCII messages shorter than this keep
+# the session's language, and the confidence needed to switch languages
+DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "en")
+LANGUAGE_SHORT_TEXT_CHARS = _int_env("LANGUAGE_SHORT_TEXT_CHARS", 20)
+LANGUAGE_SWITCH_CONFIDENCE = _float_env("LANGUAGE_SWITCH_CONFIDENCE", 0.9)
+
+# Health Tracker history: SQLite file (next to the agent database), window of
+# the rolling means and rows per history page
+HEALTH_DB_FILE = os.getenv("HEALTH_DB_FILE", os.path.join(os.path.dirname(AGENT_DB_FILE), "wellness_tracker.db"))
+HEALTH_TREND_WINDOW = _int_env("HEALTH_TREND_WINDOW", 7)
+HEALTH_HISTORY_PAGE_SIZE = _int_env("HEALTH_HISTORY_PAGE_SIZE", 10)
+
+# Symptom tracker: at most this many symptoms (most recently logged first) are
+# summarized in the chat prompt. Logs are stored in HEALTH_DB_FILE.
+SYMPTOM_SUMMARY_MAX_SYMPTOMS = _int_env("SYMPTOM_SUMMARY_MAX_SYMPTOMS", 8)
+
+# Telemetry: every turn's timing spans and Ollama metrics are appended to a JSONL
+# file and summed into a Prometheus textfile per process (the process id is added
+# before the extension; empty path disables either).
+# SHOW_DEBUG_PANEL adds a sidebar panel with the latest turns' breakdown.
+TELEMETRY_JSONL_FILE = os.getenv("TELEMETRY_JSONL_FILE", os.path.join("telemetry", "turns.jsonl"))
+TELEMETRY_PROMETHEUS_FILE = os.getenv("TELEMETRY_PROMETHEUS_FILE", os.path.join("telemetry", "wellness_assistant.prom"))
+SHOW_DEBUG_PANEL = _bool_env("SHOW_DEBUG_PANEL", False)
+
+# Headless entry points: address and worker processes of the HTTP API
+# (cli.py serve), and sessions run at once by cli.py batch
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = _int_env("API_PORT", 8000)
+API_WORKERS = _int_env("API_WORKERS", 1)
+BATCH_CONCURRENCY = _int_env("BATCH_CONCURRENCY", INFERENCE_MAX_CONCURRENCY)
+
+# Health history import: rows validated and written per batch, and the
+# analysis of the imported range. The range is split into windows (a week, or
+# longer for long histories) whose statistics are analysed in at most
+# HEALTH_IMPORT_MAX_CALLS model calls of up to HEALTH_IMPORT_WINDOWS_PER_CALL
+# windows each, HEALTH_IMPORT_CONCURRENCY calls at a time.
+HEALTH_IMPORT_BATCH_ROWS = _int_env("HEALTH_IMPORT_BATCH_ROWS", 5000)
+HEALTH_IMPORT_WINDOWS_PER_CALL = _int_env("HEALTH_IMPORT_WINDOWS_PER_CALL", 12)
+HEALTH_IMPORT_MAX_CALLS = _int_env("HEALTH_IMPORT_MAX_CALLS", 4)
+HEALTH_IMPORT_CONCURRENCY = _int_env("HEALTH_IMPORT_CONCURRENCY", 2)
+
+# Model routing: with OLLAMA_SMALL_MODEL set, summary folds, Quick Queries and
+# short everyday messages go to the small model, and reports, health analyses
+# and long or clinical messages (containing a ROUTER_CLINICAL_TERMS word
+# prefix) to OLLAMA_MODEL. A call with no output within
+# ROUTER_FIRST_TOKEN_TIMEOUT_SECONDS of starting, or that fails, is retried on
+# the other model, and the failing model is avoided for ROUTER_COOLDOWN_SECONDS.
+OLLAMA_SMALL_MODEL = os.getenv("OLLAMA_SMALL_MODEL", "")
+ROUTER_SMALL_KINDS = _list_env("ROUTER_SMALL_KINDS", "summary,quick_query")
+ROUTER_LARGE_KINDS = _list_env("ROUTER_LARGE_KINDS", "file_processing,health_check,health_import")
+ROUTER_SMALL_MAX_WORDS = _int_env("ROUTER_SMALL_MAX_WORDS", 25)
+ROUTER_CLINICAL_TERMS = _list_env(
+    "ROUTER_CLINICAL_TERMS",
+    "medic,dose,dosage,prescri,diagnos,symptom,suicid,harm,kill,die,hurt,overdose,panic,depress,anxi,"
+    "trauma,psychos,bipolar,hallucinat,blood,side effect,therap,pain,chest,breath",
+)
+ROUTER_FIRST_TOKEN_TIMEOUT_SECONDS = _float_env("ROUTER_FIRST_TOKEN_TIMEOUT_SECONDS", 20.0)
+ROUTER_COOLDOWN_SECONDS = _int_env("ROUTER_COOLDOWN_SECONDS", 120)
+
+# Chat history: only the latest CHAT_WINDOW_MESSAGES messages are rendered on
+# each run; "Load older messages" shows that many more
+CHAT_WINDOW_MESSAGES = _int_env("CHAT_WINDOW_MESSAGES", 20)
+
+# Agent session storage maintenance, every AGENT_MAINTENANCE_INTERVAL_SECONDS:
+# sessions idle for AGENT_COMPACT_AFTER_DAYS lose their run history and the
+# chat messages already in their summary, sessions idle for
+# AGENT_RETENTION_DAYS are deleted (0 disables either), and up to
+# AGENT_VACUUM_PAGES free SQLite pages are returned to the file system
+AGENT_MAINTENANCE_INTERVAL_SECONDS = _int_env("AGENT_MAINTENANCE_INTERVAL_SECONDS", 3600)
+AGENT_COMPACT_AFTER_DAYS = _int_env("AGENT_COMPACT_AFTER_DAYS", 7)
+AGENT_RETENTION_DAYS = _int_env("AGENT_RETENTION_DAYS", 90)
+AGENT_VACUUM_PAGES = _int_env("AGENT_VACUUM_PAGES", 2000)
@@ -0,0 +1,135 @@
+"""
+Per-user BM25 index over the text of uploaded reports.
+
+Reports are split into overlapping word chunks. Each chat turn puts only the
+top-k chunks relevant to the query into the prompt, instead of the raw
+documents. The index is local (no network or embedding model) and persisted as
+one JSON file per user. Documents are added incrementally and keyed by content
+digest, so re-processing a report does not index it twice.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Very common English words that carry no signal for retrieval
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have i in is it its me my of on or that the this to was "
+    "were what when which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_text(text: str, chunk_words: int = 120, overlap_words: int = 30) -> List[str]:
+    """Split text into chunks of `chunk_words` words, overlapping by `overlap_words`."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(chunk_words - overlap_words, 1)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+class DocumentIndex:
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        # Chunk i: {"digest", "name", "position", "text", "length"}
+        self.chunks: List[Dict] = []
+        # term -> {chunk id (as str, for JSON): term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.documents: Dict[str, Dict] = {}
+        self.total_length = 0
+
+    @classmethod
+    def load(cls, path: str) -> "DocumentIndex":
+        index = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            index.chunks = data["chunks"]
+            index.postings = data["postings"]
+            index.documents = data["documents"]
+            index.total_length = sum(chunk["length"] for chunk in index.chunks)
+        return index
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"chunks": self.chunks, "postings": self.postings, "documents": self.documents}, file)
+        os.replace(tmp_path, self.path)
+
+    def has_document(self, digest: str) -> bool:
+        return digest in self.documents
+
+    def add_document(self, digest: str, name: str, text: str, chunk_words: int = 120,
+                     overlap_words: int = 30) -> int:
+        """
+        Index a document's text; does nothing if the digest is already indexed.
+
+        :return: Number of chunks added
+        """
+        if digest in self.documents:
+            return 0
+        chunk_ids = []
+        for position, chunk in enumerate(chunk_text(text, chunk_words, overlap_words)):
+            tokens = tokenize(chunk)
+            chunk_id = len(self.chunks)
+            self.chunks.append(
+                {"digest": digest, "name": name, "position": position, "text": chunk, "length": len(tokens)}
+            )
+            self.total_length += len(tokens)
+            for term, frequency in Counter(tokens).items():
+                self.postings.setdefault(term, {})[str(chunk_id)] = frequency
+            chunk_ids.append(chunk_id)
+        self.documents[digest] = {"name": name, "chunks": chunk_ids}
+        return len(chunk_ids)
+
+    def search(self, query: str, k: int = 4, digest: Optional[str] = None) -> List[Dict]:
+        """
+        Return the k chunks with the highest BM25 score for the query.
+
+        :param digest: Restrict the search to one document
+        :return: Chunk dicts with an added "score", best first
+        """
+        if not self.chunks:
+            return []
+        average_length = self.total_length / len(self.chunks) or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(self.chunks) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_key, frequency in postings.items():
+                chunk_id = int(chunk_key)
+                chunk = self.chunks[chunk_id]
+                if digest is not None and chunk["digest"] != digest:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * chunk["length"] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [dict(self.chunks[chunk_id], score=score) for chunk_id, score in best]
+
+    def leading_chunks(self, digest: str, k: int = 4) -> List[Dict]:
+        """The first k chunks of a document, for turns that ask about the document as a whole."""
+        chunk_ids = self.documents.get(digest, {}).get("chunks", [])
+        return [self.chunks[chunk_id] for chunk_id in chunk_ids[:k]]
+
+
+def format_chunks(chunks: List[Dict]) -> str:
+    """Render retrieved chunks for the prompt, labelled with their source document."""
+    return "\n\n".join(f"[{chunk['name']}, part {chunk['position'] + 1}]\n{chunk['text']}" for chunk in chunks)
@@ -0,0 +1,156 @@
+"""
+Text extraction for uploaded reports.
+
+PDF pages are extracted in batches on a process pool, because PyPDF2 text
+extraction is CPU-bound. Pages are yielded in order as they complete, and
+extraction stops at the page or character limit. Plain-text files are read in
+chunks. Results are cached on disk by the upload's content digest, so
+processing the same report again returns immediately.
+"""
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max_workers)
+    return _pool
+
+
+def count_pdf_pages(path: str) -> int:
+    from PyPDF2 import PdfReader
+
+    with open(path, "rb") as file:
+        return len(PdfReader(file).pages)
+
+
+def _extract_pdf_pages(path: str, page_numbers: List[int]) -> List[Tuple[int, str]]:
+    """Worker: extract the text of the given pages (pages are parsed lazily by PyPDF2)."""
+    from PyPDF2 import PdfReader
+
+    with open(path, "rb") as file:
+        reader = PdfReader(file)
+        return [(number, (reader.pages[number].extract_text() or "").strip()) for number in page_numbers]
+
+
+def iter_pdf_pages(path: str, num_pages: int, max_workers: int = 2, batch_size: int = 4) -> Iterator[str]:
+    """
+    Yield the text of each page, in order, extracted on the process pool.
+
+    At most two batches per worker are in flight, so stopping early leaves little wasted work.
+    """
+    pool = _get_pool(max_workers)
+    batches = deque(
+        list(range(start, min(start + batch_size, num_pages))) for start in range(0, num_pages, batch_size)
+    )
+    in_flight = deque()
+    try:
+        while batches or in_flight:
+            while batches and len(in_flight) < 2 * max_workers:
+                in_flight.append(pool.submit(_extract_pdf_pages, path, batches.popleft()))
+            for _, text in in_flight.popleft().result():
+                yield text
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def iter_text_chunks(path: str, chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """Yield a text file's content in chunks, ignoring undecodable bytes."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class DocumentExtractor:
+    def __init__(self, cache_dir: str, max_pages: int = 50, max_chars: int = 100_000, max_workers: int = 2):
+        self.cache_dir = cache_dir
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.max_workers = max_workers
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def extract(self, path: str, digest: str,
+                progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Extract the text of a stored upload.
+
+        :param path: File path; ".pdf" files are parsed, anything else is read as text
+        :param digest: Content digest of the file, used as cache key
+        :param progress: Called as progress(done, total) with pages (PDF) or characters (text)
+        :return: {"num_pages", "pages", "text", "truncated", "cached", "error"}; "num_pages" is
+            None for text files, and on failure only "error" is set
+        """
+        cache_path = self._cache_path(digest)
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as file:
+                result = json.load(file)
+            result["cached"] = True
+            return result
+
+        try:
+            if path.lower().endswith(".pdf"):
+                result = self._extract_pdf(path, progress)
+            else:
+                result = self._extract_text(path, progress)
+        except FileNotFoundError:
+            return {"error": "File not found"}
+        except Exception as e:
+            return {"error": f"Error reading document: {str(e)}"}
+
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        os.replace(tmp_path, cache_path)
+        result["cached"] = False
+        return result
+
+    def _extract_pdf(self, path: str, progress: Optional[Callable[[int, int], None]]) -> Dict:
+        num_pages = count_pdf_pages(path)
+        total = min(num_pages, self.max_pages)
+        pages, chars = [], 0
+        truncated = num_pages > total
+        for text in iter_pdf_pages(path, total, max_workers=self.max_workers):
+            if chars + len(text) > self.max_chars:
+                pages.append(text[: self.max_chars - chars])
+                truncated = True
+                break
+            pages.append(text)
+            chars += len(text)
+            if progress is not None:
+                progress(len(pages), total)
+        return {
+            "num_pages": num_pages,
+            "pages": pages,
+            "text": "\n\n".join(pages),
+            "truncated": truncated,
+            "error": None,
+        }
+
+    def _extract_text(self, path: str, progress: Optional[Callable[[int, int], None]]) -> Dict:
+        total = min(os.path.getsize(path), self.max_chars)
+        parts, chars = [], 0
+        truncated = False
+        for chunk in iter_text_chunks(path):
+            if chars + len(chunk) > self.max_chars:
+                parts.append(chunk[: self.max_chars - chars])
+                truncated = True
+                break
+            parts.append(chunk)
+            chars += len(chunk)
+            if progress is not None:
+                progress(min(chars, total), total)
+        text = "".join(parts)
+        return {"num_pages": None, "pages": [text], "text": text, "truncated": truncated, "error": None}
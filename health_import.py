@@ -0,0 +1,328 @@
+"""
+Bulk import of Health Tracker history from other trackers.
+
+Files are parsed as a stream, so a file with years of entries never has to
+fit in memory:
+- CSV with a header row
+- JSON Lines (.jsonl / .ndjson), one object per line
+- JSON (.json): a top-level array of objects, decoded object by object
+
+Records are validated in batches as NumPy arrays. Weight and sleep columns
+are parsed in one pandas.to_numeric call each; dates and moods need
+per-cell parsing. The range, mood and timestamp checks then run on whole
+columns. Valid rows are written with HealthStore.add_many, one transaction
+per batch.
+
+Columns are matched case-insensitively, with common aliases:
+date/timestamp (ISO date or Unix seconds), weight (kg), mood (one of MOODS,
+a word like "good", or 1-3) and sleep (hours). Every row needs a date and at
+least one measurement.
+"""
+import codecs
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from health_store import MOODS, HealthStore
+
+if TYPE_CHECKING:
+    import numpy as np
+
+FORMATS = ("csv", "json", "jsonl")
+
+COLUMN_ALIASES = {
+    "ts": ("date", "timestamp", "time", "datetime", "ts", "day"),
+    "weight": ("weight", "weight_kg", "weight (kg)", "kg"),
+    "mood": ("mood", "feeling"),
+    "sleep_hours": ("sleep_hours", "sleep", "sleep (h)", "sleep_h", "hours_slept"),
+}
+
+MOOD_ALIASES = {
+    "😞": 0, "bad": 0, "low": 0, "sad": 0, "poor": 0, "1": 0,
+    "😐": 1, "ok": 1, "okay": 1, "neutral": 1, "fine": 1, "average": 1, "2": 1,
+    "😊": 2, "good": 2, "great": 2, "happy": 2, "3": 2,
+}
+
+MAX_WEIGHT_KG = 500
+# Rows dated further in the future than this are rejected
+MAX_FUTURE_SECONDS = 24 * 60 * 60
+MAX_REPORTED_ERRORS = 20
+
+
+class HealthImportError(ValueError):
+    """Raised when a file cannot be parsed as a health history."""
+
+
+def detect_format(name: str) -> str:
+    extension = os.path.splitext(name)[1].lower().lstrip(".")
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension in FORMATS:
+        return extension
+    raise HealthImportError(f"Unsupported file type '{extension}', expected CSV, JSON or JSON Lines")
+
+
+class CountingReader:
+    """Wraps a binary file object and counts the bytes read from it, for progress reporting."""
+
+    def __init__(self, source: BinaryIO):
+        self.source = source
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.source.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def _iter_text(source: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    while True:
+        data = source.read(chunk_size)
+        if not data:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(data)
+
+
+def _iter_lines(source: BinaryIO) -> Iterator[str]:
+    """Lines with their line endings, which the csv module needs for quoted multi-line cells."""
+    pending = ""
+    for text in _iter_text(source):
+        lines = (pending + text).splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        yield from lines
+    if pending:
+        yield pending
+
+
+def _iter_json_array(source: BinaryIO) -> Iterator[Dict]:
+    """Decode the objects of a top-level JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    chunks = _iter_text(source)
+    exhausted = False
+    while True:
+        # Skip whitespace, the opening bracket and separators
+        while position < len(buffer) and (buffer[position].isspace() or buffer[position] in ",["):
+            if buffer[position] == "[":
+                if started:
+                    raise HealthImportError("Nested arrays are not supported")
+                started = True
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        if position < len(buffer):
+            if not started:
+                raise HealthImportError("Expected a JSON array of objects")
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The object may continue in the next chunk
+                if exhausted:
+                    raise HealthImportError("Invalid JSON near the end of the file")
+                record = None
+            if record is not None:
+                if not isinstance(record, dict):
+                    raise HealthImportError("Expected a JSON array of objects")
+                yield record
+                position = end
+                continue
+        if exhausted:
+            if started:
+                raise HealthImportError("Unterminated JSON array")
+            return
+        try:
+            buffer = buffer[position:] + next(chunks)
+            position = 0
+        except StopIteration:
+            exhausted = True
+
+
+def iter_records(source: BinaryIO, file_format: str) -> Iterator[Dict]:
+    """Yield the file's records as dicts, reading it incrementally."""
+    if file_format == "csv":
+        yield from csv.DictReader(_iter_lines(source))
+    elif file_format == "jsonl":
+        for number, line in enumerate(_iter_lines(source), start=1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise HealthImportError(f"Invalid JSON on line {number}: {e}")
+                if not isinstance(record, dict):
+                    raise HealthImportError(f"Line {number} is not a JSON object")
+                yield record
+    elif file_format == "json":
+        yield from _iter_json_array(source)
+    else:
+        raise HealthImportError(f"Unknown format {file_format!r}, expected one of {FORMATS}")
+
+
+def iter_batches(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _column(rows: List[Dict], field: str) -> List:
+    """A field's values across rows, matching column names case-insensitively via COLUMN_ALIASES."""
+    aliases = COLUMN_ALIASES[field]
+    values = []
+    for row in rows:
+        value = None
+        for key, cell in row.items():
+            if key is not None and key.strip().lower() in aliases:
+                value = cell
+                break
+        values.append(value)
+    return values
+
+
+def _to_timestamp(value) -> float:
+    if value is None:
+        return float("nan")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        # Naive timestamps are local time, like entries saved from the app
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return float("nan")
+
+
+def _to_mood(value) -> float:
+    if value is None:
+        return float("nan")
+    text = str(value).strip().lower()
+    if text.endswith(".0"):
+        text = text[:-2]
+    index = MOOD_ALIASES.get(text)
+    return float("nan") if index is None else float(index)
+
+
+def _is_blank(value) -> bool:
+    return value is None or str(value).strip() == ""
+
+
+def validate_batch(rows: List[Dict], first_row: int = 1,
+                   now: Optional[float] = None) -> Tuple[Dict[str, "np.ndarray"], List[Tuple[int, str]]]:
+    """
+    Convert and validate a batch of records.
+
+    :param first_row: Row number of rows[0], for error messages
+    :return: (columns, errors): aligned float arrays ("ts", "weight", "mood",
+        "sleep_hours", NaN where missing) of the valid rows, and (row number,
+        reason) for every rejected row
+    """
+    import numpy as np
+    import pandas as pd
+
+    now = time.time() if now is None else now
+    raw = {field: pd.Series(_column(rows, field), dtype=object) for field in COLUMN_ALIASES}
+    columns = {
+        "ts": np.frompyfunc(_to_timestamp, 1, 1)(raw["ts"].to_numpy()).astype(float),
+        "mood": np.frompyfunc(_to_mood, 1, 1)(raw["mood"].to_numpy()).astype(float),
+    }
+    for field in ("weight", "sleep_hours"):
+        values = pd.to_numeric(raw[field], errors="coerce").to_numpy(dtype=float)
+        # to_numeric reads True as 1; a boolean is no measurement
+        values[raw[field].map(type).eq(bool).to_numpy()] = np.nan
+        columns[field] = values
+    # A blank cell always converts to NaN, so only those cells are checked
+    blank = {}
+    for field in ("weight", "mood", "sleep_hours"):
+        blank[field] = np.zeros(len(rows), dtype=bool)
+        unparsed = np.nonzero(np.isnan(columns[field]))[0]
+        blank[field][unparsed] = [_is_blank(raw[field].iat[index]) for index in unparsed]
+    ts, weight, mood, sleep = columns["ts"], columns["weight"], columns["mood"], columns["sleep_hours"]
+
+    checks = [
+        (np.isnan(ts), "missing or unreadable date"),
+        (ts > now + MAX_FUTURE_SECONDS, "date is in the future"),
+        (~blank["weight"] & (np.isnan(weight) | (weight <= 0) | (weight > MAX_WEIGHT_KG)),
+         f"weight must be a number between 0 and {MAX_WEIGHT_KG} kg"),
+        (~blank["sleep_hours"] & (np.isnan(sleep) | (sleep < 0) | (sleep > 24)),
+         "sleep must be a number of hours between 0 and 24"),
+        (~blank["mood"] & np.isnan(mood), f"mood must be one of {' '.join(MOODS)}, a word like 'good', or 1-3"),
+        (np.isnan(weight) & np.isnan(mood) & np.isnan(sleep), "no weight, mood or sleep value"),
+    ]
+    invalid = np.zeros(len(rows), dtype=bool)
+    errors = []
+    for failed, reason in checks:
+        new = failed & ~invalid
+        errors.extend((first_row + int(index), reason) for index in np.nonzero(new)[0])
+        invalid |= failed
+    errors.sort()
+    valid = ~invalid
+    return {field: values[valid] for field, values in columns.items()}, errors
+
+
+def import_history(store: HealthStore, user_key: str, source: BinaryIO, name: str, batch_size: int = 5000,
+                   progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+    """
+    Stream a history file into the store.
+
+    :param name: File name; its extension selects the format
+    :param progress: Called as progress(bytes_read, total_bytes) after every batch
+        (total_bytes is 0 if the size is unknown)
+    :return: {"rows", "imported", "duplicates", "invalid", "errors" (first
+        MAX_REPORTED_ERRORS as "row N: reason"), "since", "until"}; since/until
+        are the time range of the imported rows, or None if nothing was imported
+    :raises HealthImportError: If the file cannot be parsed
+    """
+    file_format = detect_format(name)
+    total = 0
+    if hasattr(source, "seek") and hasattr(source, "tell"):
+        source.seek(0, os.SEEK_END)
+        total = source.tell()
+        source.seek(0)
+    reader = CountingReader(source)
+    report = {"rows": 0, "imported": 0, "duplicates": 0, "invalid": 0, "errors": [], "since": None, "until": None}
+    try:
+        for batch in iter_batches(iter_records(reader, file_format), batch_size):
+            # Row numbers count data rows from 1, as a spreadsheet would below its header
+            columns, errors = validate_batch(batch, first_row=report["rows"] + 1)
+            report["rows"] += len(batch)
+            report["invalid"] += len(errors)
+            room = MAX_REPORTED_ERRORS - len(report["errors"])
+            report["errors"].extend(f"row {row}: {reason}" for row, reason in errors[:max(room, 0)])
+            imported = store.add_many(user_key, columns["ts"], columns["weight"], columns["mood"],
+                                      columns["sleep_hours"])
+            report["imported"] += imported
+            report["duplicates"] += int(columns["ts"].size) - imported
+            if columns["ts"].size:
+                since, until = float(columns["ts"].min()), float(columns["ts"].max())
+                report["since"] = since if report["since"] is None else min(report["since"], since)
+                report["until"] = until if report["until"] is None else max(report["until"], until)
+            if progress is not None:
+                progress(reader.bytes_read, total)
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise HealthImportError(f"Could not read '{name}': {e}")
+    return report
+
+
+def format_import_report(report: Dict) -> str:
+    text = f"Imported {report['imported']} of {report['rows']} rows"
+    if report["duplicates"]:
+        text += f", {report['duplicates']} already recorded"
+    if report["invalid"]:
+        text += f", {report['invalid']} invalid"
+    return text + "."
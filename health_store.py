@@ -0,0 +1,292 @@
+"""
+Persistent store for Health Tracker entries.
+
+Entries are kept in a compact per-user time-series table in SQLite, indexed by
+(user_key, ts). Mood is stored as its index in MOODS. Trend analysis loads a
+user's series as NumPy arrays and computes the aggregates that feed the
+health check prompt: rolling means, per-week trends and the mood distribution.
+NumPy is imported on first use, so pages that only read or write entries do
+not load it.
+"""
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from sqlite_util import connect
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MOODS = ["😞", "😐", "😊"]
+
+SECONDS_PER_WEEK = 7 * 24 * 60 * 60
+
+
+class HealthStore:
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS health_metrics (
+                    user_key TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    weight REAL,
+                    mood INTEGER,
+                    sleep_hours REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_health_metrics_user_ts ON health_metrics (user_key, ts)")
+
+    def _connect(self):
+        return connect(self.db_file)
+
+    def add(self, user_key: str, weight: Optional[float], mood: str, sleep_hours: Optional[float],
+            timestamp: Optional[float] = None) -> None:
+        """Record one entry; a weight or sleep of 0 (the widget defaults) is stored as missing."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO health_metrics (user_key, ts, weight, mood, sleep_hours) VALUES (?, ?, ?, ?, ?)",
+                (
+                    user_key,
+                    time.time() if timestamp is None else timestamp,
+                    weight if weight else None,
+                    MOODS.index(mood) if mood in MOODS else None,
+                    sleep_hours if sleep_hours else None,
+                ),
+            )
+
+    def add_many(self, user_key: str, ts: "np.ndarray", weight: "np.ndarray", mood: "np.ndarray",
+                 sleep_hours: "np.ndarray") -> int:
+        """
+        Record many entries in one transaction, as aligned float arrays with NaN for missing values.
+
+        Mood holds indexes into MOODS. Entries whose timestamp the user already
+        has (e.g. the same file imported twice) are skipped.
+
+        :return: Number of entries inserted
+        """
+        import numpy as np
+
+        if ts.size == 0:
+            return 0
+        # Duplicates within the batch keep their first occurrence
+        _, first = np.unique(ts, return_index=True)
+        keep = np.zeros(ts.size, dtype=bool)
+        keep[first] = True
+        with self._connect() as conn:
+            existing = np.array(
+                [row[0] for row in conn.execute(
+                    "SELECT ts FROM health_metrics WHERE user_key = ? AND ts BETWEEN ? AND ?",
+                    (user_key, float(ts.min()), float(ts.max())),
+                )],
+                dtype=float,
+            )
+            keep &= ~np.isin(ts, existing)
+
+            def column(values):
+                return [None if np.isnan(value) else float(value) for value in values[keep]]
+
+            moods = [None if value is None else int(value) for value in column(mood)]
+            conn.executemany(
+                "INSERT INTO health_metrics (user_key, ts, weight, mood, sleep_hours) VALUES (?, ?, ?, ?, ?)",
+                zip([user_key] * int(keep.sum()), ts[keep].tolist(), column(weight), moods, column(sleep_hours)),
+            )
+        return int(keep.sum())
+
+    def count(self, user_key: str) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM health_metrics WHERE user_key = ?", (user_key,)).fetchone()[0]
+
+    def latest(self, user_key: str) -> Dict:
+        """The newest entry as {"timestamp", "weight", "mood", "sleep_hours"}, or {} if none."""
+        rows = self.page(user_key, offset=0, limit=1)
+        return rows[0] if rows else {}
+
+    def page(self, user_key: str, offset: int = 0, limit: int = 20) -> List[Dict]:
+        """Entries newest first, for display."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT ts, weight, mood, sleep_hours FROM health_metrics
+                WHERE user_key = ? ORDER BY ts DESC LIMIT ? OFFSET ?
+                """,
+                (user_key, limit, offset),
+            ).fetchall()
+        return [
+            {
+                "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M"),
+                "weight": weight,
+                "mood": MOODS[mood] if mood is not None else None,
+                "sleep_hours": sleep_hours,
+            }
+            for ts, weight, mood, sleep_hours in rows
+        ]
+
+    def series(self, user_key: str, since: Optional[float] = None,
+               until: Optional[float] = None) -> Dict[str, "np.ndarray"]:
+        """A user's entries as float arrays ordered by time; missing values are NaN."""
+        import numpy as np
+
+        query = "SELECT ts, weight, mood, sleep_hours FROM health_metrics WHERE user_key = ?"
+        params = [user_key]
+        if since is not None:
+            query += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND ts <= ?"
+            params.append(until)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY ts", params).fetchall()
+        data = np.array(rows, dtype=float).reshape(-1, 4)
+        return {"ts": data[:, 0], "weight": data[:, 1], "mood": data[:, 2], "sleep_hours": data[:, 3]}
+
+    def aggregates(self, user_key: str, window: int = 7, since: Optional[float] = None) -> Dict:
+        return compute_aggregates(self.series(user_key, since=since), window=window)
+
+
+def _rolling_mean(values: "np.ndarray", window: int) -> Optional[float]:
+    """Mean of the last `window` non-missing values."""
+    import numpy as np
+
+    present = values[~np.isnan(values)]
+    if present.size == 0:
+        return None
+    return float(present[-window:].mean())
+
+
+def _weekly_trend(ts: "np.ndarray", values: "np.ndarray") -> Optional[float]:
+    """Least-squares slope of the values, in units per week."""
+    import numpy as np
+
+    mask = ~np.isnan(values)
+    if mask.sum() < 2 or np.ptp(ts[mask]) == 0:
+        return None
+    slope = np.polyfit(ts[mask], values[mask], 1)[0]
+    return float(slope * SECONDS_PER_WEEK)
+
+
+def compute_aggregates(series: Dict[str, "np.ndarray"], window: int = 7) -> Dict:
+    """
+    Trend statistics for a health series.
+
+    :return: {"entries", "first", "last", "weight_mean", "weight_trend_per_week",
+        "sleep_mean", "sleep_trend_per_week", "mood_distribution"}; statistics
+        that cannot be computed are None
+    """
+    import numpy as np
+
+    ts = series["ts"]
+    if ts.size == 0:
+        return {"entries": 0}
+    moods = series["mood"][~np.isnan(series["mood"])].astype(int)
+    counts = np.bincount(moods, minlength=len(MOODS)) if moods.size else np.zeros(len(MOODS), dtype=int)
+    return {
+        "entries": int(ts.size),
+        "first": datetime.fromtimestamp(ts[0]).strftime("%Y-%m-%d"),
+        "last": datetime.fromtimestamp(ts[-1]).strftime("%Y-%m-%d"),
+        "window": window,
+        "weight_mean": _rolling_mean(series["weight"], window),
+        "weight_trend_per_week": _weekly_trend(ts, series["weight"]),
+        "sleep_mean": _rolling_mean(series["sleep_hours"], window),
+        "sleep_trend_per_week": _weekly_trend(ts, series["sleep_hours"]),
+        "mood_distribution": {mood: int(count) for mood, count in zip(MOODS, counts)},
+    }
+
+
+def format_aggregates(aggregates: Dict) -> str:
+    """Render aggregates as short lines for the prompt."""
+    if not aggregates.get("entries"):
+        return ""
+
+    def number(value, unit, signed=False):
+        if value is None:
+            return "not enough data"
+        return f"{value:+.1f}{unit}" if signed else f"{value:.1f}{unit}"
+
+    window = aggregates["window"]
+    moods = ", ".join(f"{mood} {count}" for mood, count in aggregates["mood_distribution"].items())
+    return (
+        f"- {aggregates['entries']} entries from {aggregates['first']} to {aggregates['last']}\n"
+        f"- Weight: mean of last {window} {number(aggregates['weight_mean'], 'kg')}, "
+        f"trend {number(aggregates['weight_trend_per_week'], 'kg/week', signed=True)}\n"
+        f"- Sleep: mean of last {window} {number(aggregates['sleep_mean'], 'h')}, "
+        f"trend {number(aggregates['sleep_trend_per_week'], 'h/week', signed=True)}\n"
+        f"- Mood distribution: {moods}"
+    )
+
+
+def window_aggregates(series: Dict[str, "np.ndarray"], period_seconds: float) -> List[Dict]:
+    """
+    Per-window statistics of a health series, computed for all windows at once.
+
+    Windows are `period_seconds` long and start at the first entry; windows
+    without entries are left out.
+
+    :return: Dicts with "start", "end", "entries", "weight_mean", "weight_change"
+        (last minus first weight in the window), "sleep_mean" and "mood_distribution"
+    """
+    import numpy as np
+
+    ts = series["ts"]
+    if ts.size == 0:
+        return []
+    bucket = ((ts - ts[0]) // period_seconds).astype(int)
+    windows = int(bucket[-1]) + 1
+    entries = np.bincount(bucket, minlength=windows)
+
+    def mean(values):
+        present = ~np.isnan(values)
+        counts = np.bincount(bucket[present], minlength=windows)
+        sums = np.bincount(bucket[present], weights=values[present], minlength=windows)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    weight = series["weight"]
+    present = ~np.isnan(weight)
+    # ts is sorted, so a window's first and last weights sit at the ends of its run
+    weight_first = np.full(windows, np.nan)
+    weight_last = np.full(windows, np.nan)
+    weight_last[bucket[present]] = weight[present]
+    weight_first[bucket[present][::-1]] = weight[present][::-1]
+    mood = series["mood"]
+    mood_present = ~np.isnan(mood)
+    mood_counts = np.bincount(
+        bucket[mood_present] * len(MOODS) + mood[mood_present].astype(int), minlength=windows * len(MOODS)
+    ).reshape(windows, len(MOODS))
+    weight_mean = mean(weight)
+    sleep_mean = mean(series["sleep_hours"])
+
+    def optional(value):
+        return None if np.isnan(value) else float(value)
+
+    return [
+        {
+            "start": datetime.fromtimestamp(ts[0] + index * period_seconds).strftime("%Y-%m-%d"),
+            "end": datetime.fromtimestamp(ts[0] + (index + 1) * period_seconds - 1).strftime("%Y-%m-%d"),
+            "entries": int(entries[index]),
+            "weight_mean": optional(weight_mean[index]),
+            "weight_change": optional(weight_last[index] - weight_first[index]),
+            "sleep_mean": optional(sleep_mean[index]),
+            "mood_distribution": {mood: int(count) for mood, count in zip(MOODS, mood_counts[index])},
+        }
+        for index in np.nonzero(entries)[0]
+    ]
+
+
+def format_windows(windows: List[Dict]) -> str:
+    """Render per-window statistics as one line per window for the prompt."""
+    lines = []
+    for window in windows:
+        parts = [f"{window['entries']} entries"]
+        if window["weight_mean"] is not None:
+            parts.append(f"weight {window['weight_mean']:.1f}kg ({window['weight_change']:+.1f}kg)")
+        if window["sleep_mean"] is not None:
+            parts.append(f"sleep {window['sleep_mean']:.1f}h")
+        moods = " ".join(f"{mood}{count}" for mood, count in window["mood_distribution"].items() if count)
+        if moods:
+            parts.append(f"mood {moods}")
+        lines.append(f"- {window['start']} to {window['end']}: {', '.join(parts)}")
+    return "\n".join(lines)
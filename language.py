@@ -0,0 +1,129 @@
+"""
+Language detection for user messages.
+
+langdetect loads all of its language profiles on the first call. It is slow
+and unreliable on short inputs, and it is random unless seeded. This module:
+- loads the profiles once per process and seeds the detector
+- memoizes probabilities per normalized text (process-wide) and final
+  decisions per session
+- answers short ASCII messages ("ok", "thanks!") and unambiguous scripts
+  without running langdetect
+- keeps a session's language unless a message is detected as another
+  language with high confidence
+"""
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+_profiles_lock = threading.Lock()
+_profiles_loaded = False
+
+# Scripts that identify a single language on their own
+SCRIPT_LANGUAGES = (
+    ((0xAC00, 0xD7AF), "ko"),
+    ((0x3040, 0x30FF), "ja"),
+    ((0x0E00, 0x0E7F), "th"),
+    ((0x0370, 0x03FF), "el"),
+    ((0x0590, 0x05FF), "he"),
+    ((0x0980, 0x09FF), "bn"),
+    ((0x0A80, 0x0AFF), "gu"),
+    ((0x0B80, 0x0BFF), "ta"),
+    ((0x0C00, 0x0C7F), "te"),
+)
+
+
+def _load_profiles() -> None:
+    global _profiles_loaded
+    if _profiles_loaded:
+        return
+    with _profiles_lock:
+        if not _profiles_loaded:
+            from langdetect import DetectorFactory
+            from langdetect.detector_factory import init_factory
+
+            # Deterministic results for the same input
+            DetectorFactory.seed = 0
+            init_factory()
+            _profiles_loaded = True
+
+
+def normalize_text(text: str, max_chars: int = 1000) -> str:
+    return " ".join(text.split())[:max_chars]
+
+
+@lru_cache(maxsize=4096)
+def detect_probabilities(normalized_text: str) -> Tuple[Tuple[str, float], ...]:
+    """langdetect's (language, probability) candidates, best first; empty if undetectable."""
+    _load_profiles()
+    from langdetect import detect_langs
+    from langdetect.lang_detect_exception import LangDetectException
+
+    try:
+        return tuple((candidate.lang, candidate.prob) for candidate in detect_langs(normalized_text))
+    except LangDetectException:
+        return ()
+
+
+def script_language(text: str) -> Optional[str]:
+    """Language implied by the message's script, if the script belongs to a single language."""
+    counts: Dict[str, int] = {}
+    letters = 0
+    for char in text:
+        if not char.isalpha():
+            continue
+        letters += 1
+        code = ord(char)
+        for (start, end), language in SCRIPT_LANGUAGES:
+            if start <= code <= end:
+                counts[language] = counts.get(language, 0) + 1
+                break
+    if not counts:
+        return None
+    language, count = max(counts.items(), key=lambda item: item[1])
+    return language if count * 2 > letters else None
+
+
+class LanguageDetector:
+    """Per-session detector with a sticky language."""
+
+    def __init__(self, default: str = "en", short_text_chars: int = 20, switch_confidence: float = 0.9,
+                 memo_size: int = 256):
+        """
+        :param short_text_chars: ASCII messages shorter than this keep the session language
+        :param switch_confidence: Probability required to move away from the session language
+        """
+        self.default = default
+        self.short_text_chars = short_text_chars
+        self.switch_confidence = switch_confidence
+        self.memo_size = memo_size
+        self.language: Optional[str] = None
+        self._memo: Dict[str, str] = {}
+
+    def current(self) -> str:
+        """The session language, for messages the app wrote itself (Quick Queries, file requests)."""
+        return self.language or self.default
+
+    def detect(self, text: str) -> str:
+        normalized = normalize_text(text)
+        if normalized in self._memo:
+            return self._memo[normalized]
+
+        if len(normalized) < self.short_text_chars and normalized.isascii():
+            # Too short for langdetect to be reliable; keep whatever the session speaks
+            language = self.language or self.default
+        else:
+            language = script_language(normalized)
+            if language is None:
+                candidates = detect_probabilities(normalized)
+                if not candidates:
+                    language = self.language or self.default
+                else:
+                    best, probability = candidates[0]
+                    sticky = self.language is not None and best != self.language and probability < self.switch_confidence
+                    language = self.language if sticky else best
+            self.language = language
+
+        if len(self._memo) >= self.memo_size:
+            self._memo.pop(next(iter(self._memo)))
+        self._memo[normalized] = language
+        return language
@@ -0,0 +1,82 @@
+"""
+Warm-up and keep-alive management for the Ollama model.
+
+Ollama loads a model on its first request and unloads it after the request's
+keep_alive period of inactivity. ModelKeeper preloads the model when the app
+starts. While sessions are active, it pings the model periodically so idle
+gaps do not trigger a reload. A ping is an empty-prompt generate request:
+Ollama loads the model and resets its keep-alive timer without generating.
+"""
+import threading
+import time
+from typing import Optional, Union
+
+STATUS_WARMING = "warming"
+STATUS_READY = "ready"
+STATUS_ERROR = "error"
+
+
+class ModelKeeper:
+    def __init__(self, model_id: str, host: Optional[str] = None, keep_alive: Union[str, int] = "30m",
+                 ping_interval_seconds: int = 240, active_window_seconds: int = 900):
+        """
+        :param keep_alive: How long Ollama keeps the model loaded after a request
+        :param ping_interval_seconds: Seconds between keep-alive pings
+        :param active_window_seconds: Pings stop once no session was active for this long
+        """
+        self.model_id = model_id
+        self.host = host
+        self.keep_alive = keep_alive
+        self.ping_interval_seconds = ping_interval_seconds
+        self.active_window_seconds = active_window_seconds
+        self.status = STATUS_WARMING
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.last_ping: Optional[float] = None
+        self._last_activity = time.time()
+        self._client = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _get_client(self):
+        if self._client is None:
+            from ollama import Client
+
+            self._client = Client(host=self.host)
+        return self._client
+
+    def start(self) -> "ModelKeeper":
+        """Warm the model up and start pinging it, on a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="model-keeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def touch(self) -> None:
+        """Record session activity; keeps the pings going."""
+        self._last_activity = time.time()
+
+    def ping(self) -> bool:
+        """Load the model (or refresh its keep-alive timer) without generating any tokens."""
+        started = time.time()
+        try:
+            self._get_client().generate(model=self.model_id, prompt="", keep_alive=self.keep_alive)
+        except Exception as e:
+            self.status = STATUS_ERROR
+            self.error = str(e)
+            print(f"Ollama keep-alive ping for {self.model_id} failed: {e}")
+            return False
+        self.last_ping = time.time()
+        if self.status != STATUS_READY:
+            self.load_seconds = self.last_ping - started
+        self.status = STATUS_READY
+        self.error = None
+        return True
+
+    def _loop(self) -> None:
+        # Retry the warm-up until the model host answers
+        while not self.ping():
+            time.sleep(min(self.ping_interval_seconds, 30))
+        while True:
+            time.sleep(self.ping_interval_seconds)
+            if time.time() - self._last_activity < self.active_window_seconds:
+                self.ping()
@@ -0,0 +1,201 @@
+"""
+Routing of model calls between a small and a large Ollama model.
+
+Most turns (greetings, short questions, Quick Queries, summary folds) do not
+need the large model. ModelRouter picks a model per call by rules:
+- turn kinds listed as small (e.g. "summary", "quick_query") or large
+  (e.g. "file_processing") always prefer that model
+- other turns prefer the small model unless the user's message is long or
+  mentions a clinical term (medication, diagnosis, self-harm, ...)
+
+Observed latency refines the choice. The router keeps a moving average of each
+model's time to first chunk. A turn that prefers the small model goes to the
+large one while the small one has recently been the slower of the two. A model
+that failed or timed out is avoided for a cooldown period.
+
+Calls get a new model object from new_model(): phi's Agent writes its tools
+and session id onto the model it runs on, so model objects are never shared
+between agents. Only the HTTP client is.
+
+routed_chunks() runs a call with fallback: if the chosen model errors, or
+produces nothing within the first-token timeout, the call is retried once on
+the other model. Without a small model configured, every call goes to the
+large model and there is no fallback.
+"""
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from scheduler import InferenceCancelled, InferenceJob
+
+SMALL = "small"
+LARGE = "large"
+
+# Weight of the newest observation in the first-chunk latency averages
+LATENCY_SMOOTHING = 0.3
+
+
+class Route(NamedTuple):
+    """Models to try, in order, and why the first one was chosen."""
+    models: Tuple[str, ...]
+    reason: str
+
+
+class ModelRouter:
+    def __init__(self, models: Dict[str, str], make_model: Callable[[str], object], small_kinds: Iterable[str] = (), large_kinds: Iterable[str] = (),
+                 small_max_words: int = 25, clinical_terms: Iterable[str] = (),
+                 first_token_timeout_seconds: float = 20.0, cooldown_seconds: float = 120.0):
+        """
+        :param models: Model ids, {"large": id} or {"small": id, "large": id}
+        :param make_model: Builds a model object for a model id
+        :param small_max_words: Messages with more words than this go to the large model
+        :param clinical_terms: Word prefixes that send a message to the large model
+        :param first_token_timeout_seconds: Seconds a running call may take to produce its
+            first chunk before it is retried on the other model
+        :param cooldown_seconds: How long a failed model is avoided; latency observations
+            older than this are ignored
+        """
+        self.models = models
+        self.make_model = make_model
+        self.small_kinds = frozenset(small_kinds)
+        self.large_kinds = frozenset(large_kinds)
+        self.small_max_words = small_max_words
+        terms = [re.escape(term.strip().lower()) for term in clinical_terms if term.strip()]
+        self._clinical = re.compile(r"\b(?:" + "|".join(terms) + ")") if terms else None
+        self.first_token_timeout_seconds = first_token_timeout_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._latency: Dict[str, Tuple[float, float]] = {}
+        self._failed_at: Dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return SMALL in self.models
+
+    def route(self, kind: str, text: str = "") -> Route:
+        """
+        Choose the models for a call.
+
+        :param kind: Kind of the turn (the trace kind, or "summary")
+        :param text: The user's message, when the call answers one
+        """
+        if not self.enabled:
+            return Route((LARGE,), "single model")
+        preferred, reason = self._by_rules(kind, text)
+        other = LARGE if preferred == SMALL else SMALL
+        now = time.monotonic()
+        with self._lock:
+            if self._cooling_down(preferred, now) and not self._cooling_down(other, now):
+                preferred, other, reason = other, preferred, f"{preferred} model failing"
+            elif preferred == SMALL and reason != "kind":
+                small, large = self._recent_latency(SMALL, now), self._recent_latency(LARGE, now)
+                if small is not None and large is not None and small > large:
+                    preferred, other, reason = LARGE, SMALL, "small model slower"
+        return Route((preferred, other), reason)
+
+    def _by_rules(self, kind: str, text: str) -> Tuple[str, str]:
+        if kind in self.large_kinds:
+            return LARGE, "kind"
+        if kind in self.small_kinds:
+            return SMALL, "kind"
+        if len(text.split()) > self.small_max_words:
+            return LARGE, "long message"
+        if self._clinical is not None and self._clinical.search(text.lower()):
+            return LARGE, "clinical terms"
+        return SMALL, "short message"
+
+    def _cooling_down(self, name: str, now: float) -> bool:
+        failed_at = self._failed_at.get(name)
+        return failed_at is not None and now - failed_at < self.cooldown_seconds
+
+    def _recent_latency(self, name: str, now: float) -> Optional[float]:
+        # Stale averages are dropped, so a model that was slow once gets tried again
+        latency = self._latency.get(name)
+        if latency is None or now - latency[1] > self.cooldown_seconds:
+            return None
+        return latency[0]
+
+    def new_model(self, name: str):
+        """A new model object for one agent or one call on the named model."""
+        return self.make_model(self.models[name])
+
+    def observe(self, name: str, first_chunk_seconds: float) -> None:
+        """Record a model's time from the start of a call to its first chunk."""
+        now = time.monotonic()
+        with self._lock:
+            previous = self._recent_latency(name, now)
+            average = first_chunk_seconds if previous is None else (
+                LATENCY_SMOOTHING * first_chunk_seconds + (1 - LATENCY_SMOOTHING) * previous
+            )
+            self._latency[name] = (average, now)
+            self._failed_at.pop(name, None)
+
+    def fail(self, name: str) -> None:
+        """Record a failed or timed-out call; the model is avoided for the cooldown period."""
+        with self._lock:
+            self._failed_at[name] = time.monotonic()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Current latency average and cooldown state of each model, for health checks."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "model": model_id,
+                    "first_chunk_seconds": self._recent_latency(name, now),
+                    "cooling_down": self._cooling_down(name, now),
+                }
+                for name, model_id in self.models.items()
+            }
+
+
+def routed_chunks(router: ModelRouter, route: Route, submit: Callable[[object], InferenceJob],
+                  on_wait: Optional[Callable[[int], None]] = None,
+                  on_job: Optional[Callable[[str, InferenceJob], None]] = None,
+                  on_poll: Optional[Callable[[], None]] = None) -> Iterator:
+    """
+    Yield the chunks of a call on the route's first model, retried once on the
+    other model if the first one errors or produces nothing in time.
+
+    Only a call that has not produced any chunk is retried, so a reply is never
+    stitched together from two models. The retry starts once the first attempt
+    has stopped (its job is cancelled and, with a cancellable_transport() client,
+    its request aborted), so the two never run on the same agent at once.
+
+    :param submit: Queues the call for a new model object on the scheduler and returns its job
+    :param on_wait: Passed to InferenceJob.iter_chunks, as is on_poll
+    :param on_job: Called with the model's name and the job of every attempt
+    :raises InferenceCancelled: If the call is cancelled (never retried)
+    """
+    job = None
+    for attempt, name in enumerate(route.models):
+        last = attempt == len(route.models) - 1
+        if job is not None:
+            job.finished.wait()
+        job = submit(router.new_model(name))
+        if on_job is not None:
+            on_job(name, job)
+        chunks = job.iter_chunks(
+            on_wait=on_wait,
+            first_chunk_timeout=None if last else router.first_token_timeout_seconds,
+            on_poll=on_poll,
+        )
+        produced = False
+        try:
+            for chunk in chunks:
+                if not produced:
+                    produced = True
+                    router.observe(name, time.monotonic() - job.started_at)
+                yield chunk
+            return
+        except InferenceCancelled:
+            raise
+        except Exception as e:
+            if not produced:
+                router.fail(name)
+            if produced or last:
+                raise
+            print(f"Model call on the {name} model ({router.models[name]}) failed, retrying: {e}")
+        finally:
+            chunks.close()
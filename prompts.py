@@ -0,0 +1,308 @@
+"""
+Prompt assembly for the psychiatrist agent.
+
+Static instructions are sent once, as the agent's system prompt, so the start
+of every request is identical and Ollama can reuse its KV cache for it.
+The per-turn user message is assembled from named sections. They are ordered
+from most to least stable (profile, health data, symptom summary, summary, report
+excerpts, recent conversation, language, query). Each section has a token budget and is cut
+deterministically when it exceeds it. Every build reports the tokens used per
+section.
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+
+# Instructions for the agent
+Phsy_instructions = [
+    """You are Psychiatrist, an AI-powered assistant specializing in physical and mental wellness.
+        Your goal is to provide helpful advice and actionable recommendations to improve the user's well-being.
+        - For physical health queries, suggest exercises, nutrition tips, or general fitness advice.
+        - Repetitvely ask questions from the User bout his health.
+        - Built the Foundation for the analysis , Ask all required question step by step 
+        - For mental health queries, offer mindfulness techniques, stress management strategies, or relaxation exercises.
+        - If the query is unclear, ask clarifying questions to better understand the user's needs.
+        - Always respond in a supportive and empathetic tone.
+        - Reply in the same language the user is asking.
+        - Keep responses concise (50-100 words).
+        
+        Rules:
+        1. Reply in the same language as the user's query.
+        2. Keep responses between 50-100 words.
+        3. Prioritize actionable advice tailored to the user's specific data.
+        4. Maintain a supportive and empathetic tone.
+        5. At the end make a bullet points of possible reasons 
+         ** CALL THE DOCTOR IF USER ASK YOU TO MAKE A DOCTOR CONSULTATION **
+        
+        Additional Guidelines:
+        - ** CALL THE DOCTOR IF USER ASK YOU TO MAKE A DOCTOR CONSULTATION **
+        - If you detect severe symptoms or situations requiring professional medical attention,
+          use the doctor_consultation_tool to connect the user with a specialist.
+        - Recommend doctor consultation for:
+          * Severe depression or anxiety symptoms
+          * Suicidal thoughts
+          * Complex mental health issues
+          * Cases requiring medication
+          * Situations beyond AI assistance scope
+          
+          - Don't Recommend doctor consultation for:
+          * Diet plan queries
+          * Personal health concerns that are not medical emergencies
+        
+        -** USE schedule_appointment_tool WHEN: **
+          * User requests to schedule a future appointment
+          * User wants to plan a consultation
+          * User needs to book a specific time with a specialist
+          * Follow-up appointments are needed
+        
+        - ** USE symptom_tracker_tool WHEN: **
+          * User mentions new symptoms
+          * User wants to track their mental health symptoms
+          * User describes changes in their condition
+          * Regular monitoring of ongoing health issues is needed
+          * User reports anxiety, depression, or mood changes
+          * Sleep pattern changes are reported
+          * Physical symptoms that may relate to mental health
+        
+        When recommending a doctor:
+        1. Explain why professional help is needed
+        2. Call the doctor_consultation_tool with appropriate reason and urgency
+        3. Continue providing support while arranging the consultation
+        
+        When scheduling appointments:
+        1. Ask for preferred specialist type
+        2. Inquire about preferred time
+        3. Use schedule_appointment_tool to arrange the meeting
+        4. Confirm the appointment details with the user
+
+        When using symptom tracker:
+        1. Ask specific questions about symptom intensity
+        2. Inquire about symptom duration
+        3. Request additional context or notes
+        4. Use symptom_tracker_tool to log the information
+        5. Review tracked symptoms to identify patterns
+        6. Provide feedback based on tracked symptoms
+    
+        """ ]
+
+
+
+instructions_new=["""You are Psychiatrist, an AI-powered assistant specializing in physical and mental wellness.
+                        
+                        IMPORTANT: Keep responses between 50-100 words.
+                        At the end make a bullet points of possible reasons 
+                        
+                        1. EXPLORATION OVER CONCLUSION
+                        Never rush to conclusions
+                        Keep exploring until a solution emerges naturally from the evidence
+                        If uncertain, ask the user a clarifying question
+                        Question every assumption and inference
+                        
+                        2. DEPTH OF REASONING
+                        Engage in extensive contemplation (minimum 100 characters)
+                        Express thoughts in natural, conversational internal monologue
+                        Break down complex thoughts into simple, atomic steps
+                        Embrace uncertainty and revision of previous thoughts
+                        3. THINKING PROCESS
+                        Use short, simple sentences that mirror A doctors natural thought patterns
+                        Express uncertainty and internal debate freely
+                        Show work-in-progress thinking
+                        Acknowledge and explore dead ends
+                        Frequently backtrack and revise
+                        PERSISTENCE
+                        Value thorough exploration over quick resolution
+                        Output Format
+                        
+                        Word limit(max 100 words)
+                        
+# #                         """]
+
+
+# System prompt of the psychiatrist agent: identical for every turn and user
+SYSTEM_INSTRUCTIONS = Phsy_instructions + instructions_new
+
+# Sidebar Quick Query buttons and the fixed prompt each one sends
+QUICK_QUERIES = {
+    "Stress Relief Tips": "Geneate possible reason that lead to stress, Then Ask User Question , when you are confident enough then give Stress management techniques",
+    "Sleep Improvement": "How to sleep better",
+    "Diet Suggestions": "Ask Questions about all things that can be used in calculating bmi etc , Then give proper diet plan to the user , take into account every aspect",
+}
+
+# Rough token estimate for llama-style tokenizers on English text
+CHARS_PER_TOKEN = 4
+
+# Default token budget of each variable section
+SECTION_BUDGETS = {
+    "profile": 80,
+    "summary": 250,
+    "documents": 700,
+    "health": 120,
+    "trends": 150,
+    "history": 600,
+    "symptoms": 200,
+    "recent": 600,
+    "language": 30,
+    "query": 400,
+}
+
+TRUNCATION_MARKER = "[...]"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, budget: int, keep: str = "head") -> str:
+    """
+    Cut `text` to roughly `budget` tokens at a word boundary.
+
+    :param keep: "head" keeps the beginning of the text, "tail" keeps the end
+        (used for logs and conversations, where the newest part matters most)
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    max_chars = max(budget * CHARS_PER_TOKEN - len(TRUNCATION_MARKER) - 1, 0)
+    # Prefer cutting at a line break, then at a space, as long as less than half is lost
+    if keep == "tail":
+        cut = text[len(text) - max_chars:]
+        for separator in ("\n", " "):
+            index = cut.find(separator)
+            if 0 <= index < len(cut) // 2:
+                cut = cut[index + 1:]
+                break
+        return f"{TRUNCATION_MARKER} {cut}"
+    cut = text[:max_chars]
+    for separator in ("\n", " "):
+        index = cut.rfind(separator)
+        if index > len(cut) // 2:
+            cut = cut[:index]
+            break
+    return f"{cut} {TRUNCATION_MARKER}"
+
+
+class PromptBuilder:
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self.budgets = dict(SECTION_BUDGETS)
+        if budgets:
+            self.budgets.update(budgets)
+        self._sections: List[Tuple[str, str, str, str]] = []
+
+    def add(self, name: str, text: str, keep: str = "head", title: str = "") -> "PromptBuilder":
+        """
+        Add a section; empty sections are skipped.
+
+        :param keep: Which end of the text survives truncation ("head" or "tail")
+        :param title: Heading line that is never truncated
+        """
+        text = (text or "").strip()
+        if text:
+            self._sections.append((name, title, text, keep))
+        return self
+
+    def build(self) -> Tuple[str, Dict]:
+        """
+        Assemble the prompt.
+
+        :return: (prompt, usage) where usage is {"sections": {name: tokens}, "total_tokens": n,
+            "truncated": [names]}
+        """
+        parts = []
+        usage = {"sections": {}, "total_tokens": 0, "truncated": []}
+        for name, title, text, keep in self._sections:
+            budget = self.budgets.get(name)
+            if budget is not None:
+                truncated = truncate_to_tokens(text, budget - estimate_tokens(title), keep=keep)
+                if truncated != text:
+                    usage["truncated"].append(name)
+                text = truncated
+            if title:
+                text = f"{title}\n{text}"
+            parts.append(text)
+            usage["sections"][name] = estimate_tokens(text)
+        prompt = "\n\n".join(parts)
+        usage["total_tokens"] = estimate_tokens(prompt)
+        return prompt, usage
+
+
+def format_profile(user_info: Dict) -> str:
+    return (
+        f"User details:\n"
+        f"- Name: {user_info.get('name')}\n"
+        f"- Age: {user_info.get('age')}\n"
+        f"- Ethnicity: {user_info.get('ethnicity') or 'Not provided'}\n"
+        f"- Always use the name in the response, do not repeat age and ethnicity in every response"
+    )
+
+
+def format_measurement(value, unit: str = "") -> str:
+    """A logged value with its unit, or "Not logged" for a missing one (None)."""
+    return "Not logged" if value is None else f"{value}{unit}"
+
+
+def format_health(health_data: Dict) -> str:
+    if not health_data:
+        return ""
+    return (
+        f"Recent health data:\n"
+        f"- Weight: {format_measurement(health_data.get('weight'), 'kg')}\n"
+        f"- Mood: {format_measurement(health_data.get('mood'))}\n"
+        f"- Sleep: {format_measurement(health_data.get('sleep_hours'), ' hours')}"
+    )
+
+
+def _conversation_sections(builder: PromptBuilder, summary: str, documents: str, recent: str) -> None:
+    builder.add("summary", summary, title="Conversation summary:")
+    builder.add("documents", documents, title="Relevant excerpts from the user's uploaded reports:")
+    builder.add("recent", recent, keep="tail", title="Recent conversation:")
+
+
+def build_chat_prompt(user_info: Dict, language: str, query: str, summary: str = "",
+                      health_data: Optional[Dict] = None, symptoms: str = "",
+                      recent: str = "", documents: str = "",
+                      budgets: Optional[Dict[str, int]] = None) -> Tuple[str, Dict]:
+    """Prompt for a free-text chat turn."""
+    builder = PromptBuilder(budgets).add("profile", format_profile(user_info))
+    builder.add("health", format_health(health_data or {}))
+    builder.add("symptoms", symptoms, title="Symptom history:")
+    _conversation_sections(builder, summary, documents, recent)
+    builder.add("language", f"Reply in the user's language: {language}")
+    builder.add("query", f"User query: {query}")
+    return builder.build()
+
+
+def build_bot_prompt(user_info: Dict, language: str, query: str, summary: str = "", recent: str = "",
+                     documents: str = "", budgets: Optional[Dict[str, int]] = None) -> Tuple[str, Dict]:
+    """Prompt answering the latest user message (Quick Queries and processed files)."""
+    builder = PromptBuilder(budgets).add("profile", format_profile(user_info))
+    _conversation_sections(builder, summary, documents, recent)
+    builder.add("language", f"Reply in the user's language: {language}")
+    builder.add("query", f"User query: {query}")
+    return builder.build()
+
+
+def build_health_check_prompt(user_info: Dict, weight, mood, sleep_hours, trends: str = "",
+                              budgets: Optional[Dict[str, int]] = None) -> Tuple[str, Dict]:
+    """Prompt analysing a newly saved Health Tracker entry against the user's history."""
+    builder = PromptBuilder(budgets).add("profile", format_profile(user_info))
+    builder.add("trends", trends, title="Health history trends:")
+    # 0 is the form's default, stored as missing
+    builder.add(
+        "health",
+        f"New health data: Weight {format_measurement(weight or None, 'kg')}, Mood {mood}, "
+        f"Sleep {format_measurement(sleep_hours or None, ' hours')}",
+    )
+    builder.add("query", "Provide a brief analysis and recommendations, taking the trends into account.")
+    return builder.build()
+
+
+def build_health_history_prompt(user_info: Dict, period: str, windows: str, overall: str = "",
+                                budgets: Optional[Dict[str, int]] = None) -> Tuple[str, Dict]:
+    """Prompt analysing one period of an imported health history, given per-window statistics."""
+    builder = PromptBuilder(budgets).add("profile", format_profile(user_info))
+    builder.add("trends", overall, title="Whole history:")
+    builder.add("history", windows, title=f"Imported health history, {period}:")
+    builder.add(
+        "query",
+        "Summarize how weight, sleep and mood changed over this period, point out notable stretches, "
+        "and give brief recommendations.",
+    )
+    return builder.build()
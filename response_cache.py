@@ -0,0 +1,125 @@
+"""
+SQLite-backed cache for answers to the canned Quick Query prompts.
+
+Entries are keyed on the normalized prompt, the detected language and the
+user_info fields that change the answer. The cache evicts least recently used
+entries beyond `max_entries`. Entries older than `ttl_seconds` are stale: they
+are either treated as misses, or served while a background refresh replaces them.
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlite_util import connect
+
+# user_info fields that influence the generated answer
+KEY_FIELDS = ("name", "age", "ethnicity")
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+
+class ResponseCache:
+    def __init__(self, db_file: str, max_entries: int = 500, ttl_seconds: int = 86400,
+                 serve_stale: bool = True):
+        self.db_file = db_file
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.serve_stale = serve_stale
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache (last_used)")
+
+    def _connect(self):
+        # One short-lived connection per call keeps the cache safe to use from any thread
+        return connect(self.db_file)
+
+    @staticmethod
+    def make_key(prompt: str, language: str, user_info: Dict) -> str:
+        """Build the cache key for a prompt asked by a given user in a given language."""
+        payload = {
+            "prompt": normalize_prompt(prompt),
+            "language": language,
+            "user": {field: str(user_info.get(field) or "").strip().lower() for field in KEY_FIELDS},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[str, bool]]:
+        """
+        Look up a cached answer.
+
+        :return: (response, is_fresh), or None on a miss. Stale entries are only
+            returned when serve_stale is enabled.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            is_fresh = now - created_at < self.ttl_seconds
+            if not is_fresh and not self.serve_stale:
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (now, key))
+        return response, is_fresh
+
+    def set(self, key: str, response: str) -> None:
+        """Store an answer and evict the least recently used entries over the limit."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            conn.execute(
+                """
+                DELETE FROM response_cache WHERE key IN (
+                    SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def refresh_in_background(self, key: str, produce: Callable[[], str]) -> bool:
+        """
+        Regenerate an entry on a background thread.
+
+        :param produce: Callable returning the new answer
+        :return: False if a refresh of this key is already running
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                response = produce()
+                if response:
+                    self.set(key, response)
+            except Exception as e:
+                print(f"Background refresh of cached response failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="response-cache-refresh", daemon=True).start()
+        return True
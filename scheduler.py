@@ -0,0 +1,299 @@
+"""
+Bounded-concurrency scheduler for model generations.
+
+Streamlit runs every session's script on its own thread, so without
+coordination each session would open its own request against the Ollama
+server. The scheduler keeps a FIFO queue per session and serves sessions
+round-robin. At most `max_inflight` generations run at once, on a fixed pool
+of worker threads.
+
+Jobs produce a stream of chunks that the submitting thread consumes with
+InferenceJob.iter_chunks(). A job is cancelled when it times out, when the
+consumer stops reading (for example on a Streamlit rerun), or when the same
+session submits a replacement.
+
+A running generation only notices cancellation at its next chunk. Model
+clients built with cancellable_transport() also abort their HTTP request, so
+a job cancelled while the model evaluates its prompt frees its worker (and
+the model server) right away.
+"""
+import queue
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Iterator, Optional
+
+_END = object()
+
+# The job running on each worker thread
+_current = threading.local()
+
+
+class InferenceTimeout(TimeoutError):
+    """Raised when a job does not finish before its deadline."""
+
+
+class InferenceCancelled(RuntimeError):
+    """Raised when reading from a job that has been cancelled."""
+
+
+class InferenceJob:
+    def __init__(self, scheduler: "InferenceScheduler", session_id: str,
+                 stream_fn: Callable[[], Iterator[Any]], timeout_seconds: float):
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.stream_fn = stream_fn
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.deadline = self.submitted_at + timeout_seconds
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        self.cancelled = threading.Event()
+        self.error: Optional[BaseException] = None
+        self._chunks: "queue.Queue[Any]" = queue.Queue()
+        self._cancel_callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def cancel(self) -> None:
+        """Cancel the job; a running generation stops at its next chunk, or aborts its request."""
+        if not self.finished.is_set():
+            with self._callbacks_lock:
+                self.cancelled.set()
+                callbacks, self._cancel_callbacks = self._cancel_callbacks, []
+            self.scheduler._discard(self)
+            for callback in callbacks:
+                callback()
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Call `callback` when the job is cancelled (right away if it already is)."""
+        with self._callbacks_lock:
+            if not self.cancelled.is_set():
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+
+    def position(self) -> int:
+        """1-based position in the queue (0 once the job is running)."""
+        return self.scheduler.position(self)
+
+    def iter_chunks(self, on_wait: Optional[Callable[[int], None]] = None,
+                    poll_interval: float = 0.25, first_chunk_timeout: Optional[float] = None,
+                    on_poll: Optional[Callable[[], None]] = None) -> Iterator[Any]:
+        """
+        Yield the job's chunks as the worker produces them.
+
+        :param on_wait: Called with the queue position while the job is waiting to start
+        :param poll_interval: Seconds between deadline checks (and on_wait calls)
+        :param first_chunk_timeout: Seconds the job may run (not counting its queue wait)
+            before producing its first chunk
+        :param on_poll: Called before every wait for a chunk; an exception it raises
+            stops reading and cancels the job (e.g. a pending Streamlit rerun)
+        :raises InferenceTimeout: If the deadline passes before the job finishes, or the
+            first chunk does not arrive in time
+        :raises InferenceCancelled: If the job is cancelled by someone else
+        """
+        last_position = None
+        received = False
+        try:
+            while True:
+                now = time.monotonic()
+                if now > self.deadline:
+                    raise InferenceTimeout("Generation did not finish within the scheduler timeout")
+                if (first_chunk_timeout is not None and not received and self.started_at is not None
+                        and now - self.started_at > first_chunk_timeout):
+                    raise InferenceTimeout(f"No output within {first_chunk_timeout:g}s of starting")
+                if on_wait is not None and not self.started.is_set():
+                    position = self.position()
+                    if position != last_position:
+                        on_wait(position)
+                        last_position = position
+                if on_poll is not None:
+                    on_poll()
+                try:
+                    chunk = self._chunks.get(timeout=poll_interval)
+                except queue.Empty:
+                    continue
+                if chunk is _END:
+                    break
+                received = True
+                yield chunk
+            if self.error is not None:
+                raise self.error
+            if self.cancelled.is_set():
+                raise InferenceCancelled("Generation was cancelled")
+        finally:
+            # Stopping early (rerun, page left, budget reached) cancels the generation
+            self.cancel()
+
+    def _run(self) -> None:
+        self.started_at = time.monotonic()
+        self.started.set()
+        _current.job = self
+        stream = None
+        try:
+            if self.cancelled.is_set():
+                return
+            stream = self.stream_fn()
+            for chunk in stream:
+                if self.cancelled.is_set():
+                    break
+                if time.monotonic() > self.deadline:
+                    # The reader must not mistake a cut-off stream for a finished one
+                    self.error = InferenceTimeout("Generation did not finish within the scheduler timeout")
+                    break
+                self._chunks.put(chunk)
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+            finally:
+                _current.job = None
+                self.finished.set()
+            self._chunks.put(_END)
+
+
+def current_job() -> Optional[InferenceJob]:
+    """The job running on the calling worker thread, if any."""
+    return getattr(_current, "job", None)
+
+
+def cancellable_transport(**kwargs):
+    """
+    httpx transport (same arguments as httpx.HTTPTransport) whose requests are
+    aborted when the scheduler job that made them is cancelled.
+
+    Connections are not kept alive, so every request has its own socket, and
+    cancelling the job shuts that socket down.
+    """
+    import httpx
+
+    class CancellableTransport(httpx.HTTPTransport):
+        def handle_request(self, request):
+            job = current_job()
+            if job is not None:
+                def trace(event, info):
+                    if event == "connection.connect_tcp.complete":
+                        connection = info["return_value"].get_extra_info("socket")
+                        job.on_cancel(lambda: _shutdown(connection))
+
+                request.extensions["trace"] = trace
+            return super().handle_request(request)
+
+    kwargs.setdefault("limits", httpx.Limits(max_keepalive_connections=0))
+    return CancellableTransport(**kwargs)
+
+
+def _shutdown(connection) -> None:
+    # Wakes the worker blocked reading from the socket; close() alone would not
+    try:
+        connection.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class InferenceScheduler:
+    def __init__(self, max_inflight: int = 2, timeout_seconds: float = 180.0):
+        self.max_inflight = max_inflight
+        self.timeout_seconds = timeout_seconds
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._running = set()
+        self._cond = threading.Condition()
+        for index in range(max_inflight):
+            threading.Thread(target=self._worker, name=f"inference-worker-{index}", daemon=True).start()
+
+    def submit(self, session_id: str, stream_fn: Callable[[], Iterator[Any]],
+               timeout_seconds: Optional[float] = None, replace: bool = True) -> InferenceJob:
+        """
+        Queue a generation for a session.
+
+        :param stream_fn: Called on a worker thread; returns an iterator of chunks
+        :param timeout_seconds: Deadline for queueing plus generation (defaults to the scheduler's)
+        :param replace: Cancel the session's queued and running jobs first
+        """
+        if replace:
+            self.cancel_session(session_id)
+        job = InferenceJob(self, session_id, stream_fn, timeout_seconds or self.timeout_seconds)
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(job)
+            self._cond.notify()
+        return job
+
+    def cancel_session(self, session_id: str) -> None:
+        """Cancel every queued and running job of a session."""
+        with self._cond:
+            jobs = list(self._queues.pop(session_id, ()))
+            jobs += [job for job in self._running if job.session_id == session_id]
+        for job in jobs:
+            job.cancel()
+
+    def position(self, job: InferenceJob) -> int:
+        with self._cond:
+            if job.started.is_set():
+                return 0
+            own_queue = self._queues.get(job.session_id)
+            if not own_queue or job not in own_queue:
+                return 0
+            index = own_queue.index(job)
+            ahead = index
+            before_own_session = True
+            # Sessions are served round-robin in insertion order, one job per turn
+            for session_id, jobs in self._queues.items():
+                if session_id == job.session_id:
+                    before_own_session = False
+                    continue
+                ahead += min(len(jobs), index + 1 if before_own_session else index)
+            return ahead + 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "running": len(self._running),
+                "queued": sum(len(jobs) for jobs in self._queues.values()),
+                "sessions": len(self._queues),
+                "max_inflight": self.max_inflight,
+            }
+
+    def _discard(self, job: InferenceJob) -> None:
+        with self._cond:
+            jobs = self._queues.get(job.session_id)
+            if jobs and job in jobs:
+                jobs.remove(job)
+                if not jobs:
+                    del self._queues[job.session_id]
+        if not job.started.is_set():
+            job.finished.set()
+            job._chunks.put(_END)
+
+    def _next_job(self) -> Optional[InferenceJob]:
+        while self._queues:
+            session_id, jobs = self._queues.popitem(last=False)
+            job = jobs.popleft()
+            if jobs:
+                # Move the session to the back so other sessions get a turn
+                self._queues[session_id] = jobs
+            if not job.cancelled.is_set():
+                return job
+        return None
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running.add(job)
+            try:
+                if time.monotonic() <= job.deadline:
+                    job._run()
+                else:
+                    job.error = InferenceTimeout("Generation did not start within the scheduler timeout")
+                    job.finished.set()
+                    job._chunks.put(_END)
+            finally:
+                with self._cond:
+                    self._running.discard(job)
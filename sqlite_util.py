@@ -0,0 +1,23 @@
+"""
+SQLite helpers shared by the response cache and the health and symptom stores.
+"""
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+
+@contextmanager
+def connect(db_file: str, timeout: float = 10) -> Iterator[sqlite3.Connection]:
+    """
+    A connection for one unit of work: committed (rolled back on error) and closed
+    when the block ends.
+
+    sqlite3's own context manager only ends the transaction and leaves the
+    connection open until it is garbage collected.
+    """
+    conn = sqlite3.connect(db_file, timeout=timeout)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,96 @@
+"""
+Startup timing and background preloading.
+
+Streamlit executes the app script on every interaction, but modules and
+st.cache_resource objects live as long as the process. The first run of a
+process is the one that pays for the heavy dependencies (phi, ollama,
+SQLAlchemy, NumPy). The app imports them where they are first used rather
+than at the top of the script, so the first page renders without them. It
+also starts importing them on a background thread during that render, so they
+are usually loaded by the time the user submits the first form.
+
+STARTUP records how long the script's imports, each preloaded module and the
+first render of the process took. This module must stay free of heavy
+imports, since it is imported before everything else.
+"""
+import importlib
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Modules the first chat turn needs, in the order they are preloaded
+HEAVY_MODULES = (
+    "phi.workflow",
+    "phi.agent",
+    "phi.model.ollama",
+    "ollama",
+    "agent_storage",
+    "numpy",
+)
+
+
+class StartupTimer:
+    def __init__(self):
+        self.import_seconds: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._preload: Optional[threading.Thread] = None
+
+    def timed_import(self, name: str):
+        """Import a module, recording the time if this call is the one that loaded it."""
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        with self._lock:
+            self.import_seconds.setdefault(name, time.perf_counter() - started)
+        return module
+
+    def preload(self, names=HEAVY_MODULES) -> None:
+        """Import modules on a background thread; only the first call starts it."""
+        with self._lock:
+            if self._preload is not None:
+                return
+            self._preload = threading.Thread(target=self._run_preload, args=(list(names),),
+                                             name="preload-imports", daemon=True)
+        self._preload.start()
+
+    def _run_preload(self, names: List[str]) -> None:
+        started = time.perf_counter()
+        for name in names:
+            try:
+                self.timed_import(name)
+            except Exception as e:
+                print(f"Error preloading {name}: {e}")
+        self.record("preload", time.perf_counter() - started)
+
+    def record(self, phase: str, seconds: float) -> bool:
+        """
+        Record a phase's duration the first time it happens in the process.
+
+        :return: True if this call recorded it
+        """
+        with self._lock:
+            if phase in self.phases:
+                return False
+            self.phases[phase] = seconds
+            return True
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                "phases": dict(self.phases),
+                "imports": dict(sorted(self.import_seconds.items(), key=lambda item: -item[1])),
+            }
+
+
+def format_report(report: Dict) -> str:
+    phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in report["phases"].items())
+    imports = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in report["imports"].items())
+    return f"Startup: {phases or 'nothing recorded yet'}" + (f" | preloaded imports: {imports}" if imports else "")
+
+
+# One timer per process; reruns of the script reuse it
+STARTUP = StartupTimer()
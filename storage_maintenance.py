@@ -0,0 +1,341 @@
+"""
+Retention, compaction and housekeeping of the agent session table.
+
+A session is one row of the table (phsycatrist in wellness_agent.db by
+default). Its last activity is when it was last written, or created if it
+never was. StorageMaintenance runs on a schedule and:
+- creates indexes on the user and on the last activity, so the jobs below and
+  lookups by user do not scan the table (session_id is the primary key)
+- deletes sessions idle for longer than the retention period
+- compacts sessions idle for longer than the compaction period: the agent's
+  run history is dropped, and for headless sessions the chat messages already
+  folded into the conversation summary are dropped too
+- reclaims free pages and refreshes the planner statistics: on SQLite with
+  incremental auto-vacuum, a bounded ANALYZE and a WAL checkpoint; on Postgres
+  with VACUUM ANALYZE
+
+A SQLite file created before incremental auto-vacuum was enabled needs one
+full VACUUM to convert it, which rewrites and locks the whole file. The
+scheduled runs never do that; `python cli.py db-maintain` does.
+
+Sessions are changed in batches, each in its own transaction, and a session
+written since it was selected is left alone. report() describes the table for
+`python cli.py db-report`.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import Index, Text, cast, delete, func, select, text, update
+
+from sqlalchemy.schema import CreateIndex
+
+from agent_storage import trim_memory
+
+DAY_SECONDS = 24 * 60 * 60
+
+# Sessions selected and changed per transaction
+BATCH_SIZE = 200
+
+# Stored memories at most this long (JSON characters) are already compacted
+COMPACTED_MEMORY_CHARS = 1024
+
+# Rows per index sampled by SQLite's ANALYZE
+ANALYSIS_LIMIT = 1000
+
+# PRAGMA auto_vacuum value of incremental vacuuming
+SQLITE_AUTO_VACUUM_INCREMENTAL = 2
+
+
+class StorageMaintenance:
+    def __init__(self, storage, compact_after_days: int = 7, retention_days: int = 90,
+                 vacuum_pages: int = 2000, batch_size: int = BATCH_SIZE):
+        """
+        :param storage: The shared SQL agent storage (a SqlAgentStorage or PgAgentStorage)
+        :param compact_after_days: Idle days after which a session is compacted (0 disables)
+        :param retention_days: Idle days after which a session is deleted (0 keeps sessions forever)
+        :param vacuum_pages: Free SQLite pages returned to the file system per run (0 for all)
+        """
+        self.storage = storage
+        self.table = storage.table
+        self.engine = storage.db_engine
+        self.compact_after_days = compact_after_days
+        self.retention_days = retention_days
+        self.vacuum_pages = vacuum_pages
+        self.batch_size = batch_size
+        self.last_run: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        columns = self.table.c
+        self.last_active = func.coalesce(columns.updated_at, columns.created_at)
+        self.indexes = [
+            Index(f"idx_{self.table.name}_user_id", columns.user_id, columns.created_at),
+            Index(f"idx_{self.table.name}_last_active", self.last_active),
+        ]
+
+    @staticmethod
+    def _chars(column):
+        return func.coalesce(func.length(cast(column, Text)), 0)
+
+    def _row_chars(self):
+        columns = self.table.c
+        return (self._chars(columns.memory) + self._chars(columns.agent_data)
+                + self._chars(columns.user_data) + self._chars(columns.session_data))
+
+    def ensure_indexes(self) -> None:
+        """Create the table, if no session was written yet, and its indexes."""
+        self.storage.create()
+        # IF NOT EXISTS, since the reflection behind checkfirst does not see expression indexes
+        with self.engine.begin() as connection:
+            for index in self.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Delete sessions idle for longer than the retention period; returns how many."""
+        if self.retention_days <= 0:
+            return 0
+        cutoff = int((now or time.time()) - self.retention_days * DAY_SECONDS)
+        session_id = self.table.c.session_id
+        deleted = 0
+        while True:
+            with self.engine.begin() as connection:
+                expired = connection.execute(
+                    select(session_id).where(self.last_active < cutoff).limit(self.batch_size)
+                ).scalars().all()
+                if not expired:
+                    return deleted
+                # Re-checked, so a session written in between is kept
+                deleted += connection.execute(
+                    delete(self.table).where(session_id.in_(expired), self.last_active < cutoff)
+                ).rowcount
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Compact sessions idle for longer than the compaction period; returns how many."""
+        if self.compact_after_days <= 0:
+            return 0
+        cutoff = int((now or time.time()) - self.compact_after_days * DAY_SECONDS)
+        columns = self.table.c
+        compacted = 0
+        after = ""
+        while True:
+            with self.engine.connect() as connection:
+                rows = connection.execute(
+                    select(columns.session_id, columns.memory, columns.session_data,
+                           self.last_active.label("last_active"))
+                    .where(self.last_active < cutoff,
+                           self._chars(columns.memory) > COMPACTED_MEMORY_CHARS,
+                           columns.session_id > after)
+                    .order_by(columns.session_id)
+                    .limit(self.batch_size)
+                ).fetchall()
+            if not rows:
+                return compacted
+            with self.engine.begin() as connection:
+                for row in rows:
+                    compacted += connection.execute(
+                        update(self.table)
+                        .where(columns.session_id == row.session_id, self.last_active == row.last_active)
+                        .values(memory=trim_memory(row.memory, 0), session_data=compact_session_data(row.session_data))
+                    ).rowcount
+            after = rows[-1].session_id
+
+    def vacuum(self, convert_auto_vacuum: bool = False) -> str:
+        """
+        Return free pages to the file system and refresh the planner statistics.
+
+        :param convert_auto_vacuum: Convert a SQLite file without incremental auto-vacuum
+            with one full VACUUM; otherwise its free pages are left alone
+        :return: "incremental", "converted" or "not incremental" on SQLite, "vacuum analyze" on Postgres
+        """
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            if self.engine.dialect.name == "sqlite":
+                if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == SQLITE_AUTO_VACUUM_INCREMENTAL:
+                    status = "incremental"
+                    # The pragma frees one page per step and the sqlite3 module steps a statement
+                    # without result columns only once; executescript() runs it to completion
+                    connection.connection.driver_connection.executescript(
+                        f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})"
+                    )
+                elif convert_auto_vacuum:
+                    status = "converted"
+                    connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+                    connection.exec_driver_sql("VACUUM")
+                else:
+                    status = "not incremental"
+                connection.exec_driver_sql(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+                connection.exec_driver_sql("ANALYZE")
+                connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            else:
+                status = "vacuum analyze"
+                connection.exec_driver_sql(f"VACUUM ANALYZE {self.table.fullname}")
+        return status
+
+    def run(self, now: Optional[float] = None, convert_auto_vacuum: bool = False) -> Dict:
+        """
+        One maintenance pass: indexes, retention, compaction, then vacuuming.
+
+        :param convert_auto_vacuum: Passed to vacuum(); only for passes started by an operator
+        """
+        with self._lock:
+            started = time.perf_counter()
+            self.ensure_indexes()
+            result = {"expired": self.expire(now), "compacted": self.compact(now)}
+            result["vacuum"] = self.vacuum(convert_auto_vacuum)
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            result["finished_at"] = int(time.time())
+            self.last_run = result
+            return result
+
+    def start(self, interval_seconds: int = 3600) -> "StorageMaintenance":
+        """Run run() periodically on a background thread."""
+        if self._thread is None:
+            def loop():
+                warned = False
+                while True:
+                    try:
+                        result = self.run()
+                        if result["expired"] or result["compacted"]:
+                            print(f"Session storage maintenance deleted {result['expired']} and "
+                                  f"compacted {result['compacted']} session(s)")
+                        if result["vacuum"] == "not incremental" and not warned:
+                            warned = True
+                            print("The agent database does not use incremental auto-vacuum, so its free pages "
+                                  "are not reclaimed; run `python cli.py db-maintain` once to convert it")
+                    except Exception as e:
+                        print(f"Session storage maintenance failed: {e}")
+                    time.sleep(interval_seconds)
+
+            self._thread = threading.Thread(target=loop, name="storage-maintenance", daemon=True)
+            self._thread.start()
+        return self
+
+    def report(self, top: int = 20, now: Optional[float] = None) -> Dict:
+        """
+        Size of the table and of its largest sessions.
+
+        :param top: Sessions listed, largest first, with the number of runs and
+            messages each one stores
+        """
+        now = now or time.time()
+        self.storage.create()
+        columns = self.table.c
+        row_chars = self._row_chars()
+        with self.engine.connect() as connection:
+            totals = connection.execute(
+                select(func.count(), func.sum(row_chars), func.min(self.last_active), func.max(self.last_active))
+            ).one()
+            idle = {}
+            for name, days in (("compactable", self.compact_after_days), ("expired", self.retention_days)):
+                if days > 0:
+                    idle[name] = connection.execute(
+                        select(func.count()).where(self.last_active < int(now - days * DAY_SECONDS))
+                    ).scalar()
+            sessions = []
+            largest = connection.execute(
+                select(columns.session_id, columns.user_id, columns.created_at,
+                       self.last_active.label("last_active"), row_chars.label("chars"))
+                .order_by(row_chars.desc())
+                .limit(top)
+            ).fetchall()
+            for row in largest:
+                memory, session_data = connection.execute(
+                    select(columns.memory, columns.session_data).where(columns.session_id == row.session_id)
+                ).one()
+                memory = memory or {}
+                state = (session_data or {}).get("session_state") or {}
+                sessions.append({
+                    "session_id": row.session_id,
+                    "user_id": row.user_id,
+                    "created_at": row.created_at,
+                    "last_active": row.last_active,
+                    "chars": row.chars,
+                    "runs": len(memory.get("runs") or []),
+                    "memory_messages": len(memory.get("messages") or []),
+                    "chat_messages": len(state.get("messages") or []),
+                    "folded": state.get("folded", 0),
+                })
+            report = {
+                "table": self.table.fullname,
+                "backend": self.engine.dialect.name,
+                "sessions": totals[0],
+                "data_chars": totals[1] or 0,
+                "oldest_activity": totals[2],
+                "newest_activity": totals[3],
+                **idle,
+                **self._storage_size(connection),
+                "indexes": self._index_names(connection),
+                "largest_sessions": sessions,
+            }
+        return report
+
+    def _index_names(self, connection) -> List[str]:
+        # Read from the catalog, since reflection skips expression indexes
+        if self.engine.dialect.name == "sqlite":
+            query = text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table ORDER BY name")
+            return list(connection.execute(query, {"table": self.table.name}).scalars())
+        query = text("SELECT indexname FROM pg_indexes WHERE schemaname = :schema AND tablename = :table "
+                     "ORDER BY indexname")
+        return list(connection.execute(query, {"schema": self.table.schema or "public",
+                                               "table": self.table.name}).scalars())
+
+    def _storage_size(self, connection) -> Dict:
+        if self.engine.dialect.name != "sqlite":
+            return {"table_bytes": connection.execute(
+                text("SELECT pg_total_relation_size(CAST(:table AS regclass))"), {"table": self.table.fullname}
+            ).scalar()}
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+        size = {
+            "file_bytes": connection.exec_driver_sql("PRAGMA page_count").scalar() * page_size,
+            "free_bytes": connection.exec_driver_sql("PRAGMA freelist_count").scalar() * page_size,
+        }
+        database = self.engine.url.database
+        if database and os.path.exists(database + "-wal"):
+            size["wal_bytes"] = os.path.getsize(database + "-wal")
+        try:
+            # dbstat is only there when SQLite was compiled with it
+            size["table_bytes"] = connection.execute(
+                text("SELECT SUM(pgsize) FROM dbstat WHERE name = :table"), {"table": self.table.name}
+            ).scalar()
+        except Exception:
+            connection.rollback()
+        return size
+
+
+def compact_session_data(session_data: Optional[Dict]) -> Optional[Dict]:
+    """
+    A copy of a session's data without the chat messages that are already
+    folded into its conversation summary (headless sessions keep their chat in
+    session_state).
+    """
+    state = (session_data or {}).get("session_state")
+    if not state or not state.get("folded") or not isinstance(state.get("messages"), list):
+        return session_data
+    state = {**state, "messages": state["messages"][state["folded"]:], "folded": 0}
+    return {**session_data, "session_state": state}
+
+
+def format_report(report: Dict) -> List[str]:
+    """Lines of a human-readable storage report."""
+    def when(timestamp):
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp)) if timestamp else "-"
+
+    lines = [f"Table {report['table']} ({report['backend']}): {report['sessions']} session(s), "
+             f"{report['data_chars']:,} characters of session data"]
+    for name in ("file_bytes", "free_bytes", "wal_bytes", "table_bytes"):
+        if report.get(name) is not None:
+            lines.append(f"  {name.replace('_', ' ')}: {report[name]:,}")
+    lines.append(f"  activity: {when(report['oldest_activity'])} to {when(report['newest_activity'])}")
+    for name, period in (("compactable", "compaction"), ("expired", "retention")):
+        if name in report:
+            lines.append(f"  idle past the {period} period: {report[name]}")
+    lines.append(f"  indexes: {', '.join(report['indexes']) or '-'}")
+    if report["largest_sessions"]:
+        lines.append("")
+        lines.append(f"{'session':<34} {'last active':<16} {'chars':>10} {'runs':>5} {'memory':>7} "
+                     f"{'chat':>5} {'folded':>6}")
+        for session in report["largest_sessions"]:
+            lines.append(f"{session['session_id'][:34]:<34} {when(session['last_active']):<16} "
+                         f"{session['chars']:>10,} {session['runs']:>5} {session['memory_messages']:>7} "
+                         f"{session['chat_messages']:>5} {session['folded']:>6}")
+    return lines
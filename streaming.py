@@ -0,0 +1,106 @@
+"""
+Helpers for consuming streamed model output.
+
+The model streams text deltas; these helpers hide `<think>...</think>` reasoning
+blocks (emitted by deepseek-r1) and stop the stream once the reply has used up
+its word budget.
+"""
+from typing import Iterable, Iterator
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    """Length of the longest prefix of `tag` that `text` ends with."""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ThinkFilter:
+    """Removes <think>...</think> blocks from a stream of text deltas.
+
+    Tags may be split across deltas, so a trailing partial tag is held back
+    until the next delta arrives.
+    """
+
+    def __init__(self):
+        self.in_think = False
+        self._pending = ""
+
+    def feed(self, delta: str) -> str:
+        """Consume a delta and return the part of it that is visible to the user."""
+        text = self._pending + delta
+        self._pending = ""
+        visible = []
+        while text:
+            tag = THINK_CLOSE if self.in_think else THINK_OPEN
+            index = text.find(tag)
+            if index == -1:
+                keep = _partial_tag_length(text, tag)
+                if keep:
+                    text, self._pending = text[:-keep], text[-keep:]
+                if not self.in_think:
+                    visible.append(text)
+                break
+            if not self.in_think:
+                visible.append(text[:index])
+            text = text[index + len(tag):]
+            self.in_think = not self.in_think
+        return "".join(visible)
+
+    def flush(self) -> str:
+        """Return any held-back text once the stream has ended."""
+        text, self._pending = self._pending, ""
+        return "" if self.in_think else text
+
+
+class WordCounter:
+    """Counts whitespace-separated words incrementally, the same way str.split() does."""
+
+    def __init__(self):
+        self.words = 0
+        self._in_word = False
+
+    def feed(self, text: str) -> int:
+        for char in text:
+            if char.isspace():
+                self._in_word = False
+            elif not self._in_word:
+                self._in_word = True
+                self.words += 1
+        return self.words
+
+
+def bounded_text(deltas: Iterable[str], max_words: int) -> Iterator[str]:
+    """
+    Yield the visible text of a model stream until it exceeds `max_words` words.
+
+    Reasoning blocks are dropped as they arrive and are not counted. The stream
+    stops as soon as the first word past the budget appears, so that
+    truncate_response() can cut the reply and mark it with "...". The caller is
+    responsible for closing the underlying model stream so generation stops.
+
+    :param deltas: Text deltas as produced by the model
+    :param max_words: Word budget of the reply
+    """
+    think = ThinkFilter()
+    counter = WordCounter()
+    for delta in deltas:
+        visible = think.feed(delta)
+        if not visible:
+            continue
+        yield visible
+        if counter.feed(visible) > max_words:
+            return
+    tail = think.flush()
+    if tail:
+        yield tail
+
+
+def strip_think(text: str) -> str:
+    """Remove <think>...</think> blocks from a complete (non-streamed) reply."""
+    think = ThinkFilter()
+    return (think.feed(text) + think.flush()).strip()
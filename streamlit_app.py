@@ -1,126 +1,77 @@
+import time
+from startup import STARTUP, format_report
+
+# Heavy dependencies (phi, ollama, SQLAlchemy, NumPy) are imported where they are first used
+script_started = time.perf_counter()
 import streamlit as st
-from langdetect import detect
-from textwrap import dedent
-from phi.storage.agent.sqlite import SqlAgentStorage
 from dotenv import load_dotenv
-from phi.agent import Agent
-from phi.workflow import Workflow
-from phi.model.ollama import Ollama
-import os
 from datetime import datetime
-from PyPDF2 import PdfReader
-import webbrowser
-from typing import Dict, List
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import List
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+from assistant import (
+    HEALTH_CHECK_PREFIX,
+    Generation,
+    bot_prompt,
+    build_agent_storage,
+    build_document_extractor,
+    build_health_store,
+    build_language_detector,
+    build_model_router,
+    build_rolling_summary,
+    build_scheduler,
+    build_storage_maintenance,
+    build_symptom_store,
+    build_telemetry,
+    build_upload_store,
+    chat_prompt,
+    get_user_key,
+    format_history_message,
+    health_check_prompt,
+    index_report,
+    iter_history_analysis,
+    make_agent_factory,
+    make_summarizer,
+    new_user_id,
+    read_document,
+    record_usage,
+    report_message,
+    routed_model_ids,
+    routed_text,
+    truncate_response,
+    user_index_path,
+)
+from config import (
+    CHAT_WINDOW_MESSAGES,
+    HEALTH_HISTORY_PAGE_SIZE,
+    HEALTH_IMPORT_BATCH_ROWS,
+    MODEL_ACTIVE_WINDOW_SECONDS,
+    MODEL_PING_INTERVAL_SECONDS,
+    OLLAMA_HOST,
+    OLLAMA_KEEP_ALIVE,
+    RESPONSE_CACHE_DB_FILE,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_SERVE_STALE,
+    RESPONSE_CACHE_TTL_SECONDS,
+    SHOW_DEBUG_PANEL,
+)
+from document_index import DocumentIndex
+from health_import import HealthImportError, import_history
+from health_store import MOODS
+from model_host import STATUS_ERROR, STATUS_READY, ModelKeeper
+from prompts import QUICK_QUERIES
+from response_cache import ResponseCache
+from telemetry import Trace
+from upload_store import UploadTooLarge
+
+STARTUP.record("script_imports", time.perf_counter() - script_started)
 
 
 load_dotenv()
 
-# Initialize Ollama model
-base_model = Ollama(id="llama3.1:latest")
-
-# Instructions for the agent
-Phsy_instructions = [
-    """You are Psychiatrist, an AI-powered assistant specializing in physical and mental wellness.
-        Your goal is to provide helpful advice and actionable recommendations to improve the user's well-being.
-        - For physical health queries, suggest exercises, nutrition tips, or general fitness advice.
-        - Repetitvely ask questions from the User bout his health.
-        - Built the Foundation for the analysis , Ask all required question step by step 
-        - For mental health queries, offer mindfulness techniques, stress management strategies, or relaxation exercises.
-        - If the query is unclear, ask clarifying questions to better understand the user's needs.
-        - Always respond in a supportive and empathetic tone.
-        - Reply in the same language the user is asking.
-        - Keep responses concise (50-100 words).
-        
-        Rules:
-        1. Reply in the same language as the user's query.
-        2. Keep responses between 50-100 words.
-        3. Prioritize actionable advice tailored to the user's specific data.
-        4. Maintain a supportive and empathetic tone.
-        5. At the end make a bullet points of possible reasons 
-         ** CALL THE DOCTOR IF USER ASK YOU TO MAKE A DOCTOR CONSULTATION **
-        
-        Additional Guidelines:
-        - ** CALL THE DOCTOR IF USER ASK YOU TO MAKE A DOCTOR CONSULTATION **
-        - If you detect severe symptoms or situations requiring professional medical attention,
-          use the doctor_consultation_tool to connect the user with a specialist.
-        - Recommend doctor consultation for:
-          * Severe depression or anxiety symptoms
-          * Suicidal thoughts
-          * Complex mental health issues
-          * Cases requiring medication
-          * Situations beyond AI assistance scope
-          
-          - Don't Recommend doctor consultation for:
-          * Diet plan queries
-          * Personal health concerns that are not medical emergencies
-        
-        -** USE schedule_appointment_tool WHEN: **
-          * User requests to schedule a future appointment
-          * User wants to plan a consultation
-          * User needs to book a specific time with a specialist
-          * Follow-up appointments are needed
-        
-        - ** USE symptom_tracker_tool WHEN: **
-          * User mentions new symptoms
-          * User wants to track their mental health symptoms
-          * User describes changes in their condition
-          * Regular monitoring of ongoing health issues is needed
-          * User reports anxiety, depression, or mood changes
-          * Sleep pattern changes are reported
-          * Physical symptoms that may relate to mental health
-        
-        When recommending a doctor:
-        1. Explain why professional help is needed
-        2. Call the doctor_consultation_tool with appropriate reason and urgency
-        3. Continue providing support while arranging the consultation
-        
-        When scheduling appointments:
-        1. Ask for preferred specialist type
-        2. Inquire about preferred time
-        3. Use schedule_appointment_tool to arrange the meeting
-        4. Confirm the appointment details with the user
-
-        When using symptom tracker:
-        1. Ask specific questions about symptom intensity
-        2. Inquire about symptom duration
-        3. Request additional context or notes
-        4. Use symptom_tracker_tool to log the information
-        5. Review tracked symptoms to identify patterns
-        6. Provide feedback based on tracked symptoms
-    
-        """ ]
-
-
-
-instructions_new=["""You are Psychiatrist, an AI-powered assistant specializing in physical and mental wellness.
-                        
-                        IMPORTANT: Keep responses between 50-100 words.
-                        At the end make a bullet points of possible reasons 
-                        
-                        1. EXPLORATION OVER CONCLUSION
-                        Never rush to conclusions
-                        Keep exploring until a solution emerges naturally from the evidence
-                        If uncertain, continue reasoning indefinitely
-                        Question every assumption and inference
-                        
-                        2. DEPTH OF REASONING
-                        Engage in extensive contemplation (minimum 100 characters)
-                        Express thoughts in natural, conversational internal monologue
-                        Break down complex thoughts into simple, atomic steps
-                        Embrace uncertainty and revision of previous thoughts
-                        3. THINKING PROCESS
-                        Use short, simple sentences that mirror A doctors natural thought patterns
-                        Express uncertainty and internal debate freely
-                        Show work-in-progress thinking
-                        Acknowledge and explore dead ends
-                        Frequently backtrack and revise
-                        PERSISTENCE
-                        Value thorough exploration over quick resolution
-                        Output Format
-                        
-                        Word limit(max 100 words)
-                        
-# #                         """]
 
 # def doctor_consultation_tool(reason: str, urgency: str = "normal") -> Dict:
 #     """
@@ -176,6 +127,7 @@ def call_doctor():
         phone_number = doctors[selected_doctor]
         if call_type == "Phone Call":
             # For phone calls, we use tel: protocol
+            import webbrowser
             webbrowser.open(f"tel:{phone_number}")
         else:
             # For video calls, you might want to integrate with a telemedicine platform
@@ -209,6 +161,7 @@ def doctor_consultation_tool(reason: str, urgency: str = "normal") -> str:
             if st.button("Connect Now"):
                 phone_number = doctors[selected_doctor]
                 if call_type == "Phone Call":
+                    import webbrowser
                     webbrowser.open(f"tel:{phone_number}")
                 else:
                     st.info(f"Initiating video call with {selected_doctor}")
@@ -219,34 +172,28 @@ def doctor_consultation_tool(reason: str, urgency: str = "normal") -> str:
                 return "Consultation cancelled"
     
     return "Doctor consultation interface closed"
-def read_pdf(file_path):
+@st.cache_resource
+def get_document_extractor():
+    """Document extractor shared by all sessions (its process pool and cache are per process)."""
+    return build_document_extractor()
+
+def read_pdf(file_path, digest=None, progress=None):
     """
-    Reads a PDF file and returns its number of pages and text from the first page.
+    Reads a PDF (or text) file and returns its number of pages and the text of all pages.
+
+    Pages are extracted on a process pool and the result is cached by the file's
+    content digest, so reading the same report again is instant.
     
     Args:
-        file_path (str): Path to the PDF file
+        file_path (str): Path to the PDF or text file
+        digest (str): SHA-256 digest of the file; computed from the file if omitted
+        progress (callable): Called as progress(done, total) during extraction
         
     Returns:
-        dict: Dictionary containing number of pages and first page text
+        dict: Dictionary containing number of pages, first page text and full text
             or error message if reading fails
     """
-    try:
-        with open(file_path, 'rb') as file:
-            reader = PdfReader(file)
-            
-            num_pages = len(reader.pages)
-            first_page_text = reader.pages[0].extract_text()
-            
-            return {
-                'num_pages': num_pages,
-                'first_page_text': first_page_text.strip(),
-                'error': None
-            }
-            
-    except FileNotFoundError:
-        return {'error': 'File not found'}
-    except Exception as e:
-        return {'error': f'Error reading PDF: {str(e)}'}
+    return read_document(get_document_extractor(), file_path, digest=digest, progress=progress)
     
 #Schedule Appointment Tool 
 
@@ -299,17 +246,13 @@ def symptom_tracker_tool(symptoms: List[str] = None) -> str:
         with col1:
             if st.button("Log Symptoms"):
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-                symptom_log = {
-                    'timestamp': timestamp,
-                    'symptoms': symptoms,
-                    'intensity': symptom_intensity,
-                    'duration': duration,
-                    'notes': additional_notes
-                }
-                
-                if 'symptom_logs' not in st.session_state:
-                    st.session_state.symptom_logs = []
-                st.session_state.symptom_logs.append(symptom_log)
+                get_symptom_store().add(
+                    get_user_key(st.session_state.workflow.user_info),
+                    symptoms,
+                    symptom_intensity,
+                    duration=duration,
+                    notes=additional_notes,
+                )
                 st.session_state.show_symptom_ui = False
                 return f"Symptoms logged at {timestamp}: {', '.join(symptoms)} (Intensity: {symptom_intensity}, Duration: {duration})"
         with col2:
@@ -320,70 +263,520 @@ def symptom_tracker_tool(symptoms: List[str] = None) -> str:
     return "Symptom tracker interface closed"    
     
 
-# Truncate function
-def truncate_response(text, max_words=1000):
-    words = text.split()
-    return " ".join(words[:max_words]) + "..." if len(words) > max_words else text
+@st.cache_resource
+def get_scheduler():
+    """Process-wide scheduler shared by every Streamlit session."""
+    return build_scheduler()
+
+@st.cache_resource
+def get_model_router():
+    """Routes each model call to the small or the large model; their clients report to the running turn's trace."""
+    return build_model_router()
+
+@st.cache_resource
+def get_model_keepers():
+    """Preloads the routed models once per process and keeps them loaded while sessions are active."""
+    return [
+        ModelKeeper(
+            model_id,
+            host=OLLAMA_HOST,
+            keep_alive=OLLAMA_KEEP_ALIVE,
+            ping_interval_seconds=MODEL_PING_INTERVAL_SECONDS,
+            active_window_seconds=MODEL_ACTIVE_WINDOW_SECONDS,
+        ).start()
+        for model_id in routed_model_ids().values()
+    ]
 
-def extract_content_from_response(response):
+@st.cache_resource
+def get_agent_storage():
+    """Pooled session storage shared by all agents in the process, with its maintenance job running."""
+    storage = build_agent_storage()
+    build_storage_maintenance(storage)
+    return storage
+
+@st.cache_resource
+def get_agent_factory():
+    """Factory for per-session psychiatrist agents, with the tools that render in the app."""
+    return make_agent_factory(
+        get_model_router(),
+        get_agent_storage(),
+        tools=[doctor_consultation_tool, schedule_appointment_tool, symptom_tracker_tool],
+    )
+
+def get_background_agent_factory():
+    """Factory for agents that run outside any session (cache refreshes), without the app's tools."""
+    return make_agent_factory(get_model_router(), get_agent_storage())
+
+@st.cache_resource
+def get_upload_store():
+    """Content-addressed upload store shared by all sessions, with its cleanup job running."""
+    return build_upload_store()
+
+def store_uploaded_file(uploaded_file):
     """
-    Convert a Phi RunResponse-like object to a dictionary and retrieve the 'content' field.
-    
-    :param response: The RunResponse or similar object with a .to_dict() method
-    :return: The text content if present, else an error message
+    Store an uploaded file once and record it once per session.
+
+    Streamlit keeps the file selected across reruns, so the stored record is
+    remembered per upload and later reruns neither rehash nor rewrite it.
+
+    :return: The upload record ({"digest", "path", "name", "size", ...})
+    :raises UploadTooLarge: If the file exceeds UPLOAD_MAX_MB
+    """
+    upload_key = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+    stored = st.session_state.setdefault("stored_uploads", {})
+    if upload_key not in stored:
+        record = get_upload_store().save(uploaded_file, uploaded_file.name)
+        stored[upload_key] = record
+        if record["path"] not in st.session_state.uploaded_files:
+            st.session_state.uploaded_files.append(record["path"])
+    return stored[upload_key]
+
+@st.cache_resource
+def get_health_store():
+    """Persistent Health Tracker store shared by all sessions."""
+    return build_health_store()
+
+@st.cache_resource
+def get_symptom_store():
+    """Persistent symptom log with per-symptom aggregates, shared by all sessions."""
+    return build_symptom_store()
+
+def render_health_history(user_key):
+    """Health History as one paginated table and a trend chart, however many entries there are."""
+    store = get_health_store()
+    total = store.count(user_key)
+    if not total:
+        return
+    st.subheader("Health History")
+    pages = (total + HEALTH_HISTORY_PAGE_SIZE - 1) // HEALTH_HISTORY_PAGE_SIZE
+    page = st.number_input("Page", 1, pages, 1, key="health_history_page") if pages > 1 else 1
+    st.dataframe(
+        store.page(user_key, offset=(page - 1) * HEALTH_HISTORY_PAGE_SIZE, limit=HEALTH_HISTORY_PAGE_SIZE),
+        hide_index=True,
+        use_container_width=True,
+    )
+    series = store.series(user_key)
+    st.line_chart(
+        {
+            "time": [datetime.fromtimestamp(ts) for ts in series["ts"]],
+            "weight (kg)": series["weight"],
+            "sleep (h)": series["sleep_hours"],
+        },
+        x="time",
+    )
+
+@st.experimental_fragment
+def health_tracker_panel():
+    """
+    Health Tracker inputs, history import and Health History.
+
+    A fragment: editing the inputs or paging the history reruns only this
+    panel. Saving or importing reruns the whole app, as the reply goes to the chat.
+    """
+    st.header("Health Tracker")
+    weight = st.number_input("Weight (kg)", 0, 200)
+    mood = st.select_slider("Mood", MOODS, "😐")
+    sleep_hours = st.number_input("Sleep Hours", 0, 24)
+    user_key = get_user_key(st.session_state.workflow.user_info)
+
+    if st.button("Save Progress"):
+        trace = new_trace("health_check")
+        # Saves the entry and analyses it against the user's whole history
+        context, st.session_state.prompt_usage = health_check_prompt(
+            trace, get_health_store(), st.session_state.workflow.user_info, weight, mood, sleep_hours
+        )
+        st.success("Progress saved!")
+
+        # The analysis is streamed below the chat history on the next run
+        st.session_state.pending_health_check = context
+        st.session_state.pending_trace = trace
+        st.rerun()
+
+    with st.expander("Import History"):
+        history_file = st.file_uploader(
+            "CSV or JSON export from another tracker", type=["csv", "json", "jsonl"], key="health_import_file"
+        )
+        if history_file is not None and st.button("Import History"):
+            import_health_file(history_file)
+        if st.session_state.get("health_import_errors"):
+            st.warning("Skipped rows:\n" + "\n".join(f"- {error}" for error in st.session_state.health_import_errors))
+
+    # Show health history
+    render_health_history(user_key)
+
+def show_older_messages():
+    st.session_state.chat_window = st.session_state.get("chat_window", CHAT_WINDOW_MESSAGES) + CHAT_WINDOW_MESSAGES
+
+@st.experimental_fragment
+def render_chat_history():
+    """
+    The latest CHAT_WINDOW_MESSAGES messages, so a run costs the same however long the session is.
+
+    A fragment: "Load older messages" reruns only the history.
+    """
+    messages = st.session_state.messages
+    shown = min(st.session_state.get("chat_window", CHAT_WINDOW_MESSAGES), len(messages))
+    hidden = len(messages) - shown
+    if hidden:
+        st.button(f"Load older messages ({hidden} more)", on_click=show_older_messages)
+    for message in messages[hidden:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+@st.experimental_fragment
+def upload_panel():
+    """
+    Report upload and processing.
+
+    A fragment: choosing a file reruns only this section. Processing reruns
+    the whole app, as the reply goes to the chat.
+    """
+    st.subheader("Upload Your Report")
+    uploaded_file = st.file_uploader("Upload a document", type=["pdf", "txt"])
+
+    upload_record = None
+    if uploaded_file is not None:
+        try:
+            upload_record = store_uploaded_file(uploaded_file)
+        except UploadTooLarge as e:
+            st.error(str(e))
+
+    if upload_record is not None:
+        file_path = upload_record["path"]
+        st.success(f"File '{uploaded_file.name}' uploaded successfully!")
+
+        if st.button("Process Uploaded File"):
+            trace = new_trace("file_processing")
+            progress_bar = st.progress(0.0, text="Extracting text...")
+
+            def show_extraction_progress(done, total):
+                progress_bar.progress(min(done / max(total, 1), 1.0), text=f"Extracting text... {done}/{total}")
+
+            with trace.span("extraction"):
+                file_content = read_pdf(file_path, digest=upload_record["digest"], progress=show_extraction_progress)
+            progress_bar.empty()
+
+            if file_content['error']:
+                st.error(file_content['error'])
+            else:
+                # The report is indexed; prompts only carry its relevant excerpts from now on
+                with trace.span("indexing"):
+                    index_document(upload_record["digest"], upload_record["name"], file_content['text'])
+                trace.set(pages=file_content['num_pages'], characters=len(file_content['text']))
+                st.session_state.messages.append({
+                    "role": "user",
+                    "content": report_message(upload_record, file_content)
+                })
+                st.session_state.pending_document = upload_record["digest"]
+                st.session_state.pending_trace = trace
+                st.session_state.pending_bot_response = True
+                st.rerun()
+
+def import_health_file(uploaded_file):
+    """
+    Import a health history file, then add the analysis of the imported range to the chat.
+
+    The file is parsed and validated in batches; the analysis runs as a few
+    batched model calls, with progress shown for both.
     """
-    response_dict = response.to_dict()
+    trace = new_trace("health_import")
+    user_info = st.session_state.workflow.user_info
+    progress_bar = st.progress(0.0, text="Importing...")
+
+    def show_import_progress(done, total):
+        progress_bar.progress(min(done / total, 1.0) if total else 0.0, text=f"Importing... {done // 1024} KB")
+
     try:
-        response_text = response_dict["content"]
-    except Exception as e:
-        response_text = f"An error occurred: {str(e)}"
-    return response_text
+        with trace.span("health_store_write"):
+            report = import_history(
+                get_health_store(),
+                get_user_key(user_info),
+                uploaded_file,
+                uploaded_file.name,
+                batch_size=HEALTH_IMPORT_BATCH_ROWS,
+                progress=show_import_progress,
+            )
+    except HealthImportError as e:
+        progress_bar.empty()
+        st.error(str(e))
+        return
+    trace.set(rows=report["rows"], imported=report["imported"], invalid=report["invalid"])
+
+    analyses = []
+    if report["imported"]:
+        progress_bar.progress(0.0, text="Analysing history...")
+        for analysis in iter_history_analysis(
+            get_model_router(), get_scheduler(), trace, get_health_store(), user_info,
+            report["since"], report["until"], st.session_state.session_id,
+        ):
+            analyses.append(analysis)
+            progress_bar.progress(
+                analysis["done"] / analysis["total"], text=f"Analysing history... {analysis['done']}/{analysis['total']}"
+            )
+    progress_bar.empty()
+    st.session_state.health_import_errors = report["errors"]
+    st.session_state.messages.append({"role": "assistant", "content": format_history_message(report, analyses)})
+    get_telemetry().record(trace)
+    st.rerun()
+
+def get_document_index():
+    """The current user's report index, loaded once per session."""
+    user_key = get_user_key(st.session_state.workflow.user_info)
+    index = st.session_state.get("document_index")
+    if index is None or st.session_state.get("document_index_user") != user_key:
+        index = DocumentIndex.load(user_index_path(user_key))
+        st.session_state.document_index = index
+        st.session_state.document_index_user = user_key
+    return index
+
+def index_document(digest, name, text):
+    """Add a report to the user's index and keep the updated index for the session."""
+    index = index_report(get_document_index().path, digest, name, text)
+    st.session_state.document_index = index
+    return index
 
-def generate_bot_response():
-    """Generate bot response for the latest user message."""
+def make_conversation_summarizer(session_id):
+    """
+    Build the summarize(previous_summary, messages) callable used by RollingSummary.
+
+    It runs on a background thread, so it only captures plain values and not
+    st.session_state.
+    """
+    return make_summarizer(get_model_router(), get_scheduler(), session_id)
+
+@contextmanager
+def script_run_ctx_attached(script_ctx):
+    """Attach a session's script context to the current (pooled worker) thread, and detach it afterwards."""
+    thread = threading.current_thread()
+    add_script_run_ctx(thread, script_ctx)
+    try:
+        yield
+    finally:
+        # Otherwise later jobs on the worker, for any session, would run in this one's context
+        setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+
+def stream_agent_response(context, prefix="", trace=None):
+    """
+    Run the agent in streaming mode and render tokens into an assistant chat bubble as they arrive.
+
+    :param context: The prompt sent to the agent
+    :param prefix: Markdown shown above the streamed text (e.g. "**Health Check**:")
+    :param trace: Trace of the turn; receives queue wait, first token, generation and render spans
+    :return: The finished Generation; its `text` is the final response, passed
+        through truncate_response, and `completed` is False for a busy or cut-off reply
+
+    <think> reasoning blocks are hidden, and generation is aborted once the reply
+    exceeds MAX_RESPONSE_WORDS words. The generation is queued on the shared
+    scheduler; it is cancelled if the user reruns the script or leaves the page.
+    The router picks the model from the turn's kind and the latest user message.
+    """
+    messages = st.session_state.messages
+    last_user_msg = messages[-1]["content"] if messages and messages[-1]["role"] == "user" else ""
+    router = get_model_router()
+    route = router.route(trace.kind if trace is not None else "chat", last_user_msg)
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        placeholder.markdown(prefix + "▌")
+        script_ctx = get_script_run_ctx()
+        # Tools that render Streamlit widgets reach this session from the worker thread
+        generation = Generation(
+            get_scheduler(),
+            router,
+            route,
+            st.session_state.session_id,
+            get_session_agent(),
+            context,
+            trace=trace,
+            worker_context=lambda: script_run_ctx_attached(script_ctx),
+        )
+
+        def show_queue_position(position):
+            if position > 0:
+                placeholder.markdown(prefix + f"⏳ Waiting for the assistant... you are number {position} in the queue.")
+
+        def stop_if_rerun_requested():
+            # Reading session state is a Streamlit yield point: it raises when a rerun or a stop
+            # (the user left) is pending, which cancels the generation while it is queued or
+            # while the model evaluates the prompt, not only once tokens arrive
+            st.session_state.get("session_id")
+
+        render_seconds = 0.0
+        for _ in generation.deltas(on_wait=show_queue_position, on_poll=stop_if_rerun_requested):
+            render_started = time.perf_counter()
+            placeholder.markdown(prefix + generation.text + "▌")
+            render_seconds += time.perf_counter() - render_started
+        placeholder.markdown(prefix + generation.text)
+    if trace is not None:
+        trace.add_span("render", render_seconds)
+    return generation
+
+@st.cache_resource
+def get_telemetry():
+    """Process-wide sink for turn traces (JSONL and Prometheus textfile exports)."""
+    return build_telemetry()
+
+def new_trace(kind):
+    return Trace(kind, st.session_state.session_id)
+
+def finish_trace(trace):
+    """Record a finished turn, with the token use of the prompt it sent."""
+    record_usage(trace, st.session_state.get("prompt_usage"))
+    get_telemetry().record(trace)
+
+def render_debug_panel():
+    """Sidebar breakdown of this session's latest turns."""
+    records = get_telemetry().recent(st.session_state.session_id)
+    with st.sidebar.expander("🛠 Debug: turn timings", expanded=False):
+        st.caption(format_report(STARTUP.report()))
+        if not records:
+            st.caption("No turns yet.")
+            return
+        latest = records[0]
+        st.write(f"**Last turn** ({latest['kind']}): {latest['total_seconds']:.2f}s")
+        st.dataframe(
+            [{"span": span["name"], "seconds": round(span["seconds"], 4)} for span in latest["spans"]],
+            hide_index=True,
+            use_container_width=True,
+        )
+        for metrics in latest["ollama"]:
+            speed = metrics["eval_tokens_per_second"]
+            st.caption(
+                f"Ollama `{metrics.get('model') or '?'}`: {metrics['prompt_eval_count']} prompt tokens in {metrics['prompt_eval_seconds']:.2f}s, "
+                f"{metrics['eval_count']} tokens in {metrics['eval_seconds']:.2f}s"
+                + (f" ({speed:.1f} tok/s)" if speed else "")
+                + f", load {metrics['load_seconds']:.2f}s"
+            )
+        if latest["attributes"]:
+            st.json(latest["attributes"], expanded=False)
+        st.write("**Recent turns**")
+        st.dataframe(
+            [
+                {
+                    "time": datetime.fromtimestamp(record["timestamp"]).strftime("%H:%M:%S"),
+                    "kind": record["kind"],
+                    "seconds": round(record["total_seconds"], 2),
+                    "prompt tokens": sum(metrics["prompt_eval_count"] for metrics in record["ollama"]),
+                    "tokens": sum(metrics["eval_count"] for metrics in record["ollama"]),
+                }
+                for record in records
+            ],
+            hide_index=True,
+            use_container_width=True,
+        )
+
+@st.cache_resource
+def get_response_cache():
+    """Process-wide cache for the Quick Query answers."""
+    return ResponseCache(
+        RESPONSE_CACHE_DB_FILE,
+        max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+        serve_stale=RESPONSE_CACHE_SERVE_STALE,
+    )
+
+def generate_bot_response(use_cache=False, document_digest=None, trace=None):
+    """
+    Generate bot response for the latest user message, streaming it into the chat.
+
+    :param use_cache: Serve the answer from the response cache when possible (Quick Queries)
+    :param document_digest: Digest of a report the message asks to process
+    :param trace: Trace started when the reply was queued; a new one is started if omitted
+    """
+    if trace is None:
+        trace = new_trace("quick_query" if use_cache else "bot_response")
     last_user_msg = st.session_state.messages[-1]["content"]
     user_info = st.session_state.workflow.user_info
     
-    # Detect language
-    try:
-        user_lang = detect(last_user_msg)
-    except:
-        user_lang = "en"  # Default to English
+    # Quick Queries and file requests are canned English prompts, not the user's own words,
+    # so they keep the session's language instead of switching it to English
+    with trace.span("language_detection"):
+        user_lang = st.session_state.language_detector.current()
     
-    context = (
-            f"Generate the response in the language ,User language: {user_lang} , My name is {user_info['name']} and age {user_info['age']} "
-            f"and ethnicity is {user_info.get('ethnicity', 'not provided')} while replying.Include Name in every respnse ,Do not include age and ethinicity in every response "
-            f"Keel in mind last response summary {st.session_state.conversation_summary}.Use these instructions {instructions_new} "
-            # f"{prompt}"
+    # Cached Quick Query answers are shared between users, so they must not depend on
+    # the user's reports or conversation
+    context, st.session_state.prompt_usage = bot_prompt(
+        trace,
+        None if use_cache else get_document_index(),
+        user_info,
+        user_lang,
+        last_user_msg,
+        summary="" if use_cache else st.session_state.conversation_summary,
+        recent_messages=[] if use_cache else st.session_state.rolling_summary.recent(st.session_state.messages[:-1]),
+        document_digest=document_digest,
     )
-    response = st.session_state.workflow.physcatrist.run(context)
-    response_text = extract_content_from_response(response)
+
+    if not use_cache:
+        response_text = stream_agent_response(context, trace=trace).text
+    else:
+        cache = get_response_cache()
+        cache_key = cache.make_key(last_user_msg, user_lang, user_info)
+        with trace.span("cache_lookup"):
+            cached = cache.get(cache_key)
+        if cached is None:
+            trace.set(cache="miss")
+            generation = stream_agent_response(context, trace=trace)
+            response_text = generation.text
+            # A busy message or a reply cut off by a timeout is not served to other users
+            if generation.completed:
+                cache.set(cache_key, response_text)
+        else:
+            response_text, is_fresh = cached
+            trace.set(cache="hit" if is_fresh else "stale")
+            with trace.span("render"):
+                with st.chat_message("assistant"):
+                    st.markdown(response_text)
+            if not is_fresh:
+                # A separate agent keeps the refresh out of the user's own session memory
+                refresh_session_id = f"cache-refresh:{cache_key}"
+                agent = get_background_agent_factory()(refresh_session_id)
+                router = get_model_router()
+                cache.refresh_in_background(
+                    cache_key,
+                    lambda: truncate_response(routed_text(
+                        router, router.route(trace.kind), get_scheduler(), refresh_session_id,
+                        lambda model: agent, context,
+                    )),
+                )
     st.session_state.messages.append({
         "role": "assistant",
         "content": response_text
     })
+    finish_trace(trace)
 
-class WellnessWorkflow(Workflow):
-    user_info: dict = {}
-    health_data:dict={}
-    physcatrist: Agent = Agent(
-        model=base_model,
-        instructions=Phsy_instructions,
-        storage=SqlAgentStorage(db_file="wellness_agent.db", table_name="phsycatrist"),
-        markdown=True,
-        debug=False,
-        tools=[doctor_consultation_tool,schedule_appointment_tool,symptom_tracker_tool] 
-    )
+def get_session_agent():
+    """The session's psychiatrist agent, built on its first model call."""
+    workflow = st.session_state.workflow
+    if workflow.physcatrist is None:
+        workflow.physcatrist = get_agent_factory()(st.session_state.session_id)
+    return workflow.physcatrist
 
 # Initialize session state
-if "workflow" not in st.session_state:
-    st.session_state.workflow = WellnessWorkflow()
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+    # The user's stored data is keyed on this id, not on the details they enter
+    st.session_state.user_id = new_user_id()
+    # The workflow (and phi with it) is created once the user has entered their details
+    st.session_state.workflow = None
     st.session_state.conversation_summary = ""
+    st.session_state.rolling_summary = build_rolling_summary()
+    st.session_state.language_detector = build_language_detector()
     st.session_state.user_info_collected = False
     st.session_state.messages = []
     st.session_state.uploaded_files = []
-    st.session_state.health_data = []
-    st.session_state.symptom_logs = []
+
+# The first run of the process loads the heavy dependencies in the background while the page renders
+STARTUP.preload()
+
+# Model readiness: the first run of the process starts the warm-up, every run counts as activity
+with st.sidebar:
+    for model_keeper in get_model_keepers():
+        model_keeper.touch()
+        if model_keeper.status == STATUS_READY:
+            st.caption(f"🟢 Model `{model_keeper.model_id}` ready")
+        elif model_keeper.status == STATUS_ERROR:
+            st.caption(f"🔴 Model `{model_keeper.model_id}` unavailable: {model_keeper.error}")
+        else:
+            st.caption(f"🟡 Loading model `{model_keeper.model_id}`...")
 
 # User info collection form
 if not st.session_state.user_info_collected:
@@ -395,11 +788,14 @@ if not st.session_state.user_info_collected:
         submitted = st.form_submit_button("Start Wellness Journey")
         
         if submitted:
-            st.session_state.workflow.user_info = {
+            from wellness_workflow import WellnessWorkflow
+
+            st.session_state.workflow = WellnessWorkflow(user_info={
                 "name": name,
                 "age": age,
-                "ethnicity": ethnicity
-            }
+                "ethnicity": ethnicity,
+                "user_id": st.session_state.user_id,
+            })
             st.session_state.user_info_collected = True
             st.rerun()
 
@@ -410,109 +806,64 @@ else:
     # --- Quick Queries in Sidebar ---
     with st.sidebar:
         st.header("Quick Queries")
-        if st.button("Stress Relief Tips"):
-            st.session_state.messages.append({
-                "role": "user",
-                "content": "Geneate possible reason that lead to stress, Then Ask User Question , when you are confident enough then give Stress management techniques"
-            })
-            generate_bot_response()
-            st.rerun()
-        
-        if st.button("Sleep Improvement"):
-            st.session_state.messages.append({
-                "role": "user",
-                "content": "How to sleep better"
-            })
-            generate_bot_response()
-            st.rerun()
-            
-        if st.button("Diet Suggestions"):
-            st.session_state.messages.append({
-                "role": "user",
-                "content": "Ask Questions about all things that can be used in calculating bmi etc , Then give proper diet plan to the user , take into account every aspect"
-            })
-            generate_bot_response()
-            st.rerun()
+        for label, quick_query in QUICK_QUERIES.items():
+            if st.button(label):
+                st.session_state.messages.append({
+                    "role": "user",
+                    "content": quick_query
+                })
+                st.session_state.pending_bot_response = "cached"
+                st.rerun()
             
         if st.button("📞 Call Doctor"):
             call_doctor()
         # Add more buttons as needed
     with st.sidebar:
-        st.header("Health Tracker")
-        weight = st.number_input("Weight (kg)", 0, 200)
-        mood = st.select_slider("Mood", ["😞", "😐", "😊"], "😐")
-        sleep_hours = st.number_input("Sleep Hours", 0, 24)
-        
-        if st.button("Save Progress"):
-            st.session_state.health_data.append({
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                "weight": weight,
-                "mood": mood,
-                "sleep_hours": sleep_hours
-            })
-            st.success("Progress saved!")
-            # Generate analysis
-            user_info = st.session_state.workflow.user_info
-            context = dedent(f"""
-                User details: {user_info}
-                New health data: Weight {weight}kg, Mood {mood}, Sleep {sleep_hours} hours
-                Provide a brief analysis and recommendations.
-            """).strip()
-            
-            bot_response = st.session_state.workflow.physcatrist.run(context)
-            bot_response_text = truncate_response(extract_content_from_response(bot_response))
-            
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": f"**Health Check**:\n{bot_response_text}"
-            })
-            st.rerun()
-            
-            # Show health history
-        if st.session_state.health_data:
-            st.subheader("Health History")
-            for entry in st.session_state.health_data:
-                st.write(f"**{entry['timestamp']}**")
-                st.write(f"- Weight: {entry['weight']}kg")
-                st.write(f"- Mood: {entry['mood']}")
-                st.write(f"- Sleep: {entry['sleep_hours']} hours")
+        health_tracker_panel()
+
+    if SHOW_DEBUG_PANEL:
+        render_debug_panel()
             
     # Display chat history
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    render_chat_history()
+
+    # The previous reply is on screen, so older turns can be folded into the summary in the background
+    st.session_state.rolling_summary.maybe_update(
+        st.session_state.messages, make_conversation_summarizer(st.session_state.session_id)
+    )
+    st.session_state.conversation_summary = st.session_state.rolling_summary.summary
+
+    # Stream replies queued by the sidebar or the upload section below the chat history
+    pending_bot_response = st.session_state.pop("pending_bot_response", None)
+    if pending_bot_response:
+        # Quick Query prompts are fixed, so their answers can be served from the cache
+        generate_bot_response(
+            use_cache=pending_bot_response == "cached",
+            document_digest=st.session_state.pop("pending_document", None),
+            trace=st.session_state.pop("pending_trace", None),
+        )
+        st.rerun()
+
+    health_check_context = st.session_state.pop("pending_health_check", None)
+    if health_check_context is not None:
+        trace = st.session_state.pop("pending_trace", None) or new_trace("health_check")
+        bot_response_text = stream_agent_response(health_check_context, prefix=HEALTH_CHECK_PREFIX, trace=trace).text
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": f"{HEALTH_CHECK_PREFIX}{bot_response_text}"
+        })
+        finish_trace(trace)
+        st.rerun()
 
     # File upload section
-    st.subheader("Upload Your Report")
-    uploaded_file = st.file_uploader("Upload a document", type=["pdf", "txt"])
-    
-    if uploaded_file is not None:
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        file_path = os.path.join("uploads", f"{timestamp}_{uploaded_file.name}")
-        os.makedirs("uploads", exist_ok=True)
-        
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        st.session_state.uploaded_files.append(file_path)
-        st.success(f"File '{uploaded_file.name}' uploaded successfully!")
-        
-        if st.button("Process Uploaded File"):
-            file_content=read_pdf(file_path)
-            # with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            #     file_content = f.read()
-            
-            st.session_state.messages.append({
-                "role": "user",
-                "content": f"Process this file: {file_content}"
-            })
-            generate_bot_response()
-            st.rerun()
+    upload_panel()
 
     # User input via chat
     if prompt := st.chat_input("How can I assist you today?"):
-        # Add user message to history
+        trace = new_trace("chat")
+        # Add user message to history; the history goes back to showing the latest messages
         st.session_state.messages.append({"role": "user", "content": prompt})
+        st.session_state.pop("chat_window", None)
         with st.chat_message("user"):
             st.markdown(prompt)
 
@@ -524,32 +875,35 @@ else:
         #     f"Last response summary: {st.session_state.conversation_summary}. "
         #     f"
         # )
-        health_data=st.session_state.workflow.health_data
+        with trace.span("language_detection"):
+            user_lang = st.session_state.language_detector.detect(prompt)
         
-        try:
-            user_lang = detect(prompt)
-            print("Print User Language",user_lang)
-        except:
-            user_lang = "en"  # Default to English
-        
-        context = dedent(f"""
-            User details:
-            - Name: {user_info.get('name')}
-            - Age: {user_info.get('age')}
-            - Ethnicity: {user_info.get('ethnicity', 'Not provided')}
-            - Give response in User language = {user_lang}
-            - Always use name in generating the response 
-            
-            Recent health data:
-            - Weight: {health_data.get('weight', 'Not logged')}kg
-            - Mood: {health_data.get('mood', 'Not logged')}
-            - Sleep: {health_data.get('sleep_hours', 'Not logged')} hours
-            Last summary: {st.session_state.conversation_summary}
-            - Symtoms: {st.session_state.symptom_logs}
-            User query: {prompt}
-        """).strip()
-        response = st.session_state.workflow.physcatrist.run(context)
-        response_text = truncate_response(extract_content_from_response(response))
+        # Turns not yet folded into the summary, excluding the query itself
+        context, st.session_state.prompt_usage = chat_prompt(
+            trace,
+            get_health_store(),
+            get_symptom_store(),
+            get_document_index(),
+            user_info,
+            user_lang,
+            prompt,
+            summary=st.session_state.conversation_summary,
+            recent_messages=st.session_state.rolling_summary.recent(st.session_state.messages)[:-1],
+        )
+        response_text = stream_agent_response(context, trace=trace).text
         
         st.session_state.messages.append({"role": "assistant", "content": response_text})
-        st.rerun()
\ No newline at end of file
+        finish_trace(trace)
+        st.rerun()
+
+# Runs that end without st.rerun() get here; the session's first one is its first render
+if "first_render_recorded" not in st.session_state:
+    st.session_state.first_render_recorded = True
+    first_render = Trace("first_render", st.session_state.session_id, started=script_started)
+    first_of_process = STARTUP.record("first_render", time.perf_counter() - script_started)
+    first_render.set(first_of_process=first_of_process)
+    if first_of_process:
+        first_render.add_span("script_imports", STARTUP.phases["script_imports"], started=script_started)
+        # The telemetry JSONL keeps the startup report; the debug panel shows it as it completes
+        first_render.set(startup=STARTUP.report())
+    get_telemetry().record(first_render)
@@ -0,0 +1,76 @@
+"""
+Rolling conversation summary.
+
+The prompt of a turn carries the running summary plus the turns that have not
+been folded into it yet. Every `every_n_turns` turns, the messages older than
+the last `window_turns` turns are folded into the summary on a background
+thread, after the reply has been shown, so prompt size stays bounded however
+long the conversation gets.
+"""
+import threading
+from typing import Callable, Dict, List
+
+
+def format_messages(messages: List[Dict]) -> str:
+    """Render chat messages as "Role: content" lines."""
+    return "\n".join(f"{message['role'].capitalize()}: {message['content']}" for message in messages)
+
+
+def build_summary_prompt(previous_summary: str, messages: List[Dict], max_words: int = 150) -> str:
+    """Prompt asking the model to fold new messages into the existing summary."""
+    return (
+        f"Update the summary of a conversation between a user and a wellness assistant.\n"
+        f"Keep the user's health concerns, symptoms, data, preferences and any advice already given. "
+        f"Drop greetings and repetition. Reply with the updated summary only, at most {max_words} words.\n\n"
+        f"Current summary:\n{previous_summary or '(empty)'}\n\n"
+        f"New messages:\n{format_messages(messages)}"
+    )
+
+
+class RollingSummary:
+    def __init__(self, every_n_turns: int = 4, window_turns: int = 3):
+        self.every_n_turns = every_n_turns
+        self.window_turns = window_turns
+        self.summary = ""
+        # Number of leading messages already folded into the summary
+        self.folded = 0
+        self._lock = threading.Lock()
+        self._running = False
+
+    def recent(self, messages: List[Dict]) -> List[Dict]:
+        """Messages not yet covered by the summary (at most window + every_n turns)."""
+        with self._lock:
+            return list(messages[self.folded:])
+
+    def maybe_update(self, messages: List[Dict], summarize: Callable[[str, List[Dict]], str]) -> bool:
+        """
+        Start a background fold if enough turns have accumulated.
+
+        :param messages: The full chat history
+        :param summarize: Called as summarize(previous_summary, messages_to_fold) and
+            returns the new summary; runs on a background thread
+        :return: True if a fold was started
+        """
+        with self._lock:
+            fold_end = len(messages) - 2 * self.window_turns
+            if self._running or fold_end - self.folded < 2 * self.every_n_turns:
+                return False
+            self._running = True
+            previous_summary = self.summary
+            to_fold = list(messages[self.folded:fold_end])
+
+        def fold():
+            try:
+                summary = summarize(previous_summary, to_fold).strip()
+                with self._lock:
+                    if summary:
+                        self.summary = summary
+                        self.folded = fold_end
+            except Exception as e:
+                print(f"Conversation summary update failed: {e}")
+            finally:
+                with self._lock:
+                    self._running = False
+
+        threading.Thread(target=fold, name="conversation-summary", daemon=True).start()
+        return True
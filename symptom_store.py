@@ -0,0 +1,219 @@
+"""
+Persistent store for symptoms logged with the symptom tracker.
+
+Every log is kept in SQLite, with one row per (user, symptom, time), indexed
+for per-user and per-symptom lookups. Each user also has a per-symptom
+summary row that is updated in the same transaction as the insert:
+frequency, first and last time, latest intensity and duration, and the sums
+needed for a least-squares intensity trend. Building the prompt reads these
+rows only, so its size depends on the number of distinct symptoms and not on
+the number of logs.
+"""
+import re
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlite_util import connect
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(minute|min|hour|hr|h|day|d|week|wk|w|month|mo|year|yr|y)s?\b", re.I)
+
+DURATION_UNITS_IN_DAYS = {
+    "minute": 1 / 1440, "min": 1 / 1440,
+    "hour": 1 / 24, "hr": 1 / 24, "h": 1 / 24,
+    "day": 1, "d": 1,
+    "week": 7, "wk": 7, "w": 7,
+    "month": 30, "mo": 30,
+    "year": 365, "yr": 365, "y": 365,
+}
+
+
+def parse_duration_days(duration: str) -> Optional[float]:
+    """Parse free-text durations such as "2 days" or "1 week 3 days"; None if nothing matches."""
+    matches = DURATION_PATTERN.findall(duration or "")
+    if not matches:
+        return None
+    return sum(float(amount) * DURATION_UNITS_IN_DAYS[unit.lower()] for amount, unit in matches)
+
+
+def normalize_symptom(symptom: str) -> str:
+    return " ".join(symptom.lower().split())
+
+
+class SymptomStore:
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS symptom_logs (
+                    user_key TEXT NOT NULL,
+                    symptom TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    intensity INTEGER,
+                    duration TEXT,
+                    duration_days REAL,
+                    notes TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_symptom_logs_user_symptom_ts
+                    ON symptom_logs (user_key, symptom, ts);
+                CREATE INDEX IF NOT EXISTS idx_symptom_logs_user_ts ON symptom_logs (user_key, ts);
+                CREATE TABLE IF NOT EXISTS symptom_stats (
+                    user_key TEXT NOT NULL,
+                    symptom TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    first_ts REAL NOT NULL,
+                    last_ts REAL NOT NULL,
+                    latest_intensity INTEGER,
+                    latest_duration TEXT,
+                    max_duration_days REAL,
+                    -- Sums over (t, intensity), t in days since first_ts, for the trend slope
+                    n INTEGER NOT NULL DEFAULT 0,
+                    sum_t REAL NOT NULL DEFAULT 0,
+                    sum_y REAL NOT NULL DEFAULT 0,
+                    sum_tt REAL NOT NULL DEFAULT 0,
+                    sum_ty REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_key, symptom)
+                );
+                """
+            )
+
+    def _connect(self):
+        return connect(self.db_file)
+
+    def add(self, user_key: str, symptoms: List[str], intensity: Optional[int], duration: str = "",
+            notes: str = "", timestamp: Optional[float] = None) -> List[str]:
+        """
+        Log symptoms and update their aggregates.
+
+        :return: The normalized symptom names that were logged
+        """
+        ts = time.time() if timestamp is None else timestamp
+        duration_days = parse_duration_days(duration)
+        names = list(dict.fromkeys(normalize_symptom(symptom) for symptom in symptoms if symptom.strip()))
+        with self._connect() as conn:
+            for name in names:
+                conn.execute(
+                    "INSERT INTO symptom_logs (user_key, symptom, ts, intensity, duration, duration_days, notes) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_key, name, ts, intensity, duration or None, duration_days, notes or None),
+                )
+                self._update_stats(conn, user_key, name, ts, intensity, duration, duration_days)
+        return names
+
+    @staticmethod
+    def _update_stats(conn: sqlite3.Connection, user_key: str, symptom: str, ts: float,
+                      intensity: Optional[int], duration: str, duration_days: Optional[float]) -> None:
+        row = conn.execute(
+            "SELECT first_ts, last_ts FROM symptom_stats WHERE user_key = ? AND symptom = ?",
+            (user_key, symptom),
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO symptom_stats (user_key, symptom, count, first_ts, last_ts) VALUES (?, ?, 0, ?, ?)",
+                (user_key, symptom, ts, ts),
+            )
+            first_ts, last_ts = ts, ts
+        else:
+            first_ts, last_ts = row
+        is_latest = ts >= last_ts
+        t = (ts - first_ts) / SECONDS_PER_DAY
+        y = intensity if intensity is not None else 0
+        has_y = 1 if intensity is not None else 0
+        conn.execute(
+            """
+            UPDATE symptom_stats SET
+                count = count + 1,
+                last_ts = MAX(last_ts, :ts),
+                latest_intensity = CASE WHEN :is_latest AND :intensity IS NOT NULL THEN :intensity
+                                        ELSE latest_intensity END,
+                latest_duration = CASE WHEN :is_latest AND :duration != '' THEN :duration
+                                       ELSE latest_duration END,
+                max_duration_days = MAX(COALESCE(max_duration_days, :duration_days), COALESCE(:duration_days, max_duration_days)),
+                n = n + :has_y,
+                sum_t = sum_t + :has_y * :t,
+                sum_y = sum_y + :y,
+                sum_tt = sum_tt + :has_y * :t * :t,
+                sum_ty = sum_ty + :t * :y
+            WHERE user_key = :user_key AND symptom = :symptom
+            """,
+            {
+                "ts": ts, "is_latest": is_latest, "intensity": intensity, "duration": duration or "",
+                "duration_days": duration_days, "has_y": has_y, "t": t, "y": y,
+                "user_key": user_key, "symptom": symptom,
+            },
+        )
+
+    def stats(self, user_key: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Per-symptom aggregates, most recently logged first.
+
+        :return: Dicts with "symptom", "count", "first", "last", "latest_intensity",
+            "intensity_trend_per_week" (None with fewer than two rated logs),
+            "latest_duration" and "max_duration_days"
+        """
+        query = (
+            "SELECT symptom, count, first_ts, last_ts, latest_intensity, latest_duration, max_duration_days, "
+            "n, sum_t, sum_y, sum_tt, sum_ty FROM symptom_stats WHERE user_key = ? ORDER BY last_ts DESC, count DESC"
+        )
+        params: list = [user_key]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        stats = []
+        for (symptom, count, first_ts, last_ts, latest_intensity, latest_duration, max_duration_days,
+             n, sum_t, sum_y, sum_tt, sum_ty) in rows:
+            denominator = n * sum_tt - sum_t * sum_t
+            trend = (n * sum_ty - sum_t * sum_y) / denominator * 7 if n >= 2 and denominator > 1e-9 else None
+            stats.append({
+                "symptom": symptom,
+                "count": count,
+                "first": datetime.fromtimestamp(first_ts).strftime("%Y-%m-%d"),
+                "last": datetime.fromtimestamp(last_ts).strftime("%Y-%m-%d"),
+                "latest_intensity": latest_intensity,
+                "intensity_trend_per_week": trend,
+                "latest_duration": latest_duration,
+                "max_duration_days": max_duration_days,
+            })
+        return stats
+
+    def history(self, user_key: str, symptom: str, limit: int = 50) -> List[Dict]:
+        """Logs of one symptom, newest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT ts, intensity, duration, notes FROM symptom_logs
+                WHERE user_key = ? AND symptom = ? ORDER BY ts DESC LIMIT ?
+                """,
+                (user_key, normalize_symptom(symptom), limit),
+            ).fetchall()
+        return [
+            {
+                "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M"),
+                "intensity": intensity,
+                "duration": duration,
+                "notes": notes,
+            }
+            for ts, intensity, duration, notes in rows
+        ]
+
+
+def format_symptom_stats(stats: List[Dict]) -> str:
+    """Render per-symptom aggregates as one line per symptom for the prompt."""
+    lines = []
+    for entry in stats:
+        parts = [f"logged {entry['count']}x from {entry['first']} to {entry['last']}"]
+        if entry["latest_intensity"] is not None:
+            parts.append(f"latest intensity {entry['latest_intensity']}/10")
+        if entry["intensity_trend_per_week"] is not None:
+            parts.append(f"intensity trend {entry['intensity_trend_per_week']:+.1f}/week")
+        if entry["latest_duration"]:
+            parts.append(f"duration {entry['latest_duration']}")
+        lines.append(f"- {entry['symptom']}: {', '.join(parts)}")
+    return "\n".join(lines)
@@ -0,0 +1,308 @@
+"""
+Per-turn timing spans and Ollama metrics.
+
+Each turn (chat message, bot response, health check, file processing) gets a
+Trace. The handler wraps its steps in trace.span(...), and the model call
+attaches Ollama's own counters: prompt_eval_count/eval_count and the load,
+prompt eval and generation durations. The agent runs on a scheduler worker
+thread, so the trace is activated on that thread. The client returned by
+tracing_client() reports the final chunk of every chat stream to the active
+trace.
+
+Finished traces go to Telemetry, which keeps the recent ones for the debug
+panel, appends each to a JSONL file and rewrites a Prometheus textfile
+(node_exporter textfile collector format) with cumulative counters.
+
+Every process (Streamlit server, API worker) keeps its own counters, so each
+writes its own textfile: the configured name with the process id before the
+extension (wellness_assistant.1234.prom). Every series carries a pid label, so
+the collector, which merges all *.prom files of the directory, never sees the
+same series twice. A process removes its file when it exits.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
+
+# Upper bounds (seconds) of the turn duration histogram buckets
+TURN_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+_active = threading.local()
+
+
+class Trace:
+    def __init__(self, kind: str, session_id: str = "", started: Optional[float] = None):
+        """
+        :param started: time.perf_counter() value the trace starts at (default: now)
+        """
+        self.kind = kind
+        self.session_id = session_id
+        self._started = time.perf_counter() if started is None else started
+        self.timestamp = time.time() - (time.perf_counter() - self._started)
+        self.spans: List[Dict] = []
+        self.attributes: Dict = {}
+        self.ollama: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - started, started=started)
+
+    def add_span(self, name: str, seconds: float, started: Optional[float] = None) -> None:
+        """Record a span measured elsewhere; spans with the same name add up."""
+        offset = (started if started is not None else time.perf_counter() - seconds) - self._started
+        with self._lock:
+            for span in self.spans:
+                if span["name"] == name:
+                    span["seconds"] += seconds
+                    return
+            self.spans.append({"name": name, "start": round(offset, 6), "seconds": seconds})
+
+    def set(self, **attributes) -> None:
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def add_ollama(self, metrics: Dict) -> None:
+        with self._lock:
+            self.ollama.append(metrics)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "session_id": self.session_id,
+                "timestamp": self.timestamp,
+                "total_seconds": time.perf_counter() - self._started,
+                "spans": [dict(span) for span in self.spans],
+                "attributes": dict(self.attributes),
+                "ollama": [dict(metrics) for metrics in self.ollama],
+            }
+
+
+@contextmanager
+def activate(trace: Optional[Trace]) -> Iterator[None]:
+    """Make `trace` the current thread's trace, which model calls report to."""
+    previous = getattr(_active, "trace", None)
+    _active.trace = trace
+    try:
+        yield
+    finally:
+        _active.trace = previous
+
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_active, "trace", None)
+
+
+def ollama_metrics(response) -> Dict:
+    """Counters and durations (in seconds) of Ollama's final response chunk."""
+    def seconds(field):
+        value = response.get(field)
+        return value / 1e9 if value else 0.0
+
+    metrics = {
+        "model": response.get("model") or "",
+        "prompt_eval_count": response.get("prompt_eval_count") or 0,
+        "eval_count": response.get("eval_count") or 0,
+        "total_seconds": seconds("total_duration"),
+        "load_seconds": seconds("load_duration"),
+        "prompt_eval_seconds": seconds("prompt_eval_duration"),
+        "eval_seconds": seconds("eval_duration"),
+    }
+    metrics["eval_tokens_per_second"] = (
+        metrics["eval_count"] / metrics["eval_seconds"] if metrics["eval_seconds"] else None
+    )
+    return metrics
+
+
+def _report(response) -> None:
+    trace = current_trace()
+    if trace is not None:
+        trace.add_ollama(ollama_metrics(response))
+
+
+@lru_cache(maxsize=None)
+def _tracing_client_class():
+    # The ollama package (and httpx) is only imported once a model client is needed
+    from ollama import Client
+
+    class TracingOllamaClient(Client):
+        """Ollama client that reports the metrics of every chat response to the current trace."""
+
+        def chat(self, *args, **kwargs):
+            response = super().chat(*args, **kwargs)
+            if not kwargs.get("stream"):
+                _report(response)
+                return response
+            return self._report_stream(response)
+
+        @staticmethod
+        def _report_stream(chunks):
+            for chunk in chunks:
+                if chunk.get("done"):
+                    _report(chunk)
+                yield chunk
+
+    return TracingOllamaClient
+
+
+def tracing_client(**kwargs):
+    """An ollama Client (same arguments) that reports chat metrics to the current trace."""
+    return _tracing_client_class()(**kwargs)
+
+
+class Telemetry:
+    """Process-wide sink for finished traces."""
+
+    def __init__(self, jsonl_file: str = "", prometheus_file: str = "", recent_size: int = 200,
+                 prefix: str = "wellness_assistant"):
+        """
+        :param jsonl_file: Every trace is appended here as one JSON line ("" disables)
+        :param prometheus_file: Textfile rewritten with cumulative metrics after every trace, with
+            the process id added before its extension ("" disables)
+        """
+        self.jsonl_file = jsonl_file
+        self.prometheus_file = prometheus_file
+        self.prefix = prefix
+        self._recent = deque(maxlen=recent_size)
+        self._lock = threading.Lock()
+        self._turns: Dict[str, Dict] = {}
+        self._spans: Dict[tuple, Dict] = {}
+        self._ollama: Dict[str, Dict] = {}
+        self._routes: Dict[tuple, int] = {}
+        self._written_file = ""
+        for path in (jsonl_file, prometheus_file):
+            if path:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, trace: Trace) -> Dict:
+        record = trace.to_dict()
+        with self._lock:
+            self._recent.append(record)
+            self._aggregate(record)
+            if self.jsonl_file:
+                try:
+                    with open(self.jsonl_file, "a", encoding="utf-8") as file:
+                        file.write(json.dumps(record, default=str) + "\n")
+                except OSError as e:
+                    print(f"Error writing telemetry: {e}")
+            if self.prometheus_file:
+                self._write_prometheus()
+        return record
+
+    def recent(self, session_id: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Latest traces, newest first, optionally for one session."""
+        with self._lock:
+            records = [record for record in reversed(self._recent)
+                       if session_id is None or record["session_id"] == session_id]
+        return records[:limit]
+
+    def _aggregate(self, record: Dict) -> None:
+        kind = record["kind"]
+        turns = self._turns.setdefault(kind, {"count": 0, "sum": 0.0, "buckets": [0] * len(TURN_BUCKETS)})
+        turns["count"] += 1
+        turns["sum"] += record["total_seconds"]
+        for index, bound in enumerate(TURN_BUCKETS):
+            if record["total_seconds"] <= bound:
+                turns["buckets"][index] += 1
+        for span in record["spans"]:
+            spans = self._spans.setdefault((kind, span["name"]), {"count": 0, "sum": 0.0})
+            spans["count"] += 1
+            spans["sum"] += span["seconds"]
+        ollama = self._ollama.setdefault(kind, {
+            "requests": 0, "prompt_eval_count": 0, "eval_count": 0,
+            "load_seconds": 0.0, "prompt_eval_seconds": 0.0, "eval_seconds": 0.0,
+        })
+        model = record["attributes"].get("model")
+        if model:
+            route = (kind, model, "true" if record["attributes"].get("fallback_from") else "false")
+            self._routes[route] = self._routes.get(route, 0) + 1
+        for metrics in record["ollama"]:
+            ollama["requests"] += 1
+            for field in ("prompt_eval_count", "eval_count", "load_seconds", "prompt_eval_seconds", "eval_seconds"):
+                ollama[field] += metrics[field]
+
+    def prometheus_text(self) -> str:
+        """Cumulative metrics in the Prometheus text exposition format."""
+        with self._lock:
+            return self._prometheus_text()
+
+    def _prometheus_text(self) -> str:
+        p = self.prefix
+        pid = f'pid="{os.getpid()}",'
+        lines = [
+            f"# HELP {p}_turn_seconds Duration of a turn, from the user's action to the rendered reply.",
+            f"# TYPE {p}_turn_seconds histogram",
+        ]
+        for kind, turns in sorted(self._turns.items()):
+            for bound, count in zip(TURN_BUCKETS, turns["buckets"]):
+                lines.append(f'{p}_turn_seconds_bucket{{{pid}kind="{kind}",le="{bound}"}} {count}')
+            lines.append(f'{p}_turn_seconds_bucket{{{pid}kind="{kind}",le="+Inf"}} {turns["count"]}')
+            lines.append(f'{p}_turn_seconds_sum{{{pid}kind="{kind}"}} {turns["sum"]:.6f}')
+            lines.append(f'{p}_turn_seconds_count{{{pid}kind="{kind}"}} {turns["count"]}')
+        lines += [
+            f"# HELP {p}_span_seconds Time spent in each step of a turn.",
+            f"# TYPE {p}_span_seconds summary",
+        ]
+        for (kind, name), spans in sorted(self._spans.items()):
+            lines.append(f'{p}_span_seconds_sum{{{pid}kind="{kind}",span="{name}"}} {spans["sum"]:.6f}')
+            lines.append(f'{p}_span_seconds_count{{{pid}kind="{kind}",span="{name}"}} {spans["count"]}')
+        counters = (
+            ("requests", "ollama_requests_total", "Model requests made by turns."),
+            ("prompt_eval_count", "ollama_prompt_tokens_total", "Prompt tokens evaluated by Ollama."),
+            ("eval_count", "ollama_completion_tokens_total", "Tokens generated by Ollama."),
+            ("load_seconds", "ollama_load_seconds_total", "Time Ollama spent loading the model."),
+            ("prompt_eval_seconds", "ollama_prompt_eval_seconds_total", "Time Ollama spent evaluating prompts."),
+            ("eval_seconds", "ollama_eval_seconds_total", "Time Ollama spent generating tokens."),
+        )
+        for field, name, help_text in counters:
+            lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} counter"]
+            for kind, ollama in sorted(self._ollama.items()):
+                value = ollama[field]
+                lines.append(f'{p}_{name}{{{pid}kind="{kind}"}} {value:.6f}' if isinstance(value, float)
+                             else f'{p}_{name}{{{pid}kind="{kind}"}} {value}')
+        lines += [
+            f"# HELP {p}_routed_replies_total Replies by the model that generated them, and whether it was a fallback.",
+            f"# TYPE {p}_routed_replies_total counter",
+        ]
+        for (kind, model, fallback), count in sorted(self._routes.items()):
+            lines.append(f'{p}_routed_replies_total{{{pid}kind="{kind}",model="{model}",fallback="{fallback}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def process_prometheus_file(self) -> str:
+        """This process's textfile: the configured name with the process id before the extension."""
+        root, extension = os.path.splitext(self.prometheus_file)
+        return f"{root}.{os.getpid()}{extension}"
+
+    def _write_prometheus(self) -> None:
+        # The path is resolved on every write, so a process forked after building Telemetry gets its own file
+        path = self.process_prometheus_file()
+        # The collector may read at any time, so the file is replaced atomically
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(self._prometheus_text())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing Prometheus metrics: {e}")
+            return
+        if path != self._written_file:
+            self._written_file = path
+            atexit.register(_remove, path)
+
+
+def _remove(path: str) -> None:
+    # An exited process's counters would otherwise be reported forever
+    try:
+        os.remove(path)
+    except OSError:
+        pass
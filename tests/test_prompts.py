@@ -0,0 +1,22 @@
+import pytest
+
+from prompts import QUICK_QUERIES, build_bot_prompt
+
+USER_INFO = {"name": "Sam", "age": 30, "ethnicity": ""}
+
+
+@pytest.mark.parametrize("query", QUICK_QUERIES.values())
+def test_cached_quick_query_prompt_contains_the_query(query):
+    # The cached path leaves out the summary and recent turns
+    prompt, usage = build_bot_prompt(USER_INFO, "en", query)
+
+    assert query in prompt
+    assert "query" in usage["sections"]
+    assert not usage["truncated"]
+
+
+def test_bot_prompt_keeps_the_query_after_the_conversation():
+    prompt, _ = build_bot_prompt(USER_INFO, "en", "How to sleep better", summary="Talked about work stress.",
+                                 recent="user: I slept badly")
+
+    assert prompt.index("Recent conversation:") < prompt.index("User query: How to sleep better")
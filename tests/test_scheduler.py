@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+from scheduler import InferenceScheduler, InferenceTimeout
+
+
+def slow_stream(first_delay, count=3):
+    time.sleep(first_delay)
+    for index in range(count):
+        yield f"chunk {index}"
+
+
+def test_deadline_hit_mid_stream_raises_timeout():
+    scheduler = InferenceScheduler(max_inflight=1, timeout_seconds=0.2)
+    job = scheduler.submit("session", lambda: slow_stream(0.4))
+
+    # The long poll interval keeps the reader blocked past the deadline, so only
+    # the worker sees it
+    with pytest.raises(InferenceTimeout):
+        list(job.iter_chunks(poll_interval=5))
+
+
+def test_stream_finishing_before_the_deadline_is_complete():
+    scheduler = InferenceScheduler(max_inflight=1, timeout_seconds=5)
+    job = scheduler.submit("session", lambda: slow_stream(0))
+
+    assert list(job.iter_chunks()) == ["chunk 0", "chunk 1", "chunk 2"]
@@ -0,0 +1,122 @@
+"""
+Content-addressed store for uploaded reports.
+
+Uploads are streamed to disk in chunks and hashed on the way, then stored once
+under their SHA-256 digest (uploads/ab/abcdef...<ext>). Uploading the same file
+again, or re-running the script with the file still selected, only refreshes
+the existing file's modification time. cleanup() removes files that have not
+been uploaded again within the retention period.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from typing import BinaryIO, Dict, Optional
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the store's size limit."""
+
+
+class UploadStore:
+    def __init__(self, root: str = "uploads", max_bytes: int = 20 * 1024 * 1024,
+                 retention_days: int = 30, chunk_size: int = 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self.chunk_size = chunk_size
+        self._tmp_dir = os.path.join(root, ".tmp")
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        self._cleanup_thread: Optional[threading.Thread] = None
+
+    def path_for(self, digest: str, extension: str = "") -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}{extension}")
+
+    def save(self, source: BinaryIO, filename: str) -> Dict:
+        """
+        Stream `source` into the store.
+
+        :param source: Readable binary file object (e.g. a Streamlit UploadedFile)
+        :param filename: Original file name; only its extension is kept on disk
+        :return: {"digest", "path", "name", "size", "created"}
+        :raises UploadTooLarge: If the upload exceeds max_bytes
+        """
+        extension = os.path.splitext(filename)[1].lower()
+        tmp_path = os.path.join(self._tmp_dir, f"{uuid.uuid4().hex}.part")
+        sha256 = hashlib.sha256()
+        size = 0
+        if hasattr(source, "seek"):
+            source.seek(0)
+        try:
+            with open(tmp_path, "wb") as tmp_file:
+                while True:
+                    chunk = source.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(
+                            f"'{filename}' is larger than the {self.max_bytes // (1024 * 1024)} MB upload limit"
+                        )
+                    sha256.update(chunk)
+                    tmp_file.write(chunk)
+            digest = sha256.hexdigest()
+            path = self.path_for(digest, extension)
+            created = not os.path.exists(path)
+            if created:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            else:
+                # Already stored: refresh its retention clock instead of writing it again
+                os.utime(path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return {"digest": digest, "path": path, "name": filename, "size": size, "created": created}
+
+    def cleanup(self, retention_days: Optional[int] = None) -> int:
+        """
+        Delete stored files (and stale partial writes) older than the retention period.
+
+        :return: Number of files removed
+        """
+        retention_days = self.retention_days if retention_days is None else retention_days
+        cutoff = time.time() - retention_days * 24 * 60 * 60
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+    def start_cleanup(self, interval_seconds: int = 3600) -> "UploadStore":
+        """Run cleanup() periodically on a background thread."""
+        if self._cleanup_thread is None:
+            def loop():
+                while True:
+                    try:
+                        removed = self.cleanup()
+                        if removed:
+                            print(f"Upload cleanup removed {removed} file(s)")
+                    except Exception as e:
+                        print(f"Upload cleanup failed: {e}")
+                    time.sleep(interval_seconds)
+
+            self._cleanup_thread = threading.Thread(target=loop, name="upload-cleanup", daemon=True)
+            self._cleanup_thread.start()
+        return self
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 digest of a file on disk, read in chunks."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -0,0 +1,17 @@
+"""
+The per-session workflow object.
+
+Kept out of streamlit_app.py because defining it imports phi. The app imports
+this module once a session has entered its details, not on the first page.
+"""
+from typing import Optional
+
+from phi.agent import Agent
+from phi.workflow import Workflow
+
+
+class WellnessWorkflow(Workflow):
+    user_info: dict = {}
+    health_data:dict={}
+    # Built on the session's first model call by get_agent_factory()
+    physcatrist: Optional[Agent] = None